@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Done:
+    """Маркер окончания потока порций с возможной ошибкой стадии."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+class AsyncTransfer:
+    """
+    Асинхронный конвейер переноса: чтение, преобразование и запись порций идут одновременно.
+
+    Каждая стадия выполняется в своем потоке (блокирующие вызовы psycopg2 и
+    clickhouse_connect обернуты в run_in_executor), а стадии связаны очередями
+    asyncio на queue_size порций. Пока пишется порция N, порция N + 1
+    преобразуется, а N + 2 читается из источника, поэтому время переноса
+    стремится к max(чтение, запись), а не к их сумме. Заполненная очередь
+    приостанавливает предыдущую стадию, так что в памяти находится
+    не больше 2 * queue_size + 3 порций.
+    """
+
+    def __init__(self, queue_size=2):
+        """
+        :param queue_size: максимальное количество порций в каждой очереди между стадиями
+        """
+        self.queue_size = queue_size
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def run(self, chunks, consume, transform=None):
+        """
+        Пропускает порции через конвейер и возвращает результат consume.
+
+        :param chunks: итератор порций источника (например, PostgresDatabase.iter_query_chunks)
+        :param consume: функция, получающая итератор готовых порций и записывающая их в приемник
+                        (поштучные вставки или один потоковый COPY)
+        :param transform: функция преобразования одной порции; выполняется в отдельной стадии
+        """
+        loop = asyncio.get_running_loop()
+        source = iter(chunks)
+        ready = asyncio.Queue(maxsize=self.queue_size)
+        read = asyncio.Queue(maxsize=self.queue_size) if transform else ready
+        executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="async_transfer")
+
+        async def produce():
+            try:
+                while True:
+                    item = await loop.run_in_executor(executor, next, source, None)
+                    if item is None:
+                        break
+                    await read.put(item)
+            except Exception as error:
+                await read.put(_Done(error))
+                return
+            await read.put(_Done())
+
+        async def convert():
+            while True:
+                item = await read.get()
+                if not isinstance(item, _Done):
+                    try:
+                        item = await loop.run_in_executor(executor, transform, item)
+                    except Exception as error:
+                        item = _Done(error)
+                await ready.put(item)
+                if isinstance(item, _Done):
+                    return
+
+        def items():
+            # Выполняется в потоке записи: ждет очередную порцию из очереди цикла событий
+            while True:
+                item = asyncio.run_coroutine_threadsafe(ready.get(), loop).result()
+                if isinstance(item, _Done):
+                    if item.error is not None:
+                        raise item.error
+                    return
+                yield item
+
+        stages = [asyncio.ensure_future(produce())]
+        if transform:
+            stages.append(asyncio.ensure_future(convert()))
+        try:
+            return await loop.run_in_executor(executor, consume, items())
+        finally:
+            # Запись завершилась (или упала) - останавливаем чтение и преобразование
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            while not ready.empty():
+                ready.get_nowait()
+            # Если отменили саму корутину, поток записи еще ждет ready.get() - будим его,
+            # иначе executor.shutdown зависнет
+            ready.put_nowait(_Done(asyncio.CancelledError()))
+            await loop.run_in_executor(None, executor.shutdown)
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
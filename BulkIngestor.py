@@ -0,0 +1,206 @@
+import glob
+import logging
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from readers import iter_file_sheets
+
+
+def _parse_file(path, chunk_size, spool_dir=None):
+    """
+    Разбирает файл в отдельном процессе и сбрасывает порции во временный файл.
+
+    Порции не возвращаются родителю целиком: процесс пишет их по одной
+    (pickle) в файл на диске, а загрузчик читает их оттуда так же по одной,
+    поэтому память не зависит от размера файла. Возвращает путь к временному
+    файлу, список листов (имя листа, число порций, число листов) и время разбора.
+    """
+    started = time.perf_counter()
+    descriptor, spool_path = tempfile.mkstemp(prefix="bulk_", suffix=".chunks", dir=spool_dir)
+    sheets = []
+    try:
+        with os.fdopen(descriptor, "wb") as spool:
+            for sheet_name, chunks, sheet_count in iter_file_sheets(path, chunk_size):
+                chunk_count = 0
+                for df in chunks:
+                    pickle.dump(df, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunk_count += 1
+                sheets.append((sheet_name, chunk_count, sheet_count))
+    except BaseException:
+        os.remove(spool_path)
+        raise
+    return spool_path, sheets, time.perf_counter() - started
+
+
+def _spooled_chunks(spool, chunk_count):
+    """Читает из временного файла очередные chunk_count порций."""
+    for _ in range(chunk_count):
+        yield pickle.load(spool)
+
+
+class BulkIngestor:
+    """
+    Пакетная загрузка каталога файлов XLSX/CSV в PostgreSQL.
+
+    Разбор Excel ограничен процессором и GIL, поэтому файлы разбираются
+    в пуле процессов, а готовые порции загружаются через пул соединений
+    с PostgreSQL. Порции передаются через временные файлы в spool_dir
+    и читаются загрузчиком по одной. Ошибка в одном файле не прерывает
+    загрузку остальных. Файлы, которые попадают в одну таблицу (например,
+    a.csv и a.xlsx), не загружаются: загружается только первый из них.
+    """
+
+    FILE_PATTERNS = ("*.xlsx", "*.csv")
+
+    def __init__(self, postgres_db, column_mapping=None, parse_workers=None, load_workers=4, chunk_size=100_000,
+                 copy_format="csv", transforms=None, quarantine=None, spool_dir=None):
+        """
+        :param postgres_db: объект PostgresDatabase; если у него нет пула, создается пул на load_workers соединений
+        :param column_mapping: словарь переименования столбцов
+        :param parse_workers: количество процессов разбора (по умолчанию - число ядер)
+        :param load_workers: количество одновременных загрузок в PostgreSQL
+        :param chunk_size: количество строк в порции
+        :param copy_format: формат COPY ("csv" или "binary")
+        :param transforms: правила преобразования порций (см. transforms.compile_transforms)
+        :param quarantine: путь к CSV-файлу карантина для строк, не прошедших проверку по типам таблиц
+        :param spool_dir: каталог временных файлов с разобранными порциями (по умолчанию - системный)
+        """
+        self.postgres_db = postgres_db
+        self.column_mapping = column_mapping
+        self.parse_workers = parse_workers or os.cpu_count()
+        self.load_workers = load_workers
+        self.chunk_size = chunk_size
+        self.copy_format = copy_format
+        self.transforms = transforms
+        self.quarantine = quarantine
+        self.spool_dir = spool_dir
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def find_files(self, source):
+        """Возвращает отсортированный список файлов каталога (xlsx/csv) или файлов по шаблону glob."""
+        if os.path.isdir(source):
+            paths = [path for pattern in self.FILE_PATTERNS for path in glob.glob(os.path.join(source, pattern))]
+        else:
+            paths = glob.glob(source)
+        # Временные файлы Excel (~$...) не являются книгами
+        return sorted(path for path in paths if not os.path.basename(path).startswith("~$"))
+
+    @staticmethod
+    def table_name(pg_db, path):
+        """Имя таблицы для файла: очищенное имя файла без расширения."""
+        return pg_db.clean_name(os.path.splitext(os.path.basename(path))[0])
+
+    def _load_file(self, pg_db, path, spool_path, sheets):
+        """Загружает разобранные листы файла через соединение из пула и удаляет временный файл."""
+        result = {"tables": [], "rows": 0, "load_seconds": 0.0, "error": None}
+        started = time.perf_counter()
+        table_name = self.table_name(pg_db, path)
+        try:
+            with open(spool_path, "rb") as spool, pg_db.session() as session:
+                for sheet_name, chunk_count, sheet_count in sheets:
+                    sheet_table = table_name if sheet_count == 1 else f"{table_name}_{pg_db.clean_name(sheet_name)}"
+                    rows = session.load_stream(_spooled_chunks(spool, chunk_count), sheet_table,
+                                               self.column_mapping, self.copy_format,
+                                               transforms=self.transforms, quarantine=self.quarantine)
+                    if rows is None:
+                        raise RuntimeError(f"Не удалось загрузить таблицу {sheet_table}.")
+                    result["tables"].append(sheet_table)
+                    result["rows"] += rows
+        except Exception as error:
+            result["error"] = str(error)
+        finally:
+            os.remove(spool_path)
+        result["load_seconds"] = time.perf_counter() - started
+        return result
+
+    def ingest(self, source):
+        """
+        Загружает все файлы каталога или шаблона glob и возвращает отчет по каждому файлу.
+
+        Одновременно на диске находятся не более parse_workers + load_workers
+        разобранных файлов, в памяти - по одной порции на разбор и загрузку. Отчет содержит таблицы, количество строк, время
+        разбора и загрузки и текст ошибки, если файл загрузить не удалось.
+        """
+        files = self.find_files(source)
+        reports = {path: {"file": path, "tables": [], "rows": 0, "parse_seconds": 0.0, "load_seconds": 0.0,
+                          "error": None} for path in files}
+        if not files:
+            self.logger.warning(f"Файлы для загрузки по пути {source} не найдены.")
+            return []
+
+        # Параллельные загрузки в одну таблицу перезаписали бы друг друга
+        owners = {}
+        for path in list(files):
+            table_name = self.table_name(self.postgres_db, path)
+            owner = owners.setdefault(table_name, path)
+            if owner != path:
+                files.remove(path)
+                reports[path]["error"] = f"Таблица {table_name} уже загружается из файла {owner}."
+                self.logger.error(f"Файл {path}: {reports[path]['error']}")
+        if not files:
+            return list(reports.values())
+
+        owns_pool = self.postgres_db.pool is None
+        pg_db = self.postgres_db.clone(pool_size=self.load_workers) if owns_pool else self.postgres_db
+        if owns_pool:
+            pg_db.connect()
+            if pg_db.pool is None:
+                self.logger.error("Не удалось создать пул соединений с PostgreSQL, загрузка отменена.")
+                for path in files:
+                    reports[path]["error"] = "Нет соединения с PostgreSQL."
+                return list(reports.values())
+
+        self.logger.info(f"Пакетная загрузка {len(files)} файлов: {self.parse_workers} процессов разбора, "
+                         f"{self.load_workers} загрузчиков.")
+        started = time.perf_counter()
+        window = self.parse_workers + self.load_workers
+        pending_files = iter(files)
+        parsing, loading = {}, {}
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as parsers, \
+                    ThreadPoolExecutor(max_workers=self.load_workers) as loaders:
+
+                def fill():
+                    while len(parsing) + len(loading) < window:
+                        path = next(pending_files, None)
+                        if path is None:
+                            return
+                        parsing[parsers.submit(_parse_file, path, self.chunk_size, self.spool_dir)] = path
+
+                fill()
+                while parsing or loading:
+                    done, _ = wait(list(parsing) + list(loading), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in parsing:
+                            path = parsing.pop(future)
+                            try:
+                                spool_path, sheets, reports[path]["parse_seconds"] = future.result()
+                            except Exception as error:
+                                reports[path]["error"] = f"Ошибка разбора: {error}"
+                                self.logger.error(f"Файл {path}: {reports[path]['error']}")
+                                continue
+                            loading[loaders.submit(self._load_file, pg_db, path, spool_path, sheets)] = path
+                        else:
+                            path = loading.pop(future)
+                            reports[path].update(future.result())
+                            report = reports[path]
+                            if report["error"]:
+                                self.logger.error(f"Файл {path}: ошибка загрузки: {report['error']}")
+                            else:
+                                self.logger.info(f"Файл {path}: {report['rows']} строк в {report['tables']}, "
+                                                 f"разбор {report['parse_seconds']:.1f} с, "
+                                                 f"загрузка {report['load_seconds']:.1f} с.")
+                    fill()
+        finally:
+            if owns_pool:
+                pg_db.disconnect()
+
+        failed = sum(1 for report in reports.values() if report["error"])
+        succeeded = len(reports) - failed
+        total_rows = sum(report["rows"] for report in reports.values())
+        self.logger.info(f"Пакетная загрузка завершена за {time.perf_counter() - started:.1f} с: "
+                         f"{succeeded} файлов успешно, {failed} с ошибками, {total_rows} строк.")
+        return list(reports.values())
@@ -1,11 +1,22 @@
 import logging
-import pandas as pd
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 import clickhouse_connect
+from clickhouse_connect.driver import httputil
 import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_values
+import pyarrow as pa
 
+from AsyncTransfer import AsyncTransfer
+from arrow_types import as_table, clickhouse_column_types, rename_arrow_columns
+from ConnectionPool import ConnectionPool
+from StateStore import StateStore
 from decorators import retry
+from metrics import TransferMetrics, track_transfer
+from schema_inference import infer_clickhouse_schema
+from transforms import compile_transforms
+from validation import clickhouse_rules, compile_validator, validated_chunks
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,47 +29,144 @@ logging.basicConfig(
 )
 
 class ClickHouseDatabase:
-    def __init__(self, host, port, user, password, schema="default"):
+    def __init__(self, host, port, user, password, schema="default", pool_size=None, pool_timeout=30,
+                 metrics_exporter=None, compression=True, insert_block_size=None, async_insert=False,
+                 wait_for_async_insert=True, max_insert_block_size=None, insert_settings=None, result_cache=None):
+        """
+        :param compression: сжатие запросов и вставок по HTTP: "lz4", "zstd", True (lz4, по умолчанию) или False
+        :param insert_block_size: максимальное количество строк в одном INSERT; большие порции
+                                  делятся на несколько вставок (по умолчанию порция вставляется целиком)
+        :param async_insert: включает асинхронные вставки: сервер копит мелкие вставки в буфере
+                             и пишет их одной частью
+        :param wait_for_async_insert: при async_insert ждать записи буфера перед ответом на INSERT
+        :param max_insert_block_size: настройка сервера max_insert_block_size (строк в блоке при записи)
+        :param insert_settings: прочие настройки сервера для каждого INSERT
+                                (например, min_insert_block_size_rows)
+        :param result_cache: ResultCache для результатов выгрузок таблиц (iter_query_chunks и
+                             iter_query_arrow с cache_table): повторная выгрузка неизменной таблицы
+                             читается с локального диска
+        """
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.schema = schema  # Новое поле для схемы
+        self.pool_size = pool_size  # Если задан, connect() создает пул клиентов с общим HTTP-пулом
+        self.pool_timeout = pool_timeout
+        self.metrics_exporter = metrics_exporter  # MetricsExporter для записи метрик каждого вызова в файл
+        self.compression = compression
+        self.insert_block_size = insert_block_size
+        self.async_insert = async_insert
+        self.wait_for_async_insert = wait_for_async_insert
+        self.max_insert_block_size = max_insert_block_size
+        self.insert_settings = dict(insert_settings or {})
+        self.result_cache = result_cache
+        if async_insert:
+            self.insert_settings.update(async_insert=1, wait_for_async_insert=int(wait_for_async_insert))
+        if max_insert_block_size:
+            self.insert_settings["max_insert_block_size"] = max_insert_block_size
         self.client = None
+        self.pool = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    def _new_client(self, pool_mgr=None):
+        """Создает нового клиента ClickHouse (при pool_mgr - поверх общего HTTP-пула)."""
+        return clickhouse_connect.get_client(
+            host=self.host,
+            port=self.port,
+            username=self.user,
+            password=self.password,
+            compress=self.compression,
+            pool_mgr=pool_mgr
+        )
+
+    def _ensure_schema(self, client):
+        """Создает схему, если ее нет."""
+        schema_check_query = f"EXISTS DATABASE {self.schema}"
+        schema_exists = client.command(schema_check_query)
+
+        if schema_exists:
+            self.logger.info(f"Схема {self.schema} уже существует.")
+        else:
+            # Создание схемы, если она отсутствует
+            client.command(f"CREATE DATABASE {self.schema}")
+            self.logger.info(f"Схема {self.schema} создана, так как отсутствовала.")
+
     @retry(retries=3, delay=5, logger=logging.getLogger(__name__))
     def connect(self):
-        """Подключается к ClickHouse и создает схему, если ее нет."""
+        """Подключается к ClickHouse (или создает пул клиентов, если задан pool_size) и создает схему, если ее нет."""
         try:
-            self.client = clickhouse_connect.get_client(
-                host=self.host,
-                port=self.port,
-                username=self.user,
-                password=self.password
-            )
-            self.logger.info("Соединение с ClickHouse установлено.")
-
-            # Проверка наличия схемы
-            schema_check_query = f"EXISTS DATABASE {self.schema}"
-            schema_exists = self.client.command(schema_check_query)
+            if self.pool_size:
+                pool_mgr = httputil.get_pool_manager(maxsize=self.pool_size)
+                pool = ConnectionPool(lambda: self._new_client(pool_mgr), maxsize=self.pool_size,
+                                      timeout=self.pool_timeout, validate=lambda client: client.ping(),
+                                      name=f"clickhouse:{self.host}")
+                with pool.connection() as client:
+                    self._ensure_schema(client)
+                self.pool = pool
+                self.logger.info(f"Пул клиентов ClickHouse создан (до {self.pool_size} клиентов).")
+                return
 
-            if schema_exists:
-                self.logger.info(f"Схема {self.schema} уже существует.")
-            else:
-                # Создание схемы, если она отсутствует
-                self.client.command(f"CREATE DATABASE {self.schema}")
-                self.logger.info(f"Схема {self.schema} создана, так как отсутствовала.")
+            self.client = self._new_client()
+            self.logger.info("Соединение с ClickHouse установлено.")
+            self._ensure_schema(self.client)
 
         except Exception as error:
             self.logger.error(f"Ошибка подключения к ClickHouse: {error}")
             self.client = None
 
+    def clone(self):
+        """Возвращает неподключенную копию с теми же параметрами (например, для отдельного потока)."""
+        return ClickHouseDatabase(self.host, self.port, self.user, self.password, self.schema,
+                                  metrics_exporter=self.metrics_exporter, compression=self.compression,
+                                  insert_block_size=self.insert_block_size, async_insert=self.async_insert,
+                                  wait_for_async_insert=self.wait_for_async_insert,
+                                  max_insert_block_size=self.max_insert_block_size,
+                                  insert_settings=self.insert_settings, result_cache=self.result_cache)
+
     def disconnect(self):
         """Отключается от ClickHouse."""
         if self.client:
             self.client.close()
             self.logger.info("Соединение с ClickHouse закрыто.")
+        if self.pool:
+            self.pool.close_all()
+            self.pool = None
+
+    @contextmanager
+    def session(self):
+        """
+        Выдает объект ClickHouseDatabase с отдельным клиентом на время блока with.
+
+        В режиме пула клиент берется из пула (с проверкой ping) и возвращается
+        в него по выходе. Без пула используется собственный клиент объекта;
+        если его нет, он создается на время блока.
+        """
+        if self.pool:
+            with self.pool.connection() as client:
+                session = self.clone()
+                session.client = client
+                yield session
+            return
+        if self.client:
+            yield self
+            return
+        self.connect()
+        if self.client is None:
+            raise ConnectionError("Не удалось подключиться к ClickHouse.")
+        try:
+            yield self
+        finally:
+            self.disconnect()
+            self.client = None
+
+    def pool_stats(self):
+        """Возвращает метрики пула клиентов или None, если пул не используется."""
+        return self.pool.stats() if self.pool else None
+
+    def transport_settings(self):
+        """Настройки сжатия и вставки для TransferMetrics.settings."""
+        return {"compression": self.compression, "insert_block_size": self.insert_block_size, **self.insert_settings}
 
     @staticmethod
     def get_clickhouse_types(df):
@@ -80,18 +188,49 @@ class ClickHouseDatabase:
             'datetime64[ns, UTC]': 'Nullable(DateTime)',
             'timedelta64[ns]': 'Nullable(String)',
             'category': 'Nullable(String)',
+            'Int64': 'Nullable(Int64)',
+            'Int32': 'Nullable(Int32)',
+            'Int16': 'Nullable(Int16)',
+            'Float64': 'Nullable(Float64)',
+            'boolean': 'Nullable(UInt8)',
+            'string': 'Nullable(String)',
         }
         return [dtype_mapping.get(str(dtype), 'Nullable(String)') for dtype in df.dtypes]
 
-    def create_table(self, table_name, df, engine="MergeTree", engine_params=None):
-        """Создает таблицу в ClickHouse в указанной схеме."""
+    def get_validator(self, full_table_name):
+        """Возвращает функцию проверки порций по типам столбцов таблицы (DESCRIBE TABLE, см. validation)."""
+        columns = [row[:2] for row in self.client.query(f"DESCRIBE TABLE {full_table_name}").result_rows]
+        return compile_validator(clickhouse_rules(columns))
+
+    def create_table(self, table_name, df, engine="MergeTree", engine_params=None, column_types=None, order_by=None,
+                     partition_by=None):
+        """Создает таблицу в ClickHouse в указанной схеме.
+
+        :param column_types: список пар (столбец, тип ClickHouse); по умолчанию типы берутся из get_clickhouse_types
+        :param order_by: список столбцов или выражение ключа сортировки; по умолчанию tuple().
+                         Столбцы из списка создаются без Nullable: ClickHouse не допускает
+                         Nullable в ключе сортировки и в столбце версии ReplacingMergeTree
+        :param partition_by: выражение партиционирования
+        """
         full_table_name = f"{self.schema}.{table_name}" if self.schema else table_name
-        ch_table_schema = ", ".join(f"{col} {dtype}" for col, dtype in zip(df.columns, self.get_clickhouse_types(df)))
-        engine_clause = f"{engine}({engine_params})" if engine == "ReplicatedMergeTree" and engine_params else engine
+        if column_types is None:
+            column_types = zip(df.columns, self.get_clickhouse_types(df))
+        not_null = list(order_by) if isinstance(order_by, (list, tuple)) else []
+        if "Replacing" in engine and engine_params:
+            # Столбец версии ReplacingMergeTree (последний параметр движка) тоже не может быть Nullable
+            not_null.append(engine_params.split(",")[-1].strip())
+        if not_null:
+            column_types = [(col, _strip_nullable(dtype) if col in not_null else dtype) for col, dtype in column_types]
+        ch_table_schema = ", ".join(f"{col} {dtype}" for col, dtype in column_types)
+        # Параметры движка передаются всем движкам, кроме простого MergeTree (у него параметров нет)
+        engine_clause = f"{engine}({engine_params})" if engine != "MergeTree" and engine_params else engine
+        if isinstance(order_by, (list, tuple)):
+            order_by = f"({', '.join(order_by)})" if order_by else None
+        partition_clause = f" PARTITION BY {partition_by}" if partition_by else ""
         create_table_query = f"""
         CREATE TABLE IF NOT EXISTS {full_table_name} (
             {ch_table_schema}
-        ) ENGINE = {engine_clause} ORDER BY tuple();
+        ) ENGINE = {engine_clause}{partition_clause} ORDER BY {order_by or 'tuple()'};
         """
         try:
             self.client.command(create_table_query)
@@ -99,79 +238,785 @@ class ClickHouseDatabase:
         except Exception as error:
             self.logger.error(f"Ошибка при создании таблицы в ClickHouse: {error}")
 
-    def load_data(self, table_name, df):
-        """Загружает данные из DataFrame в ClickHouse."""
-        full_table_name = f"{self.schema}.{table_name}" if self.schema else table_name
+    def infer_schema(self, df, source, target, state_store=None, exact=True, source_columns=None, order_by="auto",
+                     partition_by=None):
+        """
+        Выводит компактную схему таблицы по выборке данных и кэширует ее в state_store.
+
+        При повторном запуске для той же пары источник/приемник схема берется
+        из кэша без выборки, если набор столбцов не изменился. Схема, суженная
+        по полным данным (exact=True), подходит только для этих данных и
+        в кэш не пишется и из кэша не берется.
+        """
+        if exact:
+            schema = infer_clickhouse_schema(df, exact=True, source_columns=source_columns, order_by=order_by,
+                                             partition_by=partition_by)
+            self.logger.info(f"Схема для {source} -> {target} выведена по полным данным: {schema}")
+            return schema
+        state_store = state_store or StateStore()
+        cached = state_store.get_schema(source, target)
+        if cached and [column for column, _ in cached["columns"]] == list(df.columns):
+            self.logger.info(f"Схема для {source} -> {target} взята из кэша.")
+            return cached
+        schema = infer_clickhouse_schema(df, exact=exact, source_columns=source_columns, order_by=order_by,
+                                         partition_by=partition_by)
+        state_store.set_schema(source, target, schema)
+        self.logger.info(f"Схема для {source} -> {target} выведена по выборке: {schema}")
+        return schema
+
+    def _create_target_table(self, postgres_db, pg_table, ch_table, df, engine, engine_params, column_mapping,
+                             infer_schema, exact, state_store, order_by, partition_by, write_mode="append"):
+        """Создает таблицу-приемник по выведенной схеме или по типам pandas.
+
+        При write_mode="swap" вместо целевой пересоздается промежуточная таблица.
+        """
+        table_name = ch_table
+        if write_mode == "swap":
+            table_name = self.staging_table_name(ch_table)
+            self.client.command(f"DROP TABLE IF EXISTS {self._full_name(table_name)}")
+        if not infer_schema:
+            self.create_table(table_name, df, engine, engine_params, order_by=order_by, partition_by=partition_by)
+            return
+        full_table_name = f"{self.schema}.{ch_table}" if self.schema else ch_table
+        source_columns = {
+            (column_mapping or {}).get(column, column): info
+            for column, info in postgres_db.get_column_info(pg_table).items()
+        }
+        schema = self.infer_schema(df, pg_table, full_table_name, state_store, exact, source_columns,
+                                   "auto" if order_by is None else order_by, partition_by)
+        self.create_table(table_name, df, engine, engine_params, column_types=schema["columns"],
+                          order_by=schema["order_by"], partition_by=schema["partition_by"])
+
+    @staticmethod
+    def _write_mode_options(write_mode, engine, engine_params, order_by, key_columns, version_column):
+        """
+        Возвращает движок, его параметры и ORDER BY для write_mode.
+
+        Для "upsert" движок *MergeTree заменяется на *ReplacingMergeTree с ключом
+        сортировки key_columns: строки с одинаковым ключом схлопываются при слияниях
+        частей, остается строка с максимальным version_column (или последняя вставленная).
+        version_column должен быть целым числом, Date или DateTime.
+        """
+        if write_mode != "upsert":
+            return engine, engine_params, order_by
+        if not key_columns:
+            raise ValueError("Для write_mode='upsert' нужно указать key_columns.")
+        if "Replacing" not in engine:
+            engine = engine.replace("MergeTree", "ReplacingMergeTree")
+        if not engine.startswith("Replicated"):
+            engine_params = version_column
+        elif version_column:
+            engine_params = f"{engine_params}, {version_column}" if engine_params else version_column
+        return engine, engine_params, list(key_columns)
+
+    def create_dedup_view(self, ch_table):
+        """Создает представление {ch_table}_final с чтением через FINAL - без дублей до слияния частей."""
+        full_table_name = self._full_name(ch_table)
+        view_name = self._full_name(f"{ch_table}_final")
         try:
-            self.client.insert_df(full_table_name, df)
-            self.logger.info(f"Данные успешно загружены в таблицу {full_table_name} в ClickHouse.")
+            self.client.command(f"CREATE VIEW IF NOT EXISTS {view_name} AS SELECT * FROM {full_table_name} FINAL")
+            self.logger.info(f"Представление {view_name} создано в ClickHouse.")
         except Exception as error:
-            self.logger.error(f"Ошибка при загрузке данных в ClickHouse: {error}")
+            self.logger.error(f"Ошибка при создании представления {view_name}: {error}")
 
-    def transfer_from_postgres(self, postgres_db, pg_table, ch_table, column_mapping=None, engine="MergeTree", engine_params=None):
-        """Копирует данные из PostgreSQL в ClickHouse с переименованием колонок."""
-        query = f"SELECT * FROM {pg_table};"
-        try:
-            with postgres_db.conn.cursor() as cursor:
-                cursor.execute(query)
-                colnames = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
-                df = pd.DataFrame(rows, columns=colnames)
-                self.logger.info(f"Данные из таблицы {pg_table} получены из PostgreSQL.")
+    def _full_name(self, table_name):
+        return f"{self.schema}.{table_name}" if self.schema else table_name
 
-                if column_mapping:
-                    df.rename(columns=column_mapping, inplace=True)
-                    self.logger.info(f"Столбцы переименованы согласно column_mapping: {column_mapping}")
+    @staticmethod
+    def staging_table_name(table_name):
+        """Имя промежуточной таблицы для write_mode="swap"."""
+        return f"{table_name}__staging"
 
-                self.create_table(ch_table, df, engine, engine_params)
-                self.load_data(ch_table, df)
-                self.logger.info(f"Данные из PostgreSQL успешно загружены в ClickHouse в таблицу {ch_table}.")
-        except Exception as error:
-            self.logger.error(f"Ошибка при копировании данных из PostgreSQL в ClickHouse: {error}")
+    def swap_staging_table(self, ch_table, metrics=None):
+        """
+        Подменяет целевую таблицу загруженной промежуточной через EXCHANGE TABLES.
 
-    def transfer_to_postgres(self, postgres_db, ch_table, pg_table, column_mapping=None):
-        """Копирует данные из ClickHouse в PostgreSQL с переименованием колонок."""
-        full_table_name = f"{self.schema}.{ch_table}" if self.schema else ch_table
+        EXCHANGE TABLES атомарно меняет таблицы местами (нужен движок базы
+        Atomic), после чего промежуточная таблица со старыми данными удаляется.
+        Если целевой таблицы еще нет, промежуточная просто переименовывается.
+        Возвращает True при успешной подмене.
+        """
+        full_table_name = self._full_name(ch_table)
+        full_staging_name = self._full_name(self.staging_table_name(ch_table))
+        metrics = metrics or TransferMetrics("swap_staging_table", target=full_table_name)
         try:
-            query = f"SELECT * FROM {full_table_name};"
-            df = self.client.query_df(query)
-            self.logger.info(f"Данные из таблицы {full_table_name} успешно получены из ClickHouse.")
-
-            if column_mapping:
-                df.rename(columns=column_mapping, inplace=True)
-                self.logger.info(f"Столбцы переименованы согласно column_mapping: {column_mapping}")
-
-            with postgres_db.connection.cursor() as cursor:
-                columns = ", ".join([f"{col} {self.get_postgres_type(dtype)}" for col, dtype in zip(df.columns, df.dtypes)])
-                create_table_query = sql.SQL("CREATE TABLE IF NOT EXISTS {} ({})").format(
-                    sql.Identifier(pg_table),
-                    sql.SQL(columns)
-                )
-                cursor.execute(create_table_query)
-                postgres_db.connection.commit()
-                self.logger.info(f"Таблица {pg_table} создана в PostgreSQL.")
-
-                insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
-                    sql.Identifier(pg_table),
-                    sql.SQL(", ").join(map(sql.Identifier, df.columns))
-                )
-                execute_values(cursor, insert_query.as_string(cursor), df.values.tolist())
-                postgres_db.connection.commit()
-                self.logger.info(f"Данные успешно загружены в таблицу {pg_table} в PostgreSQL.")
+            with metrics.phase("swap"):
+                if self.client.command(f"EXISTS TABLE {full_table_name}"):
+                    self.client.command(f"EXCHANGE TABLES {full_staging_name} AND {full_table_name}")
+                    self.client.command(f"DROP TABLE {full_staging_name}")
+                else:
+                    self.client.command(f"RENAME TABLE {full_staging_name} TO {full_table_name}")
+            self.logger.info(f"Таблица {full_table_name} подменена загруженной таблицей {full_staging_name}.")
+            return True
         except Exception as error:
-            self.logger.error(f"Ошибка при копировании данных из ClickHouse в PostgreSQL: {error}")
+            self.logger.error(f"Ошибка при подмене таблицы {full_table_name}: {error}")
+            metrics.fail(error)
+            return False
+
+    def load_data(self, table_name, df, quarantine=None, metrics=None):
+        """Загружает данные из DataFrame в ClickHouse (блоками по insert_block_size строк, если он задан).
+
+        :param quarantine: путь к CSV-файлу карантина; если задан, строки проверяются по типам
+                           столбцов таблицы, и не прошедшие проверку пишутся в файл, а не в таблицу
+        :return: TransferMetrics с количеством вставок, строками, байтами и настройками вставки
+        """
+        full_table_name = f"{self.schema}.{table_name}" if self.schema else table_name
+        with track_transfer(metrics, "load_data", target=full_table_name, exporter=self.metrics_exporter,
+                            logger=self.logger) as metrics:
+            try:
+                if quarantine:
+                    df = next(validated_chunks([df], self.get_validator(full_table_name), quarantine, metrics))
+                self._insert_chunk(full_table_name, df, metrics)
+                self.logger.info(f"Данные успешно загружены в таблицу {full_table_name} в ClickHouse.")
+                self._log_quarantine(full_table_name, quarantine, metrics.quarantined)
+            except Exception as error:
+                self.logger.error(f"Ошибка при загрузке данных в ClickHouse: {error}")
+                metrics.fail(error)
+        return metrics
+
+    def transfer_from_postgres(self, postgres_db, pg_table, ch_table, column_mapping=None, engine="MergeTree", engine_params=None,
+                               chunk_size=None, itersize=None, incremental_column=None, state_store=None,
+                               infer_schema=False, order_by=None, partition_by=None, write_mode="append",
+                               key_columns=None, version_column=None, dedup_view=False, checkpoint_column=None,
+                               chunk_retries=3, retry_delay=5, transforms=None, quarantine=None, metrics=None):
+        """Копирует данные из PostgreSQL в ClickHouse с переименованием колонок.
+
+        При заданном chunk_size данные читаются серверным курсором порциями
+        и каждая порция сразу отправляется в ClickHouse, поэтому расход памяти
+        ограничен размером порции, а не размером таблицы.
+
+        При заданном incremental_column (монотонный id или updated_at в таблице
+        PostgreSQL) переносятся только строки новее сохраненной в state_store
+        границы; после успешного переноса граница сдвигается на максимум.
+
+        При infer_schema=True типы столбцов, ORDER BY (по умолчанию "auto")
+        и PARTITION BY выводятся по первой порции и кэшируются в state_store.
+        Ширина целых и точность дат сужаются по самим данным только при полной
+        загрузке без порций в режиме "swap"; при дозагрузке (append, upsert,
+        incremental_column) типы берутся по объявленным типам PostgreSQL.
+
+        При write_mode="swap" данные загружаются в промежуточную таблицу,
+        которая после загрузки атомарно подменяет целевую (EXCHANGE TABLES);
+        по умолчанию ("append") строки дописываются в целевую таблицу.
+
+        При write_mode="upsert" таблица создается на ReplacingMergeTree с ключом
+        key_columns (версия строки - version_column), и повторный перенос не
+        дублирует данные; вместе с incremental_column переносятся только
+        изменившиеся строки. dedup_view=True создает представление {ch_table}_final
+        с чтением через FINAL.
+
+        При заданном checkpoint_column (уникальный возрастающий ключ таблицы
+        PostgreSQL) перенос идет порциями по ключу (WHERE ключ > последний
+        ORDER BY ключ LIMIT chunk_size), и после записи каждой порции ее ключ
+        сохраняется в state_store. Перезапуск после сбоя продолжает с последней
+        записанной порции. Чтение и запись порции повторяются до chunk_retries
+        раз с паузой retry_delay секунд без перезапуска всего переноса; вставка
+        идет с insert_deduplication_token, поэтому повтор уже записанной
+        порции не создает дублей. Токен включает идентификатор переноса,
+        сохраненный в контрольной точке: его повторно использует только
+        продолжение того же переноса, а новый перенос тех же диапазонов ключа
+        (полная перезагрузка, повторная дозагрузка, upsert) не отбрасывается
+        как дубль. Для MergeTree на время переноса включается настройка
+        non_replicated_deduplication_window; после загрузки она сбрасывается.
+
+        transforms - правила преобразования порций (см. transforms.compile_transforms),
+        применяются после переименования по column_mapping.
+
+        При заданном quarantine (путь к CSV-файлу) порции проверяются по типам
+        таблицы-приемника (см. validation): отклоненные строки с причиной пишутся
+        в файл, остальные вставляются.
+
+        :return: TransferMetrics по фазам read, dataframe, transform, validate, create_table, write, swap
+        """
+        full_table_name = f"{self.schema}.{ch_table}" if self.schema else ch_table
+        insert_table_name = self._full_name(self.staging_table_name(ch_table)) if write_mode == "swap" \
+            else full_table_name
+        query = f"SELECT * FROM {pg_table}"
+        params = None
+        watermark = high_watermark = None
+        with track_transfer(metrics, "transfer_from_postgres", source=pg_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                if incremental_column and write_mode not in ("append", "upsert"):
+                    raise ValueError("Инкрементальный перенос поддерживает только write_mode='append' или 'upsert'.")
+                engine, engine_params, order_by = self._write_mode_options(write_mode, engine, engine_params, order_by,
+                                                                           key_columns, version_column)
+                if incremental_column or checkpoint_column:
+                    state_store = state_store or StateStore()
+                if incremental_column:
+                    watermark = high_watermark = state_store.get_watermark(pg_table, full_table_name)
+                    if watermark is not None:
+                        query += f" WHERE {incremental_column} > %(watermark)s"
+                        params = {"watermark": watermark}
+                        self.logger.info(f"Инкрементальный перенос {pg_table}: {incremental_column} > {watermark}.")
+
+                checkpoint = None
+                run_id = None
+                if checkpoint_column:
+                    checkpoint = state_store.get_checkpoint(pg_table, full_table_name)
+                    run_id = (checkpoint or {}).get("run_id") or uuid.uuid4().hex
+                    chunk_size = chunk_size or 100_000
+                    if checkpoint:
+                        self.logger.info(f"Перенос {pg_table} продолжается после {checkpoint_column} = "
+                                         f"{checkpoint['key']}: уже записано {checkpoint['rows']} строк.")
+                        if checkpoint["watermark"] is not None and \
+                                (high_watermark is None or checkpoint["watermark"] > high_watermark):
+                            high_watermark = checkpoint["watermark"]
+                    chunks = self._keyset_chunks(postgres_db, query, params, checkpoint_column,
+                                                 checkpoint["key"] if checkpoint else None, chunk_size,
+                                                 chunk_retries, retry_delay, metrics)
+                else:
+                    chunks = postgres_db.iter_query_chunks(query, params, chunk_size=chunk_size, itersize=itersize,
+                                                           metrics=metrics)
+                transform = compile_transforms(transforms) if transforms else None
+                validate = None
+                committed_rows = checkpoint["rows"] if checkpoint else 0
+                committed_chunks = checkpoint["chunks"] if checkpoint else 0
+                for chunk_number, df in enumerate(chunks):
+                    if checkpoint_column and not df.empty:
+                        chunk_low = StateStore.to_python(df[checkpoint_column].iloc[0])
+                        chunk_high = StateStore.to_python(df[checkpoint_column].iloc[-1])
+                    if incremental_column and not df.empty:
+                        chunk_max = StateStore.to_python(df[incremental_column].max())
+                        if chunk_max is not None and (high_watermark is None or chunk_max > high_watermark):
+                            high_watermark = chunk_max
+
+                    if column_mapping:
+                        with metrics.phase("transform"):
+                            df.rename(columns=column_mapping, inplace=True)
+                    if transform:
+                        with metrics.phase("transform"):
+                            df = transform(df)
+
+                    if chunk_number == 0 and checkpoint is None:
+                        self.logger.info(f"Начато чтение таблицы {pg_table} из PostgreSQL.")
+                        if column_mapping:
+                            self.logger.info(f"Столбцы переименованы согласно column_mapping: {column_mapping}")
+                        # Типы сужаются по данным, только если таблица заполняется один раз целиком:
+                        # в дозагружаемую таблицу позже придут значения шире первой выборки
+                        exact = chunk_size is None and write_mode == "swap" and not incremental_column \
+                            and not checkpoint_column
+                        with metrics.phase("create_table"):
+                            self._create_target_table(postgres_db, pg_table, ch_table, df, engine, engine_params,
+                                                      column_mapping, infer_schema, exact, state_store,
+                                                      order_by, partition_by, write_mode)
+                            if checkpoint_column and not engine.startswith("Replicated"):
+                                # Без этой настройки MergeTree не дедуплицирует вставки по токену
+                                self.client.command(f"ALTER TABLE {insert_table_name} MODIFY SETTING "
+                                                    f"non_replicated_deduplication_window = 1000")
+                    if quarantine and validate is None:
+                        validate = self.get_validator(insert_table_name)
+                    if validate:
+                        df = next(validated_chunks([df], validate, quarantine, metrics))
+
+                    if not df.empty and checkpoint_column:
+                        # Повтор вставки с тем же токеном ClickHouse отбрасывает как дубль
+                        token = f"{run_id}:{pg_table}:{checkpoint_column}:{chunk_low}:{chunk_high}"
+                        insert = retry(chunk_retries, retry_delay, self.logger, metrics.record_retry)(self._insert_chunk)
+                        insert(insert_table_name, df, metrics, settings={"insert_deduplication_token": token})
+                        committed_rows += len(df)
+                        committed_chunks += 1
+                        state_store.set_checkpoint(pg_table, full_table_name, chunk_high, committed_rows,
+                                                   committed_chunks, high_watermark, run_id)
+                        self.logger.info(f"Порция {committed_chunks} ({len(df)} строк, {checkpoint_column} "
+                                         f"{chunk_low}..{chunk_high}) загружена в таблицу {insert_table_name}.")
+                    elif not df.empty:
+                        self._insert_chunk(insert_table_name, df, metrics)
+                        self.logger.info(f"Порция {chunk_number + 1} ({len(df)} строк) загружена в таблицу {insert_table_name}.")
+
+                if checkpoint_column and not engine.startswith("Replicated"):
+                    # Окно дедупликации нужно только для повторов внутри этого переноса
+                    self.client.command(f"ALTER TABLE {insert_table_name} "
+                                        f"RESET SETTING non_replicated_deduplication_window")
+                if write_mode == "swap" and not self.swap_staging_table(ch_table, metrics):
+                    return metrics
+                if write_mode == "upsert" and dedup_view:
+                    self.create_dedup_view(ch_table)
+                if incremental_column and high_watermark is not None and high_watermark != watermark:
+                    state_store.set_watermark(pg_table, full_table_name, high_watermark)
+                if checkpoint_column:
+                    state_store.clear_checkpoint(pg_table, full_table_name)
+                self.logger.info(f"Данные из PostgreSQL успешно загружены в ClickHouse в таблицу {ch_table}, строк: {metrics.rows}.")
+                self._log_quarantine(full_table_name, quarantine, metrics.quarantined)
+            except Exception as error:
+                self.logger.error(f"Ошибка при копировании данных из PostgreSQL в ClickHouse: {error}")
+                metrics.fail(error)
+                if postgres_db.conn and not postgres_db.conn.closed:
+                    postgres_db.conn.rollback()
+        return metrics
+
+    def _log_quarantine(self, table_name, quarantine, rows):
+        if rows:
+            self.logger.warning(f"Таблица {table_name}: строк, не прошедших проверку: {rows}, "
+                                f"они записаны в файл карантина {quarantine}.")
+
+    def _keyset_chunks(self, postgres_db, query, params, key_column, after, chunk_size, retries, delay, metrics):
+        """
+        Читает результат query порциями по возрастанию key_column, начиная после значения after.
+
+        Каждая порция - отдельный запрос, поэтому после обрыва соединения
+        чтение повторяется (с переподключением) только для текущей порции.
+        """
+        condition = " AND " if " WHERE " in query else " WHERE "
+
+        @retry(retries, delay, self.logger, metrics.record_retry)
+        def read_chunk(after):
+            chunk_query, chunk_params = query, dict(params or {})
+            if after is not None:
+                chunk_query += f"{condition}{key_column} > %(checkpoint)s"
+                chunk_params["checkpoint"] = after
+            chunk_query += f" ORDER BY {key_column} LIMIT {int(chunk_size)}"
+            try:
+                return next(postgres_db.iter_query_chunks(chunk_query, chunk_params or None, metrics=metrics))
+            except Exception:
+                postgres_db.reset_connection()
+                raise
+
+        first = True
+        while True:
+            df = read_chunk(after)
+            if df.empty:
+                if first:
+                    yield df
+                return
+            first = False
+            after = StateStore.to_python(df[key_column].iloc[-1])
+            yield df
+            if len(df) < chunk_size:
+                return
+
+    def _insert_blocks(self, rows, settings):
+        """
+        Делит порцию из rows строк на вставки по insert_block_size строк.
+
+        Возвращает пары (срез строк, настройки вставки) с настройками из конструктора;
+        токен дедупликации получает номер блока, чтобы блоки одной порции
+        не считались повторами друг друга.
+        """
+        settings = {**self.insert_settings, **(settings or {})}
+        block_size = self.insert_block_size or rows or 1
+        token = settings.get("insert_deduplication_token")
+        blocks = []
+        for number, start in enumerate(range(0, max(rows, 1), block_size)):
+            block_settings = dict(settings)
+            if token and rows > block_size:
+                block_settings["insert_deduplication_token"] = f"{token}:{number}"
+            blocks.append((slice(start, start + block_size), block_settings))
+        return blocks
 
     @staticmethod
-    def get_postgres_type(dtype):
-        """Преобразует типы данных Pandas в соответствующие типы PostgreSQL."""
-        dtype_mapping = {
-            'float64': 'DOUBLE PRECISION',
-            'float32': 'REAL',
-            'object': 'TEXT',
-            'int64': 'BIGINT',
-            'int32': 'INTEGER',
-            'int16': 'SMALLINT',
-            'bool': 'BOOLEAN',
-            'datetime64[ns]': 'TIMESTAMP',
-        }
-        return dtype_mapping.get(str(dtype), 'TEXT')
+    def _uncompressed_bytes(summary, block_bytes):
+        """
+        Объем вставки без сжатия: written_bytes() из сводки сервера, иначе размер блока в памяти.
+
+        Размер сжатого HTTP-запроса clickhouse-connect не сообщает, поэтому
+        от compression этот объем не зависит - эффект сжатия виден по времени вставок.
+        """
+        written_bytes = summary.written_bytes() if hasattr(summary, "written_bytes") else 0
+        return written_bytes or int(block_bytes)
+
+    def _insert_chunk(self, full_table_name, df, metrics, settings=None):
+        """Вставляет порцию и учитывает ее в metrics (фаза "write"; сериализация идет внутри insert_df).
+
+        Каждая вставка (блок из insert_block_size строк) учитывается в metrics отдельной порцией.
+        """
+        metrics.settings.update(self.transport_settings())
+        for rows, block_settings in self._insert_blocks(len(df), settings):
+            block = df.iloc[rows] if self.insert_block_size else df
+            started = time.perf_counter()
+            summary = self.client.insert_df(full_table_name, block, settings=block_settings) if block_settings \
+                else self.client.insert_df(full_table_name, block)
+            seconds = time.perf_counter() - started
+            metrics.add_phase_time("write", seconds)
+            metrics.record_chunk(len(block), self._uncompressed_bytes(summary, block.memory_usage(deep=False).sum()),
+                                 seconds)
+
+    def transfer_from_postgres_parallel(self, postgres_db, pg_table, ch_table, column_mapping=None, engine="MergeTree",
+                                        engine_params=None, partition_column=None, workers=4,
+                                        max_inflight_rows=400_000, itersize=None, use_processes=False,
+                                        infer_schema=False, state_store=None, order_by=None, partition_by=None,
+                                        write_mode="append", key_columns=None, version_column=None,
+                                        dedup_view=False, transforms=None, metrics=None):
+        """
+        Параллельно копирует таблицу из PostgreSQL в ClickHouse по диапазонам ключа.
+
+        Таблица делится на диапазоны (по partition_column или по блокам ctid),
+        каждый диапазон читается своим соединением с PostgreSQL и загружается
+        своим клиентом ClickHouse. Одновременно в памяти находится не более
+        max_inflight_rows строк: каждый из workers читает порции по
+        max_inflight_rows // workers строк. Метрики диапазонов объединяются
+        в один TransferMetrics; ошибки диапазонов пишутся в лог.
+
+        При write_mode="swap" диапазоны загружаются в промежуточную таблицу,
+        которая подменяет целевую, только если все диапазоны загружены без ошибок.
+        write_mode="upsert" и transforms работают как в transfer_from_postgres;
+        правила transforms компилируются в каждом исполнителе.
+
+        :return: TransferMetrics, объединенные по всем диапазонам
+        """
+        chunk_size = max(1, max_inflight_rows // workers)
+        with track_transfer(metrics, "transfer_from_postgres_parallel", source=pg_table, target=ch_table,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                engine, engine_params, order_by = self._write_mode_options(write_mode, engine, engine_params,
+                                                                           order_by, key_columns, version_column)
+                sample = next(postgres_db.iter_query_chunks(f"SELECT * FROM {pg_table} LIMIT 1000"))
+                if column_mapping:
+                    sample.rename(columns=column_mapping, inplace=True)
+                if transforms:
+                    sample = compile_transforms(transforms)(sample)
+                with metrics.phase("create_table"), self.session() as ch:
+                    ch._create_target_table(postgres_db, pg_table, ch_table, sample, engine, engine_params,
+                                            column_mapping, infer_schema, False, state_store, order_by, partition_by,
+                                            write_mode)
+                ranges = postgres_db.get_partition_ranges(pg_table, workers, partition_column)
+            except Exception as error:
+                self.logger.error(f"Ошибка при подготовке параллельного переноса из PostgreSQL в ClickHouse: {error}")
+                metrics.fail(error)
+                if postgres_db.conn:
+                    postgres_db.conn.rollback()
+                return metrics
+            self._run_partitions(postgres_db, pg_table, ch_table, ranges, column_mapping, chunk_size, itersize,
+                                 workers, use_processes, write_mode, dedup_view, transforms, metrics)
+        return metrics
+
+    def _run_partitions(self, postgres_db, pg_table, ch_table, ranges, column_mapping, chunk_size, itersize, workers,
+                        use_processes, write_mode, dedup_view, transforms, metrics):
+        """Переносит диапазоны в пуле исполнителей и объединяет их метрики в metrics."""
+        self.logger.info(f"Параллельный перенос {pg_table} -> {ch_table}: {len(ranges)} диапазонов, "
+                         f"{workers} исполнителей, порция {chunk_size} строк.")
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        # Потоки берут соединения из пулов, если они настроены. Иначе каждый диапазон получает
+        # свои копии объектов: session() без пула подключается и отключается сам, и общая копия
+        # закрыла бы соединение, которым еще пользуются другие исполнители
+        share_pg = postgres_db.pool is not None and not use_processes
+        share_ch = self.pool is not None and not use_processes
+        insert_table = self.staging_table_name(ch_table) if write_mode == "swap" else ch_table
+        with executor_class(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_transfer_partition, postgres_db if share_pg else postgres_db.clone(),
+                                self if share_ch else self.clone(), pg_table, insert_table,
+                                condition, params, column_mapping, chunk_size, itersize, number, len(ranges),
+                                transforms)
+                for number, (condition, params) in enumerate(ranges, start=1)
+            ]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            metrics.merge(result["metrics"])
+        failed = [result for result in results if result["error"]]
+        if failed:
+            metrics.fail(f"ошибки в {len(failed)} диапазонах: "
+                         + "; ".join(f"{result['condition']}: {result['error']}" for result in failed))
+            self.logger.error(f"Параллельный перенос {pg_table} завершен с ошибками в {len(failed)} диапазонах.")
+            return
+        if write_mode in ("swap", "upsert"):
+            with self.session() as ch:
+                if write_mode == "swap":
+                    ch.swap_staging_table(ch_table, metrics)
+                elif dedup_view:
+                    ch.create_dedup_view(ch_table)
+        if metrics.ok:
+            self.logger.info(f"Параллельный перенос {pg_table} завершен: {metrics.rows} строк "
+                             f"за {metrics.elapsed:.1f} с.")
+
+    async def transfer_from_postgres_async(self, postgres_db, pg_table, ch_table, column_mapping=None,
+                                           engine="MergeTree", engine_params=None, chunk_size=100_000,
+                                           itersize=None, queue_size=2, order_by=None, partition_by=None,
+                                           write_mode="append", key_columns=None, version_column=None,
+                                           dedup_view=False, transforms=None, metrics=None):
+        """
+        Копирует таблицу из PostgreSQL в ClickHouse асинхронным конвейером (см. AsyncTransfer).
+
+        Чтение порций серверным курсором, преобразование порций (переименование
+        по column_mapping и правила transforms) и вставка в ClickHouse идут
+        одновременно в разных стадиях, связанных очередями на queue_size порций.
+        Режимы write_mode - как в transfer_from_postgres;
+        инкрементальный перенос и контрольные точки здесь не поддерживаются.
+        Поскольку фазы перекрываются, их сумма в metrics может превышать общее время.
+
+        Использование: asyncio.run(ch_db.transfer_from_postgres_async(pg_db, "reviews", "reviews_ch"))
+
+        :return: TransferMetrics по фазам read, dataframe, transform, create_table, write, swap
+        """
+        full_table_name = self._full_name(ch_table)
+        insert_table_name = self._full_name(self.staging_table_name(ch_table)) if write_mode == "swap" \
+            else full_table_name
+        with track_transfer(metrics, "transfer_from_postgres_async", source=pg_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                engine, engine_params, order_by = self._write_mode_options(write_mode, engine, engine_params, order_by,
+                                                                           key_columns, version_column)
+                chunks = postgres_db.iter_query_chunks(f"SELECT * FROM {pg_table}", chunk_size=chunk_size,
+                                                       itersize=itersize, metrics=metrics)
+
+                transform = compile_transforms(transforms) if transforms else None
+
+                def convert(df):
+                    with metrics.phase("transform"):
+                        if column_mapping:
+                            df.rename(columns=column_mapping, inplace=True)
+                        return transform(df) if transform else df
+
+                def write(chunks):
+                    for chunk_number, df in enumerate(chunks):
+                        if chunk_number == 0:
+                            with metrics.phase("create_table"):
+                                self._create_target_table(postgres_db, pg_table, ch_table, df, engine, engine_params,
+                                                          column_mapping, False, False, None, order_by, partition_by,
+                                                          write_mode)
+                        if not df.empty:
+                            self._insert_chunk(insert_table_name, df, metrics)
+                            self.logger.info(f"Порция {chunk_number + 1} ({len(df)} строк) загружена в таблицу "
+                                             f"{insert_table_name}.")
+
+                self.logger.info(f"Начат асинхронный перенос таблицы {pg_table} из PostgreSQL.")
+                await AsyncTransfer(queue_size).run(chunks, write, convert if column_mapping or transform else None)
+
+                if write_mode == "swap" and not self.swap_staging_table(ch_table, metrics):
+                    return metrics
+                if write_mode == "upsert" and dedup_view:
+                    self.create_dedup_view(ch_table)
+                self.logger.info(f"Данные из PostgreSQL асинхронно загружены в ClickHouse в таблицу {ch_table}, "
+                                 f"строк: {metrics.rows}.")
+            except Exception as error:
+                self.logger.error(f"Ошибка при асинхронном копировании данных из PostgreSQL в ClickHouse: {error}")
+                metrics.fail(error)
+                if postgres_db.conn and not postgres_db.conn.closed:
+                    postgres_db.conn.rollback()
+        return metrics
+
+    def table_version(self, ch_table):
+        """
+        Версия данных таблицы по ее активным кускам в system.parts.
+
+        Возвращает [время последнего изменения, строки, хэш имен кусков]: любая
+        вставка, слияние или мутация меняет набор кусков. None - если кусков нет
+        (пустая таблица, представление или движок не из семейства MergeTree).
+        """
+        database, _, table = ch_table.rpartition(".")
+        database = database or self.schema
+        row = self.client.query(
+            f"""SELECT count(), max(modification_time), sum(rows), groupBitXor(cityHash64(name))
+                FROM system.parts
+                WHERE database = {'%(database)s' if database else 'currentDatabase()'}
+                  AND table = %(table)s AND active""",
+            parameters={"database": database, "table": table}
+        ).result_rows[0]
+        return [str(value) for value in row[1:]] if row[0] else None
+
+    def _cached_stream(self, kind, query, parameters, cache_table, stream, metrics, to_arrow=None, from_arrow=None):
+        """
+        Возвращает поток результата через result_cache.
+
+        Если для запроса и текущей версии cache_table есть запись, порции читаются
+        из нее (время - в фазе "read"), иначе поток stream() пишется в кэш по мере чтения.
+        """
+        version = self.table_version(cache_table)
+        if version is None:
+            metrics.settings["result_cache"] = "bypass"
+            return stream()
+        path = self.result_cache.path(f"{kind}:{query}", parameters, version)
+        cached = self.result_cache.read(path, from_arrow)
+        if cached is not None:
+            metrics.settings["result_cache"] = "hit"
+            self.logger.info(f"Результат запроса к {cache_table} читается из кэша {path}.")
+            return metrics.timed_iter(cached, "read")
+        metrics.settings["result_cache"] = "miss"
+        return self.result_cache.write(path, stream(), to_arrow)
+
+    def iter_query_chunks(self, query, parameters=None, metrics=None, cache_table=None):
+        """Выполняет запрос и возвращает результат потоком DataFrame по блокам ClickHouse.
+
+        Время получения блоков учитывается в metrics в фазе "read". При заданных
+        result_cache и cache_table (таблица, которую читает запрос) результат
+        берется из кэша, если таблица не изменилась с прошлой выгрузки.
+        """
+        metrics = metrics or TransferMetrics("iter_query_chunks")
+        metrics.settings["compression"] = self.compression
+
+        def stream():
+            with metrics.phase("read"):
+                result = self.client.query_df_stream(query, parameters=parameters)
+            with result as blocks:
+                yield from metrics.timed_iter(blocks, "read")
+
+        if self.result_cache is None or not cache_table:
+            yield from stream()
+            return
+        yield from self._cached_stream("df", query, parameters, cache_table, stream, metrics,
+                                       to_arrow=lambda df: pa.Table.from_pandas(df, preserve_index=False),
+                                       from_arrow=lambda table: table.to_pandas())
+
+    def transfer_to_postgres(self, postgres_db, ch_table, pg_table, column_mapping=None, incremental_column=None,
+                             state_store=None, write_mode="append", key_columns=None, transforms=None, quarantine=None,
+                             metrics=None):
+        """Копирует данные из ClickHouse в PostgreSQL с переименованием колонок.
+
+        Использует тот же потоковый путь, что и PostgresDatabase.transfer_from_clickhouse,
+        и возвращает его TransferMetrics. По умолчанию строки дописываются
+        в таблицу PostgreSQL (она создается, если ее нет), как и раньше.
+        """
+        full_table_name = f"{self.schema}.{ch_table}" if self.schema else ch_table
+        return postgres_db.transfer_from_clickhouse(self, full_table_name, pg_table, column_mapping,
+                                                    incremental_column=incremental_column, state_store=state_store,
+                                                    write_mode=write_mode, key_columns=key_columns,
+                                                    transforms=transforms, quarantine=quarantine, metrics=metrics)
+
+    def iter_query_arrow(self, query, parameters=None, metrics=None, cache_table=None):
+        """Выполняет запрос и возвращает результат потоком pyarrow.Table по блокам ClickHouse (формат ArrowStream).
+
+        Строки ClickHouse приходят строками Arrow, а не двоичными значениями.
+        Время получения блоков учитывается в metrics в фазе "read". Кэш
+        результата (result_cache и cache_table) - как в iter_query_chunks.
+        """
+        metrics = metrics or TransferMetrics("iter_query_arrow")
+        metrics.settings["compression"] = self.compression
+
+        def stream():
+            with metrics.phase("read"):
+                result = self.client.query_arrow_stream(query, parameters=parameters, use_strings=True)
+            with result as batches:
+                for batch in metrics.timed_iter(batches, "read"):
+                    yield as_table(batch)
+
+        if self.result_cache is None or not cache_table:
+            yield from stream()
+            return
+        yield from self._cached_stream("arrow", query, parameters, cache_table, stream, metrics)
+
+    def arrow_select(self, ch_table):
+        """
+        Возвращает SELECT всех столбцов таблицы для чтения в формате Arrow.
+
+        ClickHouse отдает DateTime и Date в Arrow целыми числами (UInt32, UInt16),
+        поэтому такие столбцы приводятся к DateTime64 и Date32 - они приходят
+        временными метками и датами Arrow.
+        """
+        columns = []
+        for name, ch_type, *_ in self.client.query(f"DESCRIBE TABLE {ch_table}").result_rows:
+            base_type = ch_type.replace("Nullable(", "").replace("LowCardinality(", "")
+            if base_type.startswith(("DateTime64", "Date32")):
+                columns.append(name)
+            elif base_type.startswith("DateTime"):
+                columns.append(f"toDateTime64({name}, 0) AS {name}")
+            elif base_type.startswith("Date"):
+                columns.append(f"toDate32({name}) AS {name}")
+            else:
+                columns.append(name)
+        return f"SELECT {', '.join(columns)} FROM {ch_table}"
+
+    def _insert_arrow(self, full_table_name, table, metrics):
+        """Вставляет порцию pyarrow.Table (блоками по insert_block_size строк) и учитывает ее в metrics (фаза "write")."""
+        metrics.settings.update(self.transport_settings())
+        for rows, block_settings in self._insert_blocks(table.num_rows, None):
+            block = table.slice(rows.start, rows.stop - rows.start) if self.insert_block_size else table
+            started = time.perf_counter()
+            summary = self.client.insert_arrow(full_table_name, block, settings=block_settings) if block_settings \
+                else self.client.insert_arrow(full_table_name, block)
+            seconds = time.perf_counter() - started
+            metrics.add_phase_time("write", seconds)
+            metrics.record_chunk(block.num_rows, self._uncompressed_bytes(summary, block.nbytes), seconds)
+
+    def transfer_from_postgres_arrow(self, postgres_db, pg_table, ch_table, column_mapping=None, engine="MergeTree",
+                                     engine_params=None, block_size=None, order_by=None, partition_by=None,
+                                     write_mode="append", key_columns=None, version_column=None, dedup_view=False,
+                                     metrics=None):
+        """
+        Копирует таблицу из PostgreSQL в ClickHouse колоночным путем Arrow.
+
+        Таблица выгружается из PostgreSQL командой COPY TO и разбирается
+        pyarrow порциями по block_size байт (см. PostgresDatabase.iter_query_arrow),
+        столбцы переименовываются в схеме Arrow, типы таблицы ClickHouse
+        выводятся по этой схеме, а порции вставляются через insert_arrow -
+        без DataFrame и объектов Python на каждое значение. Режимы write_mode -
+        как в transfer_from_postgres; инкрементальный перенос и контрольные
+        точки здесь не поддерживаются.
+
+        :return: TransferMetrics по фазам read, transform, create_table, write, swap
+        """
+        full_table_name = self._full_name(ch_table)
+        insert_table_name = self._full_name(self.staging_table_name(ch_table)) if write_mode == "swap" \
+            else full_table_name
+        with track_transfer(metrics, "transfer_from_postgres_arrow", source=pg_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                engine, engine_params, order_by = self._write_mode_options(write_mode, engine, engine_params, order_by,
+                                                                           key_columns, version_column)
+                tables = postgres_db.iter_query_arrow(f"SELECT * FROM {pg_table}", block_size=block_size,
+                                                      metrics=metrics)
+                self.logger.info(f"Начато чтение таблицы {pg_table} из PostgreSQL в формате Arrow.")
+                for chunk_number, table in enumerate(tables):
+                    if column_mapping:
+                        with metrics.phase("transform"):
+                            table = rename_arrow_columns(table, column_mapping)
+                    if chunk_number == 0:
+                        with metrics.phase("create_table"):
+                            table_name = ch_table
+                            if write_mode == "swap":
+                                table_name = self.staging_table_name(ch_table)
+                                self.client.command(f"DROP TABLE IF EXISTS {self._full_name(table_name)}")
+                            self.create_table(table_name, None, engine, engine_params,
+                                              column_types=clickhouse_column_types(table.schema), order_by=order_by,
+                                              partition_by=partition_by)
+                    if table.num_rows:
+                        self._insert_arrow(insert_table_name, table, metrics)
+                        self.logger.info(f"Порция {chunk_number + 1} ({table.num_rows} строк) загружена в таблицу "
+                                         f"{insert_table_name}.")
+
+                if write_mode == "swap" and not self.swap_staging_table(ch_table, metrics):
+                    return metrics
+                if write_mode == "upsert" and dedup_view:
+                    self.create_dedup_view(ch_table)
+                self.logger.info(f"Данные из PostgreSQL загружены в ClickHouse в таблицу {ch_table}, "
+                                 f"строк: {metrics.rows}.")
+            except Exception as error:
+                self.logger.error(f"Ошибка при копировании данных Arrow из PostgreSQL в ClickHouse: {error}")
+                metrics.fail(error)
+                if postgres_db.conn and not postgres_db.conn.closed:
+                    postgres_db.conn.rollback()
+        return metrics
+
+
+def _transfer_partition(postgres_db, clickhouse_db, pg_table, ch_table, condition, params, column_mapping,
+                        chunk_size, itersize, number, total, transforms=None):
+    """Переносит один диапазон таблицы на собственных соединениях (исполнитель параллельного переноса)."""
+    logger = logging.getLogger(ClickHouseDatabase.__name__)
+    result = {"partition": number, "condition": condition, "rows": 0, "seconds": 0.0, "error": None}
+    metrics = TransferMetrics("transfer_partition", source=pg_table, target=ch_table)
+    try:
+        transform = compile_transforms(transforms) if transforms else None
+        with postgres_db.session() as pg, clickhouse_db.session() as ch:
+            full_table_name = f"{ch.schema}.{ch_table}" if ch.schema else ch_table
+            query = f"SELECT * FROM {pg_table} WHERE {condition}"
+            for df in pg.iter_query_chunks(query, params, chunk_size=chunk_size, itersize=itersize, metrics=metrics):
+                if df.empty:
+                    continue
+                if column_mapping:
+                    with metrics.phase("transform"):
+                        df.rename(columns=column_mapping, inplace=True)
+                if transform:
+                    with metrics.phase("transform"):
+                        df = transform(df)
+                ch._insert_chunk(full_table_name, df, metrics)
+                logger.info(f"Диапазон {number}/{total}: загружено {metrics.rows} строк.")
+    except Exception as error:
+        result["error"] = str(error)
+        metrics.fail(error)
+        logger.error(f"Диапазон {number}/{total} ({condition}): ошибка переноса: {error}")
+    finally:
+        metrics.finish()
+        result["rows"] = metrics.rows
+        result["seconds"] = metrics.elapsed
+        # Словарь, а не объект: результат должен передаваться из процесса-исполнителя
+        result["metrics"] = metrics.as_dict()
+    return result
+
+
+def _strip_nullable(column_type):
+    """Убирает Nullable из типа столбца, в том числе внутри LowCardinality."""
+    if column_type.startswith("Nullable("):
+        return column_type[len("Nullable("):-1]
+    if column_type.startswith("LowCardinality(Nullable("):
+        return f"LowCardinality({column_type[len('LowCardinality(Nullable('):-2]})"
+    return column_type
@@ -0,0 +1,154 @@
+import collections
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведенное время."""
+
+
+class ConnectionPool:
+    """
+    Ограниченный потокобезопасный пул соединений.
+
+    Одновременно выдается не более maxsize соединений; остальные потоки ждут
+    освобождения не дольше timeout секунд. Свободные соединения выдаются
+    в порядке LIFO (сначала самые "теплые") и проверяются функцией validate
+    перед выдачей - неисправные закрываются и заменяются новыми.
+    """
+
+    def __init__(self, factory, maxsize=5, timeout=30, validate=None, close=None, name="pool"):
+        """
+        :param factory: функция без аргументов, создающая новое соединение
+        :param maxsize: максимальное количество одновременно выданных соединений
+        :param timeout: максимальное время ожидания свободного соединения в секундах
+        :param validate: проверка соединения перед выдачей, возвращает True для исправного
+        :param close: функция закрытия соединения
+        :param name: имя пула для логов
+        """
+        self.factory = factory
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.validate = validate
+        self.close = close or (lambda conn: conn.close())
+        self.name = name
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._idle = collections.deque()
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._metrics = {
+            "created": 0,
+            "closed": 0,
+            "in_use": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+        }
+
+    def _is_healthy(self, conn):
+        if self.validate is None:
+            return True
+        try:
+            return bool(self.validate(conn))
+        except Exception as error:
+            self.logger.warning(f"Пул {self.name}: проверка соединения не прошла: {error}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            self.close(conn)
+        except Exception as error:
+            self.logger.warning(f"Пул {self.name}: ошибка при закрытии соединения: {error}")
+        with self._lock:
+            self._metrics["closed"] += 1
+
+    def checkout(self):
+        """Выдает соединение из пула, при необходимости ожидая освобождения или создавая новое."""
+        if self._closed:
+            raise PoolTimeout(f"Пул {self.name} закрыт.")
+        started = time.perf_counter()
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            acquired = self._slots.acquire(timeout=self.timeout)
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._metrics["waits"] += 1
+                self._metrics["wait_seconds_total"] += waited
+                self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], waited)
+                if not acquired:
+                    self._metrics["timeouts"] += 1
+            if not acquired:
+                raise PoolTimeout(f"Пул {self.name}: нет свободного соединения за {self.timeout} с.")
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    conn = self.factory()
+                    with self._lock:
+                        self._metrics["created"] += 1
+                    break
+                if self._is_healthy(conn):
+                    break
+                with self._lock:
+                    self._metrics["health_check_failures"] += 1
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["in_use"] += 1
+        return conn
+
+    def checkin(self, conn, discard=False):
+        """Возвращает соединение в пул; при discard=True соединение закрывается."""
+        with self._lock:
+            self._metrics["in_use"] -= 1
+            keep = not discard and not self._closed
+            if keep:
+                self._idle.append(conn)
+        if not keep:
+            self._discard(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: выдает соединение и возвращает его в пул по выходе."""
+        conn = self.checkout()
+        discard = False
+        try:
+            yield conn
+        except BaseException:
+            # После ошибки состояние соединения неизвестно - проверим его при следующей выдаче
+            discard = not self._is_healthy(conn)
+            raise
+        finally:
+            self.checkin(conn, discard=discard)
+
+    def stats(self):
+        """Возвращает метрики пула: размер, занятость и время ожидания соединений."""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["idle"] = len(self._idle)
+        stats["size"] = stats["idle"] + stats["in_use"]
+        stats["maxsize"] = self.maxsize
+        return stats
+
+    def close_all(self):
+        """Закрывает свободные соединения; выданные закроются при возврате."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn in idle:
+            self._discard(conn)
+        self.logger.info(f"Пул {self.name} закрыт.")
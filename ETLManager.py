@@ -1,6 +1,8 @@
 import logging
+from BulkIngestor import BulkIngestor
 from ClickHouseDatabase import ClickHouseDatabase
 from PostgresDatabase import PostgresDatabase
+from metrics import MetricsExporter
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,12 +19,16 @@ class ETLManager:
         # Логгер для класса
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # Метрики каждого переноса (время по фазам, строки, байты) дописываются в JSONL-файл
+        self.metrics_exporter = MetricsExporter("etl_metrics.jsonl")
+
         # Подключение к PostgreSQL
         self.pg_db = PostgresDatabase(
             host="localhost",
             database="test_etl",
             user="postgres",
-            password="1234"
+            password="1234",
+            metrics_exporter=self.metrics_exporter
         )
         self.logger.info("Попытка подключения к PostgreSQL.")
         self.pg_db.connect()
@@ -33,7 +39,8 @@ class ETLManager:
             port=8123,
             user="default",
             password="",
-            schema="test_schema"  # Указываем схему для ClickHouse
+            schema="test_schema",  # Указываем схему для ClickHouse
+            metrics_exporter=self.metrics_exporter
         )
         self.logger.info("Попытка подключения к ClickHouse.")
         self.ch_db.connect()
@@ -47,6 +54,9 @@ class ETLManager:
             "артикул": "article"
         }
 
+        # Размер порции при потоковом чтении файлов и переносе между базами
+        self.chunk_size = 100_000
+
     def load_data_from_xlsx_to_postgres(self):
         """Загрузка данных из файла xlsx в PostgreSQL."""
         self.logger.info("Начало загрузки данных из XLSX в PostgreSQL.")
@@ -54,12 +64,29 @@ class ETLManager:
             self.pg_db.process_data(
                 'wildberries_reviews.xlsx',
                 self.column_mapping,
-                table_name="test_t_re"
+                table_name="test_t_re",
+                chunk_size=self.chunk_size,
+                write_mode="swap"  # Читатели видят прежние данные, пока идет загрузка
             )
             self.logger.info("Данные из XLSX успешно загружены в PostgreSQL.")
         except Exception as e:
             self.logger.error(f"Ошибка при загрузке данных из XLSX в PostgreSQL: {e}")
 
+    def load_directory_to_postgres(self, source):
+        """Пакетная загрузка всех файлов xlsx/csv каталога (или шаблона glob) в PostgreSQL."""
+        self.logger.info(f"Начало пакетной загрузки файлов из {source} в PostgreSQL.")
+        try:
+            ingestor = BulkIngestor(self.pg_db, self.column_mapping, chunk_size=self.chunk_size)
+            reports = ingestor.ingest(source)
+            failed = [report["file"] for report in reports if report["error"]]
+            if failed:
+                self.logger.error(f"Не удалось загрузить файлы: {failed}")
+            else:
+                self.logger.info(f"Все файлы из {source} успешно загружены в PostgreSQL.")
+            return reports
+        except Exception as e:
+            self.logger.error(f"Ошибка при пакетной загрузке файлов в PostgreSQL: {e}")
+
     def transfer_data_from_clickhouse_to_postgres(self):
         """Перенос данных из ClickHouse в PostgreSQL."""
         self.logger.info("Начало переноса данных из ClickHouse в PostgreSQL.")
@@ -72,7 +99,8 @@ class ETLManager:
                 clickhouse_db=self.ch_db,
                 ch_table="test_schema.test_t_re_ch",  # Указываем полное имя таблицы с учетом схемы
                 pg_table="test_t_re_ch",
-                column_mapping=self.column_mapping
+                column_mapping=self.column_mapping,
+                write_mode="swap"
             )
             self.logger.info("Данные успешно перенесены из ClickHouse в PostgreSQL.")
         except Exception as e:
@@ -92,7 +120,9 @@ class ETLManager:
                 ch_table="test_t_re_ch",
                 engine="MergeTree",
                 engine_params="'/clickhouse/tables/{shard}/test_schema.test_t_re_ch', '{replica}'",  # Полное имя таблицы
-                column_mapping=self.column_mapping
+                column_mapping=self.column_mapping,
+                chunk_size=self.chunk_size,
+                write_mode="swap"
             )
             self.logger.info("Данные успешно перенесены из PostgreSQL в ClickHouse.")
         except Exception as e:
@@ -104,7 +134,8 @@ class ETLManager:
         print("1. Загрузить данные из xlsx в PostgreSQL")
         print("2. Перенести данные из ClickHouse в PostgreSQL")
         print("3. Перенести данные из PostgreSQL в ClickHouse")
-        print("4. Выйти")
+        print("4. Загрузить все файлы из каталога в PostgreSQL")
+        print("5. Выйти")
 
         choice = input("Введите номер действия: ")
         self.logger.info(f"Пользователь выбрал действие: {choice}")
@@ -116,6 +147,9 @@ class ETLManager:
         elif choice == "3":
             self.transfer_data_from_postgres_to_clickhouse()
         elif choice == "4":
+            source = input("Введите путь к каталогу или шаблон файлов: ")
+            self.load_directory_to_postgres(source)
+        elif choice == "5":
             self.logger.info("Завершение программы.")
             return False
         else:
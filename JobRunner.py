@@ -0,0 +1,353 @@
+import argparse
+import inspect
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from BulkIngestor import BulkIngestor
+from ClickHouseDatabase import ClickHouseDatabase
+from PostgresDatabase import PostgresDatabase
+from ResultCache import ResultCache
+from StateStore import StateStore
+from metrics import MetricsExporter, track_transfer
+from transforms import compile_transforms
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:  # PyYAML не обязателен: нужен только для спецификаций в YAML
+    yaml = None
+
+_ENV_RE = re.compile(r"\$\{([A-Za-z_][A-Za-z0-9_]*)(?::-([^}]*))?\}")
+
+CONNECTION_TYPES = {"postgres": PostgresDatabase, "clickhouse": ClickHouseDatabase}
+JOB_TYPES = ("file_to_postgres", "directory_to_postgres", "postgres_to_clickhouse",
+             "postgres_to_clickhouse_parallel", "clickhouse_to_postgres")
+
+
+def _expand_env(value):
+    """Подставляет переменные окружения ${VAR} и ${VAR:-значение по умолчанию} во все строки спецификации."""
+    if isinstance(value, dict):
+        return {key: _expand_env(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand_env(item) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def substitute(match):
+        name, default = match.group(1), match.group(2)
+        if name in os.environ:
+            return os.environ[name]
+        if default is None:
+            raise ValueError(f"Переменная окружения {name} не задана.")
+        return default
+
+    return _ENV_RE.sub(substitute, value)
+
+
+def load_job_spec(path):
+    """Читает спецификацию заданий из файла JSON, TOML или YAML (по расширению) и подставляет переменные окружения."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as file:
+            spec = json.load(file)
+    elif extension == ".toml":
+        if tomllib is None:
+            raise ImportError("Для спецификаций TOML нужен Python 3.11+ или пакет tomli.")
+        with open(path, "rb") as file:
+            spec = tomllib.load(file)
+    elif extension in (".yaml", ".yml"):
+        if yaml is None:
+            raise ImportError("Для спецификаций YAML нужен пакет PyYAML.")
+        with open(path, encoding="utf-8") as file:
+            spec = yaml.safe_load(file)
+    else:
+        raise ValueError(f"Неизвестный формат спецификации: {path}")
+    return _expand_env(spec)
+
+
+class JobRunner:
+    """
+    Исполнитель заданий ETL по декларативной спецификации без интерактивного меню.
+
+    Спецификация описывает соединения, именованные сопоставления столбцов,
+    правила преобразования порций (transforms), кэш выгрузок ClickHouse
+    (cache, см. ResultCache) и задания с зависимостями (depends_on).
+    Независимые задания выполняются
+    одновременно, не более workers за раз; задание запускается, только когда
+    все его зависимости выполнены успешно, иначе пропускается. Соединения
+    открываются один раз пулами и переиспользуются всеми заданиями; размер
+    пула - сумма соединений, которые одновременно занимают workers самых
+    "широких" заданий (пакетная загрузка - load_workers, параллельный
+    перенос - workers + 1, остальные - одно).
+    """
+
+    def __init__(self, spec, workers=None):
+        """
+        :param spec: словарь спецификации (см. load_job_spec и jobs.example.toml)
+        :param workers: максимальное число одновременных заданий (по умолчанию spec["workers"] или 4)
+        """
+        self.spec = spec
+        self.workers = workers or spec.get("workers", 4)
+        self.defaults = spec.get("defaults", {})
+        self.column_mappings = spec.get("column_mappings", {})
+        self.transforms = spec.get("transforms", {})
+        self.jobs = {job["name"]: job for job in spec.get("jobs", [])}
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        metrics_spec = spec.get("metrics")
+        self.metrics_exporter = MetricsExporter(metrics_spec["path"], metrics_spec.get("format", "jsonl")) \
+            if metrics_spec else None
+        self._state_store = None
+        self._state_lock = threading.Lock()
+        cache_spec = spec.get("cache")
+        self.result_cache = ResultCache(cache_spec.get("directory", "etl_cache"),
+                                        int(cache_spec.get("max_size_mb", 10240) * 2 ** 20)) if cache_spec else None
+        self.connections = {}
+        self.validate()
+
+    @property
+    def state_store(self):
+        """Хранилище состояния; файл создается при первом обращении, а не для каждой спецификации."""
+        with self._state_lock:
+            if self._state_store is None:
+                self._state_store = StateStore(self.spec["state"]) if self.spec.get("state") else StateStore()
+            return self._state_store
+
+    def _job_state_store(self, options):
+        """Хранилище состояния для задания, которому оно нужно (водяной знак, контрольные точки, кэш схемы)."""
+        if any(options.get(key) for key in ("incremental_column", "checkpoint_column", "infer_schema")):
+            return self.state_store
+        return None
+
+    def validate(self):
+        """Проверяет имена, типы, соединения и зависимости заданий; цикл в зависимостях - ошибка."""
+        if len(self.jobs) != len(self.spec.get("jobs", [])):
+            raise ValueError("Имена заданий должны быть уникальными.")
+        connection_specs = self.spec.get("connections", {})
+        for name, connection in connection_specs.items():
+            if connection.get("type") not in CONNECTION_TYPES:
+                raise ValueError(f"Соединение {name}: неизвестный тип {connection.get('type')}.")
+        for name, job in self.jobs.items():
+            if job.get("type") not in JOB_TYPES:
+                raise ValueError(f"Задание {name}: неизвестный тип {job.get('type')}.")
+            for key in self._job_connections(job):
+                if job.get(key, key) not in connection_specs:
+                    raise ValueError(f"Задание {name}: соединение {job.get(key, key)} не описано.")
+            mapping = job.get("column_mapping")
+            if isinstance(mapping, str) and mapping not in self.column_mappings:
+                raise ValueError(f"Задание {name}: сопоставление столбцов {mapping} не описано.")
+            transforms = job.get("transforms")
+            if isinstance(transforms, str) and transforms not in self.transforms:
+                raise ValueError(f"Задание {name}: преобразования {transforms} не описаны.")
+            if transforms:
+                # Ошибки в правилах обнаруживаются до запуска заданий
+                compile_transforms(self._job_transforms(job))
+            for dependency in job.get("depends_on", []):
+                if dependency not in self.jobs:
+                    raise ValueError(f"Задание {name}: зависимость {dependency} не найдена.")
+
+        # Топологическая сортировка (алгоритм Кана): оставшиеся вершины образуют цикл
+        remaining = {name: set(job.get("depends_on", [])) for name, job in self.jobs.items()}
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                raise ValueError(f"Цикл в зависимостях заданий: {', '.join(sorted(remaining))}.")
+            for name in ready:
+                del remaining[name]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+
+    @staticmethod
+    def _job_connections(job):
+        """Ключи задания, указывающие на соединения (значение по умолчанию совпадает с ключом)."""
+        if job["type"] in ("file_to_postgres", "directory_to_postgres"):
+            return ("postgres",)
+        return ("postgres", "clickhouse")
+
+    def _job_options(self, job):
+        return {**self.defaults.get(job["type"], {}), **job.get("options", {})}
+
+    def _fan_out(self, job):
+        """Сколько соединений одного пула задание занимает одновременно."""
+        options = self._job_options(job)
+        if job["type"] == "directory_to_postgres":
+            return options.get("load_workers", inspect.signature(BulkIngestor).parameters["load_workers"].default)
+        if job["type"] == "postgres_to_clickhouse_parallel":
+            # Сессия самого задания и по сессии на каждый диапазон
+            parallel = inspect.signature(ClickHouseDatabase.transfer_from_postgres_parallel).parameters["workers"]
+            return options.get("workers", parallel.default) + 1
+        return 1
+
+    def pool_size(self, name, jobs=None):
+        """Размер пула соединения name: сумма нагрузки workers самых широких заданий, использующих его."""
+        jobs = self.jobs.values() if jobs is None else jobs
+        fan_outs = sorted((self._fan_out(job) for job in jobs
+                           if name in {job.get(key, key) for key in self._job_connections(job)}), reverse=True)
+        return max(1, sum(fan_outs[:self.workers]))
+
+    def connect(self, names, jobs=None):
+        """Подключает используемые соединения пулами (см. pool_size)."""
+        for name in names:
+            if name in self.connections:
+                continue
+            options = dict(self.spec["connections"][name])
+            database_class = CONNECTION_TYPES[options.pop("type")]
+            options.setdefault("pool_size", self.pool_size(name, jobs))
+            if database_class is ClickHouseDatabase and self.result_cache:
+                options.setdefault("result_cache", self.result_cache)
+            database = database_class(metrics_exporter=self.metrics_exporter, **options)
+            database.connect()
+            if database.pool is None:
+                raise ConnectionError(f"Не удалось подключиться к {name}.")
+            self.connections[name] = database
+
+    def close(self):
+        for database in self.connections.values():
+            database.disconnect()
+        self.connections = {}
+
+    def _column_mapping(self, job):
+        mapping = job.get("column_mapping")
+        return self.column_mappings[mapping] if isinstance(mapping, str) else mapping
+
+    def _job_transforms(self, job):
+        transforms = job.get("transforms")
+        return self.transforms[transforms] if isinstance(transforms, str) else transforms
+
+    def _execute(self, job, metrics):
+        """Выполняет задание на соединениях из пулов; результат записывается в metrics."""
+        options = self._job_options(job)
+        mapping = self._column_mapping(job)
+        chunk_size = options.pop("chunk_size", self.defaults.get("chunk_size"))
+        if job.get("transforms"):
+            options["transforms"] = self._job_transforms(job)
+        pg = self.connections[job.get("postgres", "postgres")]
+        job_type = job["type"]
+
+        if job_type == "directory_to_postgres":
+            reports = BulkIngestor(pg, mapping, chunk_size=chunk_size or 100_000, **options).ingest(job["source"])
+            failed = [report["file"] for report in reports if report["error"]]
+            for report in reports:
+                metrics.record_chunk(report["rows"])
+            if failed:
+                metrics.fail(f"Не загружены файлы: {failed}")
+            return
+
+        if job_type == "file_to_postgres":
+            with pg.session() as pg_session:
+                pg_session.process_data(job["source"], mapping, table_name=job["target"], chunk_size=chunk_size,
+                                        metrics=metrics, **options)
+            return
+
+        ch = self.connections[job.get("clickhouse", "clickhouse")]
+        state_store = self._job_state_store(options)
+        with pg.session() as pg_session, ch.session() as ch_session:
+            if job_type == "postgres_to_clickhouse":
+                ch_session.transfer_from_postgres(pg_session, job["source"], job["target"], mapping,
+                                                  chunk_size=chunk_size, state_store=state_store,
+                                                  metrics=metrics, **options)
+            elif job_type == "postgres_to_clickhouse_parallel":
+                ch_session.transfer_from_postgres_parallel(pg_session, job["source"], job["target"], mapping,
+                                                           state_store=state_store, metrics=metrics, **options)
+            else:
+                pg_session.transfer_from_clickhouse(ch_session, job["source"], job["target"], mapping,
+                                                    state_store=state_store, metrics=metrics, **options)
+
+    def run_job(self, job):
+        """Выполняет одно задание и возвращает его результат; исключения не пробрасываются."""
+        self.logger.info(f"Задание {job['name']} запущено.")
+        with track_transfer(None, job["name"], source=job.get("source"), target=job.get("target"),
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                self._execute(job, metrics)
+            except Exception as error:
+                self.logger.error(f"Задание {job['name']}: ошибка: {error}")
+                metrics.fail(error)
+        return {"job": job["name"], "status": "ok" if metrics.ok else "failed", "rows": metrics.rows,
+                "seconds": metrics.elapsed, "error": metrics.error}
+
+    def run(self, only=None):
+        """
+        Выполняет задания с учетом зависимостей и возвращает список результатов.
+
+        :param only: список имен заданий; зависимости вне этого списка считаются выполненными
+        """
+        selected = {name: job for name, job in self.jobs.items() if not only or name in only}
+        needed = {job.get(key, key) for job in selected.values() for key in self._job_connections(job)}
+        started = time.perf_counter()
+        results = {}
+        try:
+            self.connect(sorted(needed), selected.values())
+        except Exception as error:
+            self.logger.error(f"Ошибка подключения: {error}")
+            self.close()
+            return [{"job": name, "status": "failed", "rows": 0, "seconds": 0.0, "error": str(error)}
+                    for name in selected]
+
+        pending = dict(selected)
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while pending or running:
+                    for name, job in list(pending.items()):
+                        dependencies = [dependency for dependency in job.get("depends_on", []) if dependency in selected]
+                        failed = [dependency for dependency in dependencies
+                                  if results.get(dependency, {}).get("status") in ("failed", "skipped")]
+                        if failed:
+                            del pending[name]
+                            results[name] = {"job": name, "status": "skipped", "rows": 0, "seconds": 0.0,
+                                             "error": f"Не выполнены зависимости: {failed}"}
+                            self.logger.warning(f"Задание {name} пропущено: не выполнены зависимости {failed}.")
+                        elif all(results.get(dependency, {}).get("status") == "ok" for dependency in dependencies):
+                            del pending[name]
+                            running[executor.submit(self.run_job, job)] = name
+                    if not running:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[running.pop(future)] = future.result()
+        finally:
+            self.close()
+
+        failed = [name for name, result in results.items() if result["status"] != "ok"]
+        elapsed = time.perf_counter() - started
+        if failed:
+            self.logger.error(f"Выполнение заданий завершено за {elapsed:.1f} с, не выполнены: {failed}.")
+        else:
+            self.logger.info(f"Все задания ({len(results)}) выполнены за {elapsed:.1f} с.")
+        return [results[name] for name in selected]
+
+
+def main(argv=None):
+    """Запускает задания из файла спецификации; код возврата 1, если хотя бы одно задание не выполнено."""
+    parser = argparse.ArgumentParser(description="Запуск заданий ETL по спецификации.")
+    parser.add_argument("spec", help="файл спецификации заданий (JSON, TOML или YAML)")
+    parser.add_argument("--workers", type=int, help="максимальное число одновременных заданий")
+    parser.add_argument("--only", help="имена заданий через запятую")
+    args = parser.parse_args(argv)
+
+    runner = JobRunner(load_job_spec(args.spec), workers=args.workers)
+    only = [name.strip() for name in args.only.split(",")] if args.only else None
+    results = runner.run(only)
+    for result in results:
+        print(f"{result['job']:30s} {result['status']:8s} {result['rows']:>12} строк {result['seconds']:8.1f} с"
+              f"{'  ' + result['error'] if result['error'] else ''}")
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
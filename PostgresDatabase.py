@@ -1,11 +1,34 @@
+import datetime
+import decimal
+import io
+import itertools
 import logging
 import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 import pandas as pd
 import psycopg2
+import psycopg2.extensions
 from psycopg2 import sql
 from psycopg2.extras import execute_values
+import pyarrow.csv as pa_csv
 
+from AsyncTransfer import AsyncTransfer
+from arrow_types import arrow_type_for_postgres_oid, as_table, postgres_column_types, rename_arrow_columns
+from binary_copy import (BOOL_OID, FLOAT4_OID, FLOAT8_OID, INT2_OID, INT4_OID, INT8_OID, PGCOPY_HEADER,
+                         PGCOPY_TRAILER, TIMESTAMP_OID, TIMESTAMPTZ_OID, UnsupportedBinaryType, check_binary_types,
+                         encode_binary_copy, encode_binary_rows)
+from ConnectionPool import ConnectionPool
+from StateStore import StateStore
 from decorators import retry
+from metrics import TransferMetrics, track_transfer
+from readers import conform_chunk, iter_file_sheets
+from streams import IteratorReader, prefetch
+from transforms import compile_transforms, transform_chunks
+from validation import compile_validator, postgres_rules, validated_chunks
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,20 +40,83 @@ logging.basicConfig(
     ]
 )
 
+# Типы точной ширины для таблиц, загружаемых двоичным COPY
+BINARY_TYPE_REPLACEMENTS = {
+    'float64': 'double precision',
+    'float32': 'real',
+    'int64': 'bigint',
+    'int32': 'integer',
+}
+
+# Типы столбцов порций по OID столбцов результата: порции получают одни и те же dtypes,
+# даже если в одной из них столбец целиком NULL (иначе pandas выведет для него object)
+_CHUNK_DTYPES = {
+    INT2_OID: "Int16",
+    INT4_OID: "Int32",
+    INT8_OID: "Int64",
+    FLOAT4_OID: "float64",
+    FLOAT8_OID: "float64",
+    BOOL_OID: "boolean",
+}
+
+# Режимы записи с загрузкой в промежуточную таблицу и атомарной подменой целевой:
+# "swap" переводит таблицу в LOGGED перед подменой, "swap_unlogged" оставляет ее UNLOGGED
+SWAP_WRITE_MODES = ("swap", "swap_unlogged")
+# Режимы записи, в которых COPY идет в промежуточную таблицу: подмена и слияние по ключу ("upsert")
+STAGING_WRITE_MODES = SWAP_WRITE_MODES + ("upsert",)
+
 class PostgresDatabase:
-    def __init__(self, host, database, user, password, schema="public"):
+    def __init__(self, host, database, user, password, schema="public", pool_size=None, pool_timeout=30,
+                 metrics_exporter=None):
         self.host = host
         self.database = database
         self.user = user
         self.password = password
         self.schema = schema
+        self.pool_size = pool_size  # Если задан, connect() создает пул соединений вместо одного соединения
+        self.pool_timeout = pool_timeout
+        self.metrics_exporter = metrics_exporter  # MetricsExporter для записи метрик каждого вызова в файл
         self.conn = None
+        self.pool = None
         self.logger = logging.getLogger(self.__class__.__name__)  # Создаем логгер для класса
 
+    def _new_connection(self):
+        """Создает новое соединение с PostgreSQL с установленным search_path."""
+        conn = psycopg2.connect(
+            host=self.host,
+            dbname=self.database,
+            user=self.user,
+            password=self.password
+        )
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {self.schema};")
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _check_connection(conn):
+        """Проверяет соединение из пула: откатывает незавершенную транзакцию и выполняет SELECT 1."""
+        if conn.closed:
+            return False
+        if conn.status != psycopg2.extensions.STATUS_READY:
+            conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        conn.rollback()
+        return True
+
     @retry(retries=3, delay=5, logger=logging.getLogger(__name__))
     def connect(self):
-        """Подключается к PostgreSQL."""
+        """Подключается к PostgreSQL (или создает пул соединений, если задан pool_size)."""
         try:
+            if self.pool_size:
+                pool = ConnectionPool(self._new_connection, maxsize=self.pool_size, timeout=self.pool_timeout,
+                                      validate=self._check_connection, name=f"postgres:{self.database}")
+                # Сразу открываем первое соединение, чтобы проверить параметры подключения
+                pool.checkin(pool.checkout())
+                self.pool = pool
+                self.logger.info(f"Пул соединений с PostgreSQL создан (до {self.pool_size} соединений).")
+                return
             self.conn = psycopg2.connect(
                 host=self.host,
                 dbname=self.database,
@@ -44,14 +130,275 @@ class PostgresDatabase:
             self.logger.error(f"Ошибка подключения к PostgreSQL: {error}")
             self.conn = None
 
+    def reset_connection(self):
+        """Откатывает прерванную транзакцию, а если соединение потеряно - подключается заново."""
+        if self.pool:
+            return
+        if self.conn is not None and not self.conn.closed:
+            try:
+                self.conn.rollback()
+                return
+            except psycopg2.Error as error:
+                self.logger.warning(f"Соединение с PostgreSQL потеряно: {error}")
+        self.conn = None
+        self.connect()
+        if self.conn is None:
+            raise ConnectionError("Не удалось переподключиться к PostgreSQL.")
+
     def disconnect(self):
         """Отключается от PostgreSQL."""
         if self.conn:
             self.conn.close()
             self.logger.info("Соединение с PostgreSQL закрыто.")
+        if self.pool:
+            self.pool.close_all()
+            self.pool = None
+
+    def clone(self, pool_size=None):
+        """Возвращает неподключенную копию с теми же параметрами (например, для отдельного потока)."""
+        return PostgresDatabase(self.host, self.database, self.user, self.password, self.schema,
+                                pool_size=pool_size, pool_timeout=self.pool_timeout,
+                                metrics_exporter=self.metrics_exporter)
+
+    @contextmanager
+    def session(self):
+        """
+        Выдает объект PostgresDatabase с отдельным соединением на время блока with.
+
+        В режиме пула соединение берется из пула (с проверкой исправности)
+        и возвращается в него по выходе - параллельные задачи переиспользуют
+        "теплые" соединения. Без пула используется собственное соединение
+        объекта; если его нет, оно открывается на время блока.
+        """
+        if self.pool:
+            with self.pool.connection() as conn:
+                session = self.clone()
+                session.conn = conn
+                yield session
+            return
+        if self.conn:
+            yield self
+            return
+        self.connect()
+        if self.conn is None:
+            raise ConnectionError("Не удалось подключиться к PostgreSQL.")
+        try:
+            yield self
+        finally:
+            self.disconnect()
+            self.conn = None
+
+    def pool_stats(self):
+        """Возвращает метрики пула соединений или None, если пул не используется."""
+        return self.pool.stats() if self.pool else None
+
+    def get_column_info(self, table_name):
+        """Возвращает объявленные тип, допустимость NULL и длину строк столбцов таблицы.
+
+        :return: {столбец: {"data_type", "nullable", "max_length"}}; max_length - только для varchar(n) и char(n)
+        """
+        schema, _, name = table_name.rpartition(".")
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                """SELECT column_name, data_type, is_nullable = 'YES', character_maximum_length
+                   FROM information_schema.columns
+                   WHERE table_schema = %s AND table_name = %s
+                   ORDER BY ordinal_position;""",
+                (schema or self.schema, name)
+            )
+            rows = cursor.fetchall()
+        self.conn.commit()
+        return {column: {"data_type": data_type, "nullable": nullable, "max_length": max_length}
+                for column, data_type, nullable, max_length in rows}
 
-    def create_table(self, table_name, df):
-        """Создает таблицу в PostgreSQL в указанной схеме."""
+    def get_validator(self, table_name):
+        """Возвращает функцию проверки порций по объявленным типам столбцов таблицы (см. validation)."""
+        return compile_validator(postgres_rules(self.get_column_info(table_name)))
+
+    def get_partition_ranges(self, table_name, partitions, column=None):
+        """
+        Делит таблицу на диапазоны для параллельного чтения.
+
+        Возвращает список пар (условие WHERE, параметры). Если column задан,
+        диапазон [min, max] столбца делится на равные части (строки с NULL
+        выделяются в отдельный диапазон); столбец должен быть числовым или
+        датой/временем, иначе ValueError. Иначе таблица делится по блокам
+        ctid - это работает для любой таблицы без подходящего ключа.
+        """
+        with self.conn.cursor() as cursor:
+            if column:
+                cursor.execute(f"SELECT min({column}), max({column}) FROM {table_name};")
+                low, high = cursor.fetchone()
+            else:
+                cursor.execute(
+                    "SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int;",
+                    (table_name,)
+                )
+                low, high = 0, cursor.fetchone()[0]
+        self.conn.commit()
+
+        if column is None:
+            # Последний диапазон открыт сверху, чтобы захватить блоки, добавленные во время чтения
+            bounds = [low + (high - low) * i // partitions for i in range(partitions)]
+            ranges = [(f"ctid >= '({start},0)'::tid AND ctid < '({end},0)'::tid", None)
+                      for start, end in zip(bounds, bounds[1:]) if start < end]
+            return ranges + [(f"ctid >= '({bounds[-1]},0)'::tid", None)]
+
+        ranges = [(f"{column} IS NULL", None)]
+        if low is None:
+            return ranges
+        if isinstance(low, bool) or not isinstance(low, (int, float, decimal.Decimal, datetime.date)):
+            raise ValueError(f"Столбец {column} таблицы {table_name} нельзя разбить на диапазоны: нужен числовой "
+                             f"столбец или дата/время, получен {type(low).__name__}. Укажите другой partition_column "
+                             f"или не задавайте его, чтобы делить таблицу по ctid.")
+        step = (high - low) / partitions
+        if isinstance(low, int):
+            bounds = [low + (high - low) * i // partitions for i in range(partitions)]
+        else:
+            bounds = [low + step * i for i in range(partitions)]
+        bounds = sorted(set(bounds))
+        for start, end in zip(bounds, bounds[1:]):
+            ranges.append((f"{column} >= %(start)s AND {column} < %(end)s", {"start": start, "end": end}))
+        ranges.append((f"{column} >= %(start)s", {"start": bounds[-1]}))
+        return ranges
+
+    @staticmethod
+    def _chunk_frame(rows, description):
+        """Строит DataFrame порции с типами столбцов по описанию результата (см. _CHUNK_DTYPES)."""
+        df = pd.DataFrame(rows, columns=[desc[0] for desc in description])
+        for index, desc in enumerate(description):
+            series = df.iloc[:, index]
+            if desc[1] in _CHUNK_DTYPES:
+                if str(series.dtype) != _CHUNK_DTYPES[desc[1]]:
+                    df[desc[0]] = series.astype(_CHUNK_DTYPES[desc[1]])
+            elif desc[1] in (TIMESTAMP_OID, TIMESTAMPTZ_OID) and not pd.api.types.is_datetime64_any_dtype(series):
+                df[desc[0]] = pd.to_datetime(series, utc=desc[1] == TIMESTAMPTZ_OID)
+        return df
+
+    def iter_query_chunks(self, query, params=None, chunk_size=None, itersize=None, metrics=None):
+        """Выполняет запрос и возвращает результат порциями DataFrame.
+
+        Если chunk_size не задан, результат читается целиком одной порцией.
+        Иначе используется именованный (серверный) курсор: PostgreSQL отдает
+        строки пачками по itersize (по умолчанию chunk_size), а в памяти
+        одновременно находится не более chunk_size строк. Типы целых, дробных,
+        логических столбцов и дат берутся из описания результата, поэтому
+        у всех порций одинаковые dtypes (целые с NULL - Int16/Int32/Int64).
+        Время чтения из базы и построения DataFrame учитывается в metrics
+        в фазах "read" и "dataframe".
+        """
+        metrics = metrics or TransferMetrics("iter_query_chunks")
+        if chunk_size is None:
+            with self.conn.cursor() as cursor:
+                with metrics.phase("read"):
+                    cursor.execute(query, params)
+                    rows = cursor.fetchall()
+                with metrics.phase("dataframe"):
+                    df = self._chunk_frame(rows, cursor.description)
+                del rows
+                yield df
+            return
+
+        cursor_name = f"etl_stream_{uuid.uuid4().hex}"
+        with self.conn.cursor(name=cursor_name) as cursor:
+            cursor.itersize = itersize or chunk_size
+            with metrics.phase("read"):
+                cursor.execute(query, params)
+            # Итерация именованного курсора запрашивает у сервера строки пачками по itersize
+            stream = iter(cursor)
+            first = True
+            while True:
+                with metrics.phase("read"):
+                    rows = list(itertools.islice(stream, chunk_size))
+                if not rows and not first:
+                    break
+                first = False
+                with metrics.phase("dataframe"):
+                    # Пустой результат дает одну пустую порцию, чтобы сохранить структуру
+                    df = self._chunk_frame(rows, cursor.description)
+                yield df
+                if not rows:
+                    break
+        # Серверный курсор живет внутри транзакции, завершаем ее после чтения
+        self.conn.commit()
+
+    def iter_query_arrow(self, query, params=None, block_size=None, metrics=None):
+        """
+        Выполняет запрос и возвращает результат порциями pyarrow.Table без объектов Python на каждую строку.
+
+        Результат выгружается командой COPY (запрос) TO STDOUT в CSV в фоновом
+        потоке и через канал разбирается pyarrow.csv по блокам block_size байт.
+        Типы столбцов берутся из OID столбцов результата, поэтому все порции
+        получают одну и ту же схему. Время чтения и разбора учитывается
+        в metrics в фазе "read".
+        """
+        metrics = metrics or TransferMetrics("iter_query_arrow")
+        with self.conn.cursor() as cursor:
+            if params:
+                query = cursor.mogrify(query, params).decode("utf-8")
+            with metrics.phase("read"):
+                cursor.execute(f"SELECT * FROM ({query}) AS source LIMIT 0")
+            column_types = {desc[0]: arrow_type_for_postgres_oid(desc[1]) for desc in cursor.description}
+
+        read_fd, write_fd = os.pipe()
+        reader, writer = os.fdopen(read_fd, "rb"), os.fdopen(write_fd, "wb")
+        errors = []
+
+        def copy_out():
+            try:
+                with self.conn.cursor() as cursor:
+                    # timestamptz выгружается в UTC, чтобы у всех значений был один часовой пояс
+                    cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+                    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER ENCODING 'UTF8'", writer)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                writer.close()
+
+        thread = threading.Thread(target=copy_out, name="copy_to_arrow", daemon=True)
+        thread.start()
+        finished = False
+        try:
+            batches = pa_csv.open_csv(
+                reader,
+                read_options=pa_csv.ReadOptions(block_size=block_size or 1 << 22),
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                # NULL в CSV PostgreSQL - только пустое поле без кавычек; строки "NA", "NULL",
+                # "N/A" и т.д. остаются значениями (по умолчанию pyarrow считает их пропусками)
+                convert_options=pa_csv.ConvertOptions(column_types=column_types, null_values=[""],
+                                                      strings_can_be_null=True, quoted_strings_can_be_null=False,
+                                                      true_values=["t"], false_values=["f"]),
+            )
+            for batch in metrics.timed_iter(batches, "read"):
+                yield as_table(batch)
+            finished = True
+        finally:
+            # Если потребитель остановился раньше, закрытый канал прерывает COPY
+            reader.close()
+            thread.join()
+            if finished and not errors:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+            if errors and finished:
+                raise errors[0]
+
+    def create_table(self, table_name, df, copy_format="csv", write_mode="replace", column_types=None):
+        """Создает таблицу в PostgreSQL в указанной схеме.
+
+        Для copy_format="binary" числовые столбцы создаются с типами точной
+        ширины (bigint, double precision), чтобы их можно было загрузить
+        двоичным COPY без преобразования на стороне сервера.
+
+        :param write_mode: "replace" - пересоздать таблицу, "append" - создать,
+                           только если ее еще нет (для дозагрузки данных),
+                           "swap"/"swap_unlogged" - пересоздать UNLOGGED промежуточную
+                           таблицу (см. staging_table_name и swap_staging_table),
+                           целевая таблица при этом не трогается,
+                           "upsert" - создать целевую таблицу, если ее нет, и пересоздать
+                           UNLOGGED промежуточную таблицу для merge_staging_table
+        :param column_types: список пар (столбец, тип PostgreSQL); по умолчанию типы берутся из dtypes df
+        """
         replacements = {
             'float64': 'decimal',
             'object': 'varchar',
@@ -61,47 +408,457 @@ class PostgresDatabase:
             'bool': 'boolean',
             'datetime64[ns]': 'timestamp',
             'timedelta64[ns]': 'varchar',
-            'string': 'varchar'
+            'string': 'varchar',
+            'Int64': 'bigint',
+            'Int32': 'integer',
+            'Int16': 'smallint',
+            'Float64': 'double precision',
+            'boolean': 'boolean',
         }
-        col_str = ", ".join(f"{col} {replacements.get(str(dtype), 'varchar')}" 
-                            for col, dtype in zip(df.columns, df.dtypes))
-        full_table_name = f"{self.schema}.{table_name}"
+        if copy_format == "binary":
+            replacements.update(BINARY_TYPE_REPLACEMENTS)
+        if column_types is None:
+            column_types = [(col, replacements.get(str(dtype), 'varchar')) for col, dtype in zip(df.columns, df.dtypes)]
+        col_str = ", ".join(f"{col} {dtype}" for col, dtype in column_types)
+        full_table_name = f"{self.schema}.{self.load_table_name(table_name, write_mode)}"
         
         try:
             with self.conn.cursor() as cursor:
-                cursor.execute(f"DROP TABLE IF EXISTS {full_table_name};")
-                cursor.execute(f"CREATE TABLE {full_table_name} ({col_str});")
+                if write_mode == "append":
+                    cursor.execute(f"CREATE TABLE IF NOT EXISTS {full_table_name} ({col_str});")
+                elif write_mode in STAGING_WRITE_MODES:
+                    if write_mode == "upsert":
+                        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.schema}.{table_name} ({col_str});")
+                    # Запись в UNLOGGED-таблицу не пишется в WAL
+                    cursor.execute(f"DROP TABLE IF EXISTS {full_table_name};")
+                    cursor.execute(f"CREATE UNLOGGED TABLE {full_table_name} ({col_str});")
+                else:
+                    cursor.execute(f"DROP TABLE IF EXISTS {full_table_name};")
+                    cursor.execute(f"CREATE TABLE {full_table_name} ({col_str});")
                 self.conn.commit()
             self.logger.info(f"Таблица {full_table_name} создана в PostgreSQL.")
         except (Exception, psycopg2.DatabaseError) as error:
             self.logger.error(f"Ошибка при создании таблицы: {error}")
             self.conn.rollback()
 
-    def load_data_to_db(self, df, table_name):
-        """Загружает данные из DataFrame в PostgreSQL."""
-        temp_csv_path = f"{table_name}.csv"
+    @staticmethod
+    def staging_table_name(table_name):
+        """Имя промежуточной таблицы для режимов записи с подменой и слиянием."""
+        return f"{table_name}__staging"
+
+    def load_table_name(self, table_name, write_mode):
+        """Таблица, в которую идет COPY: промежуточная для режимов с подменой и слиянием, иначе целевая."""
+        return self.staging_table_name(table_name) if write_mode in STAGING_WRITE_MODES else table_name
+
+    def publish_staging_table(self, table_name, write_mode, key_columns=None, metrics=None):
+        """Переносит загруженную промежуточную таблицу в целевую согласно write_mode; True при успехе."""
+        if write_mode in SWAP_WRITE_MODES:
+            return self.swap_staging_table(table_name, write_mode == "swap", metrics)
+        if write_mode == "upsert":
+            return self.merge_staging_table(table_name, key_columns, metrics) is not None
+        return True
+
+    def _ensure_upsert_key(self, cursor, table_name, key_columns):
+        """
+        Проверяет, что у целевой таблицы есть уникальный индекс по key_columns, и создает его при необходимости.
+
+        Индекс {table_name}__upsert_key создается только после проверки, что
+        в таблице нет повторяющихся ключей; иначе - ValueError с примером ключа.
+        """
         full_table_name = f"{self.schema}.{table_name}"
-        df.to_csv(temp_csv_path, encoding='utf-8', header=True, index=False)
-        
+        keys = ", ".join(key_columns)
+        cursor.execute(
+            """SELECT array_agg(att.attname::text)
+               FROM pg_index idx
+               JOIN pg_attribute att ON att.attrelid = idx.indrelid AND att.attnum = ANY(idx.indkey)
+               WHERE idx.indrelid = to_regclass(%s) AND idx.indisunique
+                 AND idx.indpred IS NULL AND idx.indexprs IS NULL
+               GROUP BY idx.indexrelid;""",
+            (full_table_name,))
+        if any(set(columns) == set(key_columns) for columns, in cursor.fetchall()):
+            return
+        cursor.execute(f"SELECT {keys} FROM {full_table_name} GROUP BY {keys} HAVING count(*) > 1 LIMIT 1;")
+        duplicate = cursor.fetchone()
+        if duplicate:
+            raise ValueError(f"В таблице {full_table_name} есть повторяющиеся значения ключа ({keys}), например "
+                             f"{duplicate}; для write_mode='upsert' ключ должен быть уникальным.")
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}__upsert_key ON {full_table_name} ({keys});")
+
+    def merge_staging_table(self, table_name, key_columns, metrics=None):
+        """
+        Сливает промежуточную таблицу с целевой по ключу одним INSERT ... ON CONFLICT DO UPDATE.
+
+        Изменяются только строки, которые отличаются от уже загруженных:
+        одинаковые строки не переписываются и не порождают новых версий.
+        Если ключ встречается в загрузке несколько раз, берется последняя
+        загруженная строка. Для ON CONFLICT нужен уникальный индекс по ключу
+        (см. _ensure_upsert_key). Промежуточная таблица удаляется
+        в той же транзакции. Возвращает количество вставленных и измененных строк
+        или None при ошибке.
+        """
+        staging_name = self.staging_table_name(table_name)
+        full_table_name = f"{self.schema}.{table_name}"
+        full_staging_name = f"{self.schema}.{staging_name}"
+        metrics = metrics or TransferMetrics("merge_staging_table", target=full_table_name)
         try:
-            with open(temp_csv_path, 'r', encoding='utf-8') as my_file:
+            if not key_columns:
+                raise ValueError("Для write_mode='upsert' нужно указать key_columns.")
+            with metrics.phase("merge"):
                 with self.conn.cursor() as cursor:
-                    sql_statement = f"""COPY {full_table_name} FROM STDIN WITH
-                                        CSV
-                                        ENCODING 'UTF8'
-                                        HEADER
-                                        DELIMITER AS ',';"""
-                    cursor.copy_expert(sql=sql_statement, file=my_file)
-                    cursor.execute(f"GRANT SELECT ON TABLE {full_table_name} TO PUBLIC;")
+                    cursor.execute(f"SELECT * FROM {full_staging_name} LIMIT 0;")
+                    columns = [desc[0] for desc in cursor.description]
+                    keys = ", ".join(key_columns)
+                    values = [column for column in columns if column not in key_columns]
+                    if values:
+                        changed = " OR ".join(f"{table_name}.{column} IS DISTINCT FROM EXCLUDED.{column}"
+                                              for column in values)
+                        assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in values)
+                        conflict_action = f"DO UPDATE SET {assignments} WHERE {changed}"
+                    else:
+                        conflict_action = "DO NOTHING"
+
+                    self._ensure_upsert_key(cursor, table_name, key_columns)
+                    column_list = ", ".join(columns)
+                    cursor.execute(
+                        f"""INSERT INTO {full_table_name} ({column_list})
+                            SELECT DISTINCT ON ({keys}) {column_list} FROM {full_staging_name}
+                            ORDER BY {keys}, ctid DESC
+                            ON CONFLICT ({keys}) {conflict_action};""")
+                    merged = cursor.rowcount
+                    cursor.execute(f"DROP TABLE {full_staging_name};")
                     self.conn.commit()
-            self.logger.info(f"Данные загружены в таблицу {full_table_name} в PostgreSQL.")
+            self.logger.info(f"Таблица {full_table_name} обновлена по ключу ({keys}): вставлено или изменено "
+                             f"строк: {merged}.")
+            return merged
         except (Exception, psycopg2.DatabaseError) as error:
-            self.logger.error(f"Ошибка при загрузке данных: {error}")
+            self.logger.error(f"Ошибка при слиянии в таблицу {full_table_name}: {error}")
+            metrics.fail(error)
             self.conn.rollback()
-        finally:
-            if os.path.exists(temp_csv_path):
-                os.remove(temp_csv_path)
-                self.logger.info(f"Временный CSV файл {temp_csv_path} удален.")
+            return None
+
+    def _copy_table_indexes(self, cursor, table_name, staging_name):
+        """
+        Повторяет на промежуточной таблице индексы и ограничения PRIMARY KEY/UNIQUE целевой таблицы.
+
+        Объекты создаются с суффиксом __staging и возвращаются списком пар
+        (вид, имя на промежуточной таблице, исходное имя) для переименования после подмены.
+        """
+        renames = []
+        cursor.execute(
+            """SELECT con.conname, pg_get_constraintdef(con.oid)
+               FROM pg_constraint con
+               JOIN pg_class rel ON rel.oid = con.conrelid
+               JOIN pg_namespace nsp ON nsp.oid = rel.relnamespace
+               WHERE nsp.nspname = %s AND rel.relname = %s AND con.contype IN ('p', 'u');""",
+            (self.schema, table_name))
+        for name, definition in cursor.fetchall():
+            staging = f"{name}__staging"
+            cursor.execute(f"ALTER TABLE {self.schema}.{staging_name} ADD CONSTRAINT {staging} {definition};")
+            renames.append(("constraint", staging, name))
+
+        cursor.execute(
+            """SELECT idx.indexname, idx.indexdef
+               FROM pg_indexes idx
+               WHERE idx.schemaname = %s AND idx.tablename = %s
+                 AND NOT EXISTS (SELECT 1 FROM pg_constraint con
+                                 WHERE con.conname = idx.indexname AND con.contype IN ('p', 'u'));""",
+            (self.schema, table_name))
+        for name, definition in cursor.fetchall():
+            staging = f"{name}__staging"
+            definition = re.sub(r" INDEX \S+ ON (ONLY )?\S+", f" INDEX {staging} ON {self.schema}.{staging_name}",
+                                definition, count=1)
+            cursor.execute(f"{definition};")
+            renames.append(("index", staging, name))
+        return renames
+
+    def _dependent_views(self, cursor, table_name):
+        """Возвращает имена представлений (в том числе материализованных), которые читают таблицу."""
+        cursor.execute(
+            """SELECT DISTINCT nsp.nspname || '.' || dependent.relname
+               FROM pg_depend dep
+               JOIN pg_rewrite rule ON rule.oid = dep.objid
+               JOIN pg_class dependent ON dependent.oid = rule.ev_class
+               JOIN pg_namespace nsp ON nsp.oid = dependent.relnamespace
+               WHERE dep.classid = 'pg_rewrite'::regclass AND dep.refobjid = to_regclass(%s)
+                 AND dependent.oid <> dep.refobjid
+               ORDER BY 1;""",
+            (f"{self.schema}.{table_name}",))
+        return [row[0] for row in cursor.fetchall()]
+
+    def _copy_table_grants(self, cursor, table_name, staging_name):
+        """Выдает промежуточной таблице те же права, что у целевой (по ее relacl)."""
+        cursor.execute(
+            """SELECT COALESCE(quote_ident(grantee.rolname), 'PUBLIC'), acl.privilege_type, acl.is_grantable
+               FROM pg_class rel
+               CROSS JOIN LATERAL aclexplode(rel.relacl) acl
+               LEFT JOIN pg_roles grantee ON grantee.oid = acl.grantee
+               WHERE rel.oid = to_regclass(%s)
+               ORDER BY 1, 2;""",
+            (f"{self.schema}.{table_name}",))
+        for grantee, privilege, grantable in cursor.fetchall():
+            cursor.execute(f"GRANT {privilege} ON TABLE {self.schema}.{staging_name} TO {grantee}"
+                           f"{' WITH GRANT OPTION' if grantable else ''};")
+
+    def swap_staging_table(self, table_name, logged=True, metrics=None):
+        """
+        Подменяет целевую таблицу загруженной промежуточной в одной транзакции.
+
+        Перед подменой на промежуточной таблице создаются индексы и ограничения
+        целевой таблицы, выдаются ее права (relacl) и GRANT SELECT для PUBLIC;
+        при logged=True она переводится в LOGGED. Читатели видят старые данные
+        до COMMIT, а при ошибке целевая таблица остается нетронутой. Если от
+        целевой таблицы зависят представления, подмена не выполняется (DROP TABLE
+        не пройдет, пока они есть): такие таблицы нужно загружать в режиме
+        "append" или "upsert". Возвращает True при успешной подмене.
+        """
+        staging_name = self.staging_table_name(table_name)
+        full_table_name = f"{self.schema}.{table_name}"
+        full_staging_name = f"{self.schema}.{staging_name}"
+        metrics = metrics or TransferMetrics("swap_staging_table", target=full_table_name)
+        try:
+            with metrics.phase("swap"):
+                with self.conn.cursor() as cursor:
+                    views = self._dependent_views(cursor, table_name)
+                    if views:
+                        raise ValueError(f"От таблицы {full_table_name} зависят представления {', '.join(views)}; "
+                                         f"подмену нельзя выполнить, не удалив их. Используйте write_mode='append' или 'upsert'.")
+                    renames = self._copy_table_indexes(cursor, table_name, staging_name)
+                    self._copy_table_grants(cursor, table_name, staging_name)
+                    cursor.execute(f"GRANT SELECT ON TABLE {full_staging_name} TO PUBLIC;")
+                    if logged:
+                        cursor.execute(f"ALTER TABLE {full_staging_name} SET LOGGED;")
+                    self.conn.commit()
+
+                    cursor.execute(f"DROP TABLE IF EXISTS {full_table_name};")
+                    cursor.execute(f"ALTER TABLE {full_staging_name} RENAME TO {table_name};")
+                    for kind, staging, name in renames:
+                        if kind == "constraint":
+                            cursor.execute(f"ALTER TABLE {full_table_name} RENAME CONSTRAINT {staging} TO {name};")
+                        else:
+                            cursor.execute(f"ALTER INDEX {self.schema}.{staging} RENAME TO {name};")
+                    self.conn.commit()
+            self.logger.info(f"Таблица {full_table_name} подменена загруженной таблицей {full_staging_name}.")
+            return True
+        except (Exception, psycopg2.DatabaseError) as error:
+            self.logger.error(f"Ошибка при подмене таблицы {full_table_name}: {error}")
+            metrics.fail(error)
+            self.conn.rollback()
+            return False
+
+    @staticmethod
+    def _copy_statement(full_table_name, header=True):
+        """Формирует команду COPY ... FROM STDIN для CSV."""
+        return f"""COPY {full_table_name} FROM STDIN WITH
+                   CSV
+                   ENCODING 'UTF8'
+                   {'HEADER' if header else ''}
+                   DELIMITER AS ',';"""
+
+    @staticmethod
+    def _binary_copy_statement(full_table_name, columns):
+        """Формирует команду COPY ... FROM STDIN для двоичного формата."""
+        return f"COPY {full_table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary);"
+
+    @staticmethod
+    def _get_type_oids(cursor, full_table_name, columns):
+        """Возвращает OID типов столбцов таблицы в порядке columns."""
+        cursor.execute(f"SELECT * FROM {full_table_name} LIMIT 0;")
+        table_oids = {desc[0]: desc[1] for desc in cursor.description}
+        try:
+            return [table_oids[str(col).lower()] for col in columns]
+        except KeyError as error:
+            raise UnsupportedBinaryType(f"Столбец {error} отсутствует в таблице {full_table_name}.")
+
+    def _prepare_copy(self, cursor, df, full_table_name, copy_format):
+        """Кодирует DataFrame для COPY; при неподдерживаемых типах возвращается к CSV."""
+        if copy_format == "binary":
+            try:
+                oids = self._get_type_oids(cursor, full_table_name, df.columns)
+                payload = encode_binary_copy(df, oids)
+                return self._binary_copy_statement(full_table_name, df.columns), payload
+            except UnsupportedBinaryType as error:
+                self.logger.warning(f"Двоичный COPY недоступен, используется CSV: {error}")
+        payload = df.to_csv(header=True, index=False).encode('utf-8')
+        return self._copy_statement(full_table_name), payload
+
+    def load_data_to_db(self, df, table_name, copy_format="csv", quarantine=None, metrics=None):
+        """Загружает данные из DataFrame в PostgreSQL через COPY из буфера в памяти.
+
+        :param copy_format: "csv" или "binary" - двоичный COPY без разбора текста на сервере
+        :param quarantine: путь к CSV-файлу карантина; если задан, строки проверяются по типам
+                           столбцов таблицы, и не прошедшие проверку пишутся в файл, а не в таблицу
+        :return: TransferMetrics с временем сериализации и записи, строками и байтами
+        """
+        full_table_name = f"{self.schema}.{table_name}"
+        with track_transfer(metrics, "load_data_to_db", target=full_table_name, exporter=self.metrics_exporter,
+                            logger=self.logger) as metrics:
+            try:
+                if quarantine:
+                    df = next(validated_chunks([df], self.get_validator(table_name), quarantine, metrics))
+                with self.conn.cursor() as cursor:
+                    with metrics.phase("serialize"):
+                        statement, payload = self._prepare_copy(cursor, df, full_table_name, copy_format)
+                    started = time.perf_counter()
+                    with metrics.phase("write"):
+                        cursor.copy_expert(sql=statement, file=io.BytesIO(payload))
+                        cursor.execute(f"GRANT SELECT ON TABLE {full_table_name} TO PUBLIC;")
+                        self.conn.commit()
+                    metrics.record_chunk(len(df), len(payload), time.perf_counter() - started)
+                self.logger.info(f"Данные загружены в таблицу {full_table_name} в PostgreSQL.")
+                self._log_quarantine(full_table_name, quarantine, metrics.quarantined)
+            except (Exception, psycopg2.DatabaseError) as error:
+                self.logger.error(f"Ошибка при загрузке данных: {error}")
+                metrics.fail(error)
+                self.conn.rollback()
+        return metrics
+
+    def _encode_chunks(self, cursor, chunks, full_table_name, copy_format, metrics):
+        """
+        Возвращает команду COPY и итератор байтовых порций для потока DataFrame.
+
+        Формат выбирается до начала COPY: двоичный - только если все
+        объявленные типы столбцов таблицы поддерживаются и первая порция
+        кодируется, иначе весь поток передается в CSV. Сменить формат
+        посреди COPY нельзя, поэтому следующая порция, типы которой разошлись
+        с первой, приводится к типам первой порции (conform_chunk) и кодируется
+        повторно. Время кодирования учитывается в фазе "serialize", каждая
+        порция - в статистике порций.
+        """
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return self._copy_statement(full_table_name, header=False), iter(())
+
+        def encoded(frames, encode):
+            for df in frames:
+                started = time.perf_counter()
+                payload = encode(df)
+                seconds = time.perf_counter() - started
+                metrics.add_phase_time("serialize", seconds)
+                metrics.record_chunk(len(df), len(payload), seconds)
+                yield payload
+
+        if copy_format == "binary":
+            try:
+                oids = self._get_type_oids(cursor, full_table_name, first_chunk.columns)
+                check_binary_types(first_chunk.columns, oids)
+                with metrics.phase("serialize"):
+                    first_payload = encode_binary_rows(first_chunk, oids)
+                metrics.record_chunk(len(first_chunk), len(first_payload))
+                dtypes = first_chunk.dtypes
+
+                def encode_binary(df):
+                    try:
+                        return encode_binary_rows(df, oids)
+                    except UnsupportedBinaryType:
+                        return encode_binary_rows(conform_chunk(df, dtypes), oids)
+
+                body = itertools.chain(
+                    [PGCOPY_HEADER, first_payload],
+                    encoded(chunks, encode_binary),
+                    [PGCOPY_TRAILER],
+                )
+                return self._binary_copy_statement(full_table_name, first_chunk.columns), body
+            except UnsupportedBinaryType as error:
+                self.logger.warning(f"Двоичный COPY недоступен, используется CSV: {error}")
+
+        body = encoded(itertools.chain([first_chunk], chunks),
+                       lambda df: df.to_csv(header=False, index=False).encode('utf-8'))
+        return self._copy_statement(full_table_name, header=False), body
+
+    def load_chunks_to_db(self, chunks, table_name, copy_format="csv", metrics=None):
+        """
+        Загружает поток DataFrame в PostgreSQL одной командой COPY.
+
+        Порции кодируются (в CSV или двоичный формат) по мере того, как COPY
+        читает данные, поэтому ни временный файл, ни полная выгрузка
+        в памяти не нужны. Возвращает количество загруженных строк
+        или None, если загрузка завершилась ошибкой.
+
+        Источник порций читается внутри COPY, поэтому фаза "write" в metrics
+        считается как время COPY за вычетом фаз, учтенных за это время
+        (чтение источника, сериализация и т.д.).
+        """
+        full_table_name = f"{self.schema}.{table_name}"
+        metrics = metrics or TransferMetrics("load_chunks_to_db", target=full_table_name)
+        total_rows = 0
+
+        def counted_chunks():
+            nonlocal total_rows
+            for df in chunks:
+                total_rows += len(df)
+                yield df
+
+        try:
+            with self.conn.cursor() as cursor:
+                statement, body = self._encode_chunks(cursor, counted_chunks(), full_table_name, copy_format, metrics)
+                phases_before = sum(metrics.phases.values())
+                started = time.perf_counter()
+                cursor.copy_expert(sql=statement, file=IteratorReader(body))
+                cursor.execute(f"GRANT SELECT ON TABLE {full_table_name} TO PUBLIC;")
+                self.conn.commit()
+                elapsed = time.perf_counter() - started
+                metrics.add_phase_time("write", max(0.0, elapsed - (sum(metrics.phases.values()) - phases_before)))
+            self.logger.info(f"Данные загружены в таблицу {full_table_name} в PostgreSQL, строк: {total_rows}.")
+        except (Exception, psycopg2.DatabaseError) as error:
+            self.logger.error(f"Ошибка при потоковой загрузке данных: {error}")
+            metrics.fail(error)
+            self.conn.rollback()
+            return None
+        return total_rows
+
+    def load_arrow_to_db(self, tables, table_name, write_mode="replace", key_columns=None, metrics=None):
+        """
+        Создает таблицу по схеме первой порции pyarrow.Table и загружает поток порций одной командой COPY.
+
+        Порции кодируются в CSV средствами pyarrow (без DataFrame и объектов
+        Python на каждую строку), типы столбцов выводятся по схеме Arrow.
+        Режимы write_mode - как в load_stream. Возвращает количество строк
+        или None при ошибке.
+        """
+        metrics = metrics or TransferMetrics("load_arrow_to_db", target=f"{self.schema}.{table_name}")
+        tables = metrics.timed_iter(tables, "read")
+        first_table = next(tables, None)
+        if first_table is None:
+            self.logger.warning(f"Источник для таблицы {table_name} пуст, таблица не создана.")
+            return 0
+        schema = first_table.schema
+        with metrics.phase("create_table"):
+            self.create_table(table_name, None, write_mode=write_mode, column_types=postgres_column_types(schema))
+        full_table_name = f"{self.schema}.{self.load_table_name(table_name, write_mode)}"
+        total_rows = 0
+        write_options = pa_csv.WriteOptions(include_header=False)
+
+        def encoded():
+            nonlocal total_rows
+            for table in itertools.chain([first_table], tables):
+                started = time.perf_counter()
+                sink = io.BytesIO()
+                pa_csv.write_csv(table.cast(schema), sink, write_options)
+                payload = sink.getvalue()
+                seconds = time.perf_counter() - started
+                metrics.add_phase_time("serialize", seconds)
+                metrics.record_chunk(table.num_rows, len(payload), seconds)
+                total_rows += table.num_rows
+                yield payload
+
+        try:
+            with self.conn.cursor() as cursor:
+                phases_before = sum(metrics.phases.values())
+                started = time.perf_counter()
+                cursor.copy_expert(sql=self._copy_statement(full_table_name, header=False), file=IteratorReader(encoded()))
+                cursor.execute(f"GRANT SELECT ON TABLE {full_table_name} TO PUBLIC;")
+                self.conn.commit()
+                elapsed = time.perf_counter() - started
+                metrics.add_phase_time("write", max(0.0, elapsed - (sum(metrics.phases.values()) - phases_before)))
+            self.logger.info(f"Данные Arrow загружены в таблицу {full_table_name} в PostgreSQL, строк: {total_rows}.")
+        except (Exception, psycopg2.DatabaseError) as error:
+            self.logger.error(f"Ошибка при загрузке данных Arrow: {error}")
+            metrics.fail(error)
+            self.conn.rollback()
+            return None
+        if not self.publish_staging_table(table_name, write_mode, key_columns, metrics):
+            return None
+        return total_rows
 
     @staticmethod
     def clean_name(name):
@@ -124,38 +881,329 @@ class PostgresDatabase:
         self.logger.info(f"Столбцы переименованы согласно column_mapping: {column_mapping}")
         return df.rename(columns=cleaned_column_mapping)
 
-    def process_data(self, data_source, column_mapping=None, table_name=None):
-        """Обрабатывает и загружает данные из Excel в PostgreSQL."""
-        try:
-            df = pd.read_excel(data_source) if isinstance(data_source, str) else data_source
-            self.logger.info("Данные успешно загружены из источника.")
-            df = self.rename_columns(df, column_mapping)
-            if table_name is None and isinstance(data_source, str):
-                table_name = self.clean_name(os.path.splitext(os.path.basename(data_source))[0])
-            self.create_table(table_name, df)
-            self.load_data_to_db(df, table_name)
-            self.logger.info(f"Данные из источника {data_source} загружены в таблицу {table_name} в PostgreSQL.")
-        except (Exception, psycopg2.DatabaseError) as error:
-            self.logger.error(f"Ошибка при обработке данных: {error}")
-            self.conn.rollback()
+    def process_data(self, data_source, column_mapping=None, table_name=None, copy_format="csv", chunk_size=None,
+                     sheets=None, write_mode="replace", key_columns=None, transforms=None, quarantine=None,
+                     metrics=None):
+        """Обрабатывает и загружает данные из Excel в PostgreSQL.
 
-    def transfer_from_clickhouse(self, clickhouse_db, ch_table, pg_table, column_mapping=None):
-        """Копирует данные из ClickHouse в PostgreSQL с переименованием колонок."""
-        try:
-            # Запрос данных из ClickHouse
-            query = f"SELECT * FROM {ch_table};"
-            df = clickhouse_db.client.query_df(query)
-            self.logger.info(f"Данные из таблицы {ch_table} успешно получены из ClickHouse.")
+        При заданном chunk_size файл (xlsx или csv) читается потоково порциями
+        по chunk_size строк, и каждая порция сразу уходит в COPY - расход
+        памяти не зависит от размера файла. Каждый лист книги загружается
+        в свою таблицу ({table_name}_{лист}, если листов несколько) сразу
+        после чтения; sheets ограничивает список листов.
+
+        При write_mode="swap" (или "swap_unlogged") данные загружаются
+        в промежуточную таблицу, которая затем подменяет целевую, поэтому
+        во время загрузки читатели видят прежние данные. При write_mode="upsert"
+        строки сливаются с уже загруженными по key_columns (см. merge_staging_table).
+
+        transforms - правила преобразования порций (см. transforms.compile_transforms),
+        применяются после переименования по column_mapping.
+
+        При заданном quarantine (путь к CSV-файлу) строки проверяются по типам
+        столбцов созданной таблицы (см. validation), и отклоненные строки
+        с причиной пишутся в этот файл, а остальные загружаются.
+
+        :return: TransferMetrics по фазам read, transform, validate, create_table, serialize, write
+        """
+        if table_name is None and isinstance(data_source, str):
+            table_name = self.clean_name(os.path.splitext(os.path.basename(data_source))[0])
+        source = data_source if isinstance(data_source, str) else "DataFrame"
+        with track_transfer(metrics, "process_data", source=source, target=f"{self.schema}.{table_name}",
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                if chunk_size and isinstance(data_source, str):
+                    for sheet_name, chunks, sheet_count in iter_file_sheets(data_source, chunk_size, sheets):
+                        sheet_table = table_name if sheet_count == 1 else f"{table_name}_{self.clean_name(sheet_name)}"
+                        rows = self.load_stream(chunks, sheet_table, column_mapping, copy_format, write_mode,
+                                                key_columns, transforms, quarantine, metrics=metrics)
+                        if rows is None:
+                            return metrics
+                        self.logger.info(f"Лист {sheet_name or data_source} загружен в таблицу {sheet_table}, строк: {rows}.")
+                    return metrics
+
+                with metrics.phase("read"):
+                    df = pd.read_excel(data_source) if isinstance(data_source, str) else data_source
+                self.logger.info("Данные успешно загружены из источника.")
+                with metrics.phase("transform"):
+                    df = self.rename_columns(df, column_mapping)
+                    if transforms:
+                        df = compile_transforms(transforms)(df)
+                with metrics.phase("create_table"):
+                    self.create_table(table_name, df, copy_format, write_mode)
+                self.load_data_to_db(df, self.load_table_name(table_name, write_mode), copy_format, quarantine,
+                                     metrics=metrics)
+                if metrics.ok:
+                    self.publish_staging_table(table_name, write_mode, key_columns, metrics)
+                if metrics.ok:
+                    self.logger.info(f"Данные из источника {data_source} загружены в таблицу {table_name} в PostgreSQL.")
+            except (Exception, psycopg2.DatabaseError) as error:
+                self.logger.error(f"Ошибка при обработке данных: {error}")
+                metrics.fail(error)
+                self.conn.rollback()
+        return metrics
+
+    def load_stream(self, chunks, table_name, column_mapping=None, copy_format="csv", write_mode="replace",
+                    key_columns=None, transforms=None, quarantine=None, metrics=None):
+        """
+        Создает таблицу по первой порции и загружает весь поток порций одной командой COPY.
 
-            # Переименование колонок, если задано сопоставление
+        Столбцы каждой порции переименовываются, к ней применяются правила
+        transforms (см. transforms.compile_transforms), при заданном quarantine
+        строки проверяются по типам таблицы (отклоненные пишутся в файл
+        карантина), а типы приводятся к типам первой порции. Столбцы следующих
+        порций выравниваются по именам столбцов первой: недостающие заполняются
+        NULL, лишние отбрасываются. В режимах write_mode с подменой и слиянием поток
+        загружается в промежуточную таблицу, которая после COPY подменяет
+        целевую или сливается с ней по key_columns.
+        Возвращает количество строк или None при ошибке.
+        """
+        metrics = metrics or TransferMetrics("load_stream", target=f"{self.schema}.{table_name}")
+        chunks = metrics.timed_iter(chunks, "read")
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            self.logger.warning(f"Источник для таблицы {table_name} пуст, таблица не создана.")
+            return 0
+        transform = compile_transforms(transforms) if transforms else None
+        source_columns = list(first_chunk.columns)
+        with metrics.phase("transform"):
             if column_mapping:
-                df = self.rename_columns(df, column_mapping)
-            
-            # Создание таблицы в PostgreSQL и загрузка данных
-            self.create_table(pg_table, df)
-            self.load_data_to_db(df, pg_table)
-            self.logger.info(f"Данные успешно перенесены из ClickHouse в PostgreSQL в таблицу {pg_table}.")
-        
-        except Exception as error:
-            self.logger.error(f"Ошибка при копировании данных из ClickHouse в PostgreSQL: {error}")
-            self.conn.rollback()
+                first_chunk = self.rename_columns(first_chunk, column_mapping)
+            columns = list(first_chunk.columns)
+            if transform:
+                first_chunk = transform(first_chunk)
+        dtypes = first_chunk.dtypes
+
+        validate = None
+
+        def conformed_chunks():
+            for df in chunks:
+                with metrics.phase("transform"):
+                    if list(df.columns) != source_columns:
+                        df = self._align_columns(df, source_columns, table_name)
+                    df.columns = columns
+                    if transform:
+                        df = transform(df)
+                if validate:
+                    # Проверка идет до приведения типов: неприводимые значения уходят в карантин
+                    df = next(validated_chunks([df], validate, quarantine, metrics))
+                with metrics.phase("transform"):
+                    df = conform_chunk(df, dtypes)
+                yield df
+
+        load_table = self.load_table_name(table_name, write_mode)
+        quarantined = metrics.quarantined
+        with metrics.phase("create_table"):
+            self.create_table(table_name, first_chunk, copy_format, write_mode)
+        if quarantine:
+            validate = self.get_validator(load_table)
+            first_chunk = next(validated_chunks([first_chunk], validate, quarantine, metrics))
+        rows = self.load_chunks_to_db(itertools.chain([first_chunk], conformed_chunks()), load_table, copy_format,
+                                      metrics=metrics)
+        if rows is not None and not self.publish_staging_table(table_name, write_mode, key_columns, metrics):
+            return None
+        self._log_quarantine(f"{self.schema}.{table_name}", quarantine, metrics.quarantined - quarantined)
+        return rows
+
+    def _align_columns(self, df, source_columns, table_name):
+        """Приводит столбцы порции к столбцам первой порции: недостающие - NULL, лишние отбрасываются."""
+        missing = [column for column in source_columns if column not in df.columns]
+        extra = [column for column in df.columns if column not in source_columns]
+        if missing or extra:
+            self.logger.warning(f"Таблица {table_name}: столбцы порции отличаются от первой порции "
+                                f"(нет: {missing}, лишние: {extra}); недостающие заполнены NULL, лишние пропущены.")
+        return df.reindex(columns=source_columns)
+
+    def _log_quarantine(self, table_name, quarantine, rows):
+        if rows:
+            self.logger.warning(f"Таблица {table_name}: строк, не прошедших проверку: {rows}, "
+                                f"они записаны в файл карантина {quarantine}.")
+
+    def _renamed_chunks(self, chunks, column_mapping, metrics=None):
+        """Переименовывает столбцы порций; сопоставление вычисляется один раз по первой порции."""
+        metrics = metrics or TransferMetrics("rename")
+        columns = None
+        for df in chunks:
+            with metrics.phase("transform"):
+                if columns is None:
+                    df = self.rename_columns(df, column_mapping)
+                    columns = list(df.columns)
+                else:
+                    df.columns = columns
+            yield df
+
+    def transfer_from_clickhouse(self, clickhouse_db, ch_table, pg_table, column_mapping=None, prefetch_chunks=2,
+                                 copy_format="csv", incremental_column=None, state_store=None, write_mode=None,
+                                 key_columns=None, transforms=None, quarantine=None, metrics=None):
+        """
+        Копирует данные из ClickHouse в PostgreSQL с переименованием колонок.
+
+        Блоки результата ClickHouse читаются в фоновом потоке (не более
+        prefetch_chunks блоков наперед) и сразу кодируются в COPY, так что
+        чтение из ClickHouse идет параллельно с записью в PostgreSQL.
+        Если у clickhouse_db задан result_cache, повторная выгрузка неизменной
+        таблицы читается из локального кэша (см. ResultCache).
+
+        При заданном incremental_column таблица не пересоздается, а дополняется
+        строками, у которых значение столбца больше сохраненной в state_store
+        границы; после успешной загрузки граница сдвигается на максимум.
+
+        :param write_mode: по умолчанию "append" для инкрементального переноса и "replace"
+                           для полного; "swap"/"swap_unlogged" - загрузка в промежуточную
+                           таблицу с атомарной подменой (только для полного переноса);
+                           "upsert" - слияние по key_columns, при инкрементальном переносе
+                           обновляются только изменившиеся строки
+        :param transforms: правила преобразования порций (см. transforms.compile_transforms),
+                           применяются после переименования по column_mapping
+        :param quarantine: путь к CSV-файлу карантина; если задан, порции проверяются по типам
+                           созданной таблицы (см. validation), и отклоненные строки пишутся в файл
+        :return: TransferMetrics; фаза "read" - время ожидания очередного блока от ClickHouse
+        """
+        full_table_name = f"{self.schema}.{pg_table}"
+        with track_transfer(metrics, "transfer_from_clickhouse", source=ch_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                query = f"SELECT * FROM {ch_table}"
+                parameters = None
+                watermark = high_watermark = None
+                if write_mode is None:
+                    write_mode = "append" if incremental_column else "replace"
+                if incremental_column and write_mode not in ("append", "upsert"):
+                    raise ValueError("Инкрементальный перенос поддерживает только write_mode='append' или 'upsert'.")
+                if incremental_column:
+                    state_store = state_store or StateStore()
+                    watermark = high_watermark = state_store.get_watermark(ch_table, full_table_name)
+                    if watermark is not None:
+                        query += f" WHERE {incremental_column} > %(watermark)s"
+                        parameters = {"watermark": watermark}
+                        self.logger.info(f"Инкрементальный перенос {ch_table}: {incremental_column} > {watermark}.")
+
+                def tracked_chunks(chunks):
+                    nonlocal high_watermark
+                    for df in chunks:
+                        if not df.empty:
+                            chunk_max = StateStore.to_python(df[incremental_column].max())
+                            if chunk_max is not None and (high_watermark is None or chunk_max > high_watermark):
+                                high_watermark = chunk_max
+                        yield df
+
+                chunks = prefetch(clickhouse_db.iter_query_chunks(query, parameters, cache_table=ch_table),
+                                  maxsize=prefetch_chunks)
+                chunks = metrics.timed_iter(chunks, "read")
+                if incremental_column:
+                    chunks = tracked_chunks(chunks)
+                if column_mapping:
+                    chunks = self._renamed_chunks(chunks, column_mapping, metrics)
+                transform = compile_transforms(transforms) if transforms else None
+                if transform:
+                    chunks = transform_chunks(chunks, transform, metrics)
+
+                first_chunk = next(chunks, None)
+                if first_chunk is None:
+                    # Пустой результат: берем только структуру таблицы
+                    first_chunk = clickhouse_db.client.query_df(f"SELECT * FROM {ch_table} LIMIT 0")
+                    if column_mapping:
+                        first_chunk = self.rename_columns(first_chunk, column_mapping)
+                    if transform:
+                        first_chunk = transform(first_chunk)
+                self.logger.info(f"Начато чтение таблицы {ch_table} из ClickHouse.")
+
+                with metrics.phase("create_table"):
+                    self.create_table(pg_table, first_chunk, copy_format, write_mode)
+                chunks = itertools.chain([first_chunk], chunks)
+                if quarantine:
+                    validate = self.get_validator(self.load_table_name(pg_table, write_mode))
+                    chunks = validated_chunks(chunks, validate, quarantine, metrics)
+                rows = self.load_chunks_to_db(chunks, self.load_table_name(pg_table, write_mode), copy_format,
+                                              metrics=metrics)
+                if rows is None:
+                    return metrics
+                if not self.publish_staging_table(pg_table, write_mode, key_columns, metrics):
+                    return metrics
+                if incremental_column and high_watermark is not None and high_watermark != watermark:
+                    state_store.set_watermark(ch_table, full_table_name, high_watermark)
+                self.logger.info(f"Данные успешно перенесены из ClickHouse в PostgreSQL в таблицу {pg_table}, строк: {rows}.")
+                self._log_quarantine(full_table_name, quarantine, metrics.quarantined)
+
+            except Exception as error:
+                self.logger.error(f"Ошибка при копировании данных из ClickHouse в PostgreSQL: {error}")
+                metrics.fail(error)
+                self.conn.rollback()
+        return metrics
+
+    def transfer_from_clickhouse_arrow(self, clickhouse_db, ch_table, pg_table, column_mapping=None,
+                                       write_mode="replace", key_columns=None, metrics=None):
+        """
+        Копирует таблицу из ClickHouse в PostgreSQL колоночным путем Arrow.
+
+        Блоки читаются из ClickHouse в формате ArrowStream (см.
+        ClickHouseDatabase.iter_query_arrow), столбцы переименовываются
+        в схеме Arrow, а типы таблицы PostgreSQL выводятся по этой схеме.
+        Блоки читаются в фоновом потоке параллельно с COPY. Режимы write_mode -
+        как в transfer_from_clickhouse; инкрементальный перенос здесь не поддерживается.
+
+        :return: TransferMetrics; фаза "read" - время ожидания очередного блока от ClickHouse
+        """
+        full_table_name = f"{self.schema}.{pg_table}"
+        with track_transfer(metrics, "transfer_from_clickhouse_arrow", source=ch_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                query = clickhouse_db.arrow_select(ch_table)
+                tables = prefetch(clickhouse_db.iter_query_arrow(query, cache_table=ch_table))
+                if column_mapping:
+                    tables = (rename_arrow_columns(table, column_mapping) for table in tables)
+                self.logger.info(f"Начато чтение таблицы {ch_table} из ClickHouse в формате Arrow.")
+                rows = self.load_arrow_to_db(tables, pg_table, write_mode, key_columns, metrics)
+                if rows is None:
+                    return metrics
+                self.logger.info(f"Данные из ClickHouse перенесены в PostgreSQL в таблицу {pg_table}, строк: {rows}.")
+            except Exception as error:
+                self.logger.error(f"Ошибка при копировании данных Arrow из ClickHouse в PostgreSQL: {error}")
+                metrics.fail(error)
+                self.conn.rollback()
+        return metrics
+
+    async def transfer_from_clickhouse_async(self, clickhouse_db, ch_table, pg_table, column_mapping=None,
+                                             copy_format="csv", queue_size=2, write_mode="replace", key_columns=None,
+                                             transforms=None, quarantine=None, metrics=None):
+        """
+        Копирует таблицу из ClickHouse в PostgreSQL асинхронным конвейером (см. AsyncTransfer).
+
+        Получение блоков от ClickHouse, преобразование порций (переименование
+        по column_mapping и правила transforms) и COPY в PostgreSQL идут
+        одновременно в разных стадиях, связанных очередями на queue_size порций.
+        Режимы write_mode и quarantine - как в transfer_from_clickhouse; инкрементальный
+        перенос здесь не поддерживается.
+
+        Использование: asyncio.run(pg_db.transfer_from_clickhouse_async(ch_db, "test_schema.reviews", "reviews"))
+
+        :return: TransferMetrics; фаза "read" - время ожидания очередной готовой порции
+        """
+        full_table_name = f"{self.schema}.{pg_table}"
+        with track_transfer(metrics, "transfer_from_clickhouse_async", source=ch_table, target=full_table_name,
+                            exporter=self.metrics_exporter, logger=self.logger) as metrics:
+            try:
+                chunks = clickhouse_db.iter_query_chunks(f"SELECT * FROM {ch_table}", cache_table=ch_table)
+                transform = compile_transforms(transforms) if transforms else None
+
+                def convert(df):
+                    with metrics.phase("transform"):
+                        if column_mapping:
+                            df = self.rename_columns(df, column_mapping)
+                        return transform(df) if transform else df
+
+                def load(chunks):
+                    return self.load_stream(chunks, pg_table, copy_format=copy_format, write_mode=write_mode,
+                                            key_columns=key_columns, quarantine=quarantine, metrics=metrics)
+
+                self.logger.info(f"Начат асинхронный перенос таблицы {ch_table} из ClickHouse.")
+                rows = await AsyncTransfer(queue_size).run(chunks, load, convert if column_mapping or transform else None)
+                if rows is None:
+                    return metrics
+                self.logger.info(f"Данные из ClickHouse асинхронно перенесены в PostgreSQL в таблицу {pg_table}, "
+                                 f"строк: {rows}.")
+            except Exception as error:
+                self.logger.error(f"Ошибка при асинхронном копировании данных из ClickHouse в PostgreSQL: {error}")
+                metrics.fail(error)
+                self.conn.rollback()
+        return metrics
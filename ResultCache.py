@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+import pyarrow as pa
+
+
+class ResultCache:
+    """
+    Кэш результатов запросов ClickHouse на локальном диске.
+
+    Результат хранится в файле Arrow IPC (одна запись на блок результата)
+    и при чтении отображается в память (pyarrow.memory_map), поэтому повторная
+    выгрузка неизменной таблицы читается с локального диска без обращения
+    к кластеру. Ключ записи - текст запроса с параметрами и версия таблицы
+    (см. ClickHouseDatabase.table_version): после вставки, слияния или мутации
+    версия меняется, и прежний результат заменяется новым. Общий размер
+    файлов ограничен max_bytes; при превышении удаляются записи, которые
+    дольше всех не читались (LRU по времени изменения файла, оно обновляется
+    при каждом чтении).
+    """
+
+    SUFFIX = ".arrow"
+
+    def __init__(self, directory="etl_cache", max_bytes=10 * 2 ** 30):
+        """
+        :param directory: каталог файлов кэша (создается, если его нет)
+        :param max_bytes: максимальный общий размер файлов кэша в байтах
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Кэш передается в процессы-исполнители вместе с объектом базы, блокировка не сериализуется
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+    def path(self, query, parameters, version):
+        """Путь к файлу записи: {хэш запроса и параметров}.{хэш версии таблицы}.arrow."""
+        query_key = self._digest(json.dumps([query, parameters], sort_keys=True, default=str))
+        return os.path.join(self.directory, f"{query_key}.{self._digest(json.dumps(version, default=str))}{self.SUFFIX}")
+
+    def read(self, path, from_arrow=None):
+        """
+        Возвращает итератор порций из записи кэша или None, если записи нет.
+
+        Файл отображается в память, блоки читаются без копирования;
+        from_arrow преобразует каждый pyarrow.Table (например, в DataFrame).
+        """
+        try:
+            source = pa.memory_map(path, "r")
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return self._read_batches(source, from_arrow)
+
+    @staticmethod
+    def _read_batches(source, from_arrow):
+        try:
+            reader = pa.ipc.open_file(source)
+            for number in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(number)])
+                yield from_arrow(table) if from_arrow else table
+        finally:
+            source.close()
+
+    def write(self, path, chunks, to_arrow=None):
+        """
+        Пропускает поток порций без изменений и одновременно записывает его в кэш.
+
+        Запись публикуется атомарным переименованием только после того, как поток
+        прочитан полностью; при досрочной остановке временный файл удаляется.
+        Если порцию не удается записать (to_arrow не смог преобразовать ее или
+        схема порции отличается от первой), кэширование этого результата
+        прекращается, а поток продолжается.
+        """
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        writer = None
+        caching = True
+        try:
+            for chunk in chunks:
+                if caching:
+                    try:
+                        table = to_arrow(chunk) if to_arrow else chunk
+                        if writer is None:
+                            writer = pa.ipc.new_file(temp_path, table.schema)
+                        writer.write_table(table)
+                    except (pa.ArrowException, OSError, ValueError, TypeError) as error:
+                        self.logger.warning(f"Результат запроса не будет сохранен в кэш: {error}")
+                        caching = False
+                yield chunk
+            if caching and writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temp_path, path)
+                self.logger.info(f"Результат запроса сохранен в кэш: {path} ({os.path.getsize(path)} байт).")
+                self._remove_stale(path)
+                self.evict()
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _entries(self):
+        """Список (время обращения, размер, путь) записей кэша."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _remove_stale(self, path):
+        """Удаляет записи того же запроса для прежних версий таблицы."""
+        query_key = os.path.basename(path).split(".")[0]
+        for _, _, entry in self._entries():
+            if entry != path and os.path.basename(entry).startswith(f"{query_key}."):
+                self._remove(entry)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Удаляет давно не читавшиеся записи, пока общий размер кэша больше max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                self.logger.info(f"Запись кэша {path} удалена ({size} байт): превышен размер кэша.")
+
+    def size(self):
+        """Общий размер записей кэша в байтах."""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """Удаляет все записи кэша."""
+        for _, _, path in self._entries():
+            self._remove(path)
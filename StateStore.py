@@ -0,0 +1,203 @@
+import datetime
+import decimal
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class StateStore:
+    """
+    Локальное хранилище состояния переносов в файле SQLite.
+
+    Хранит верхнюю границу (watermark) инкрементального столбца для каждой
+    пары источник/приемник, чтобы следующий запуск переносил только новые строки,
+    и выведенные схемы таблиц, чтобы повторные запуски не делали выборку заново.
+    Контрольные точки (checkpoints) хранят ключ последней записанной порции
+    незавершенного переноса, чтобы повторный запуск продолжил с нее.
+    """
+
+    _parsers = {
+        "int": int,
+        "float": float,
+        "str": str,
+        "datetime": datetime.datetime.fromisoformat,
+        "date": datetime.date.fromisoformat,
+        "decimal": decimal.Decimal,
+    }
+
+    def __init__(self, path="etl_state.sqlite"):
+        self.path = path
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    value_type TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (source, target)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (source, target)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schemas (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    schema TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (source, target)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Открывает новое соединение с файлом состояния (безопасно для разных потоков)."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def to_python(value):
+        """Приводит скаляр NumPy/pandas к обычному типу Python для хранения и параметров запроса."""
+        if value is None or pd.isna(value):
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.to_pydatetime()
+        if hasattr(value, "item"):
+            return value.item()
+        return value
+
+    @classmethod
+    def _serialize(cls, value):
+        if isinstance(value, bool):
+            raise TypeError("Логический столбец не может быть инкрементальным.")
+        # Decimal (столбцы numeric) хранится строкой без потери точности
+        for name, kind in (("datetime", datetime.datetime), ("date", datetime.date), ("decimal", decimal.Decimal),
+                           ("int", int), ("float", float), ("str", str)):
+            if isinstance(value, kind):
+                return (value.isoformat() if name in ("datetime", "date") else str(value)), name
+        raise TypeError(f"Неподдерживаемый тип значения watermark: {type(value).__name__}")
+
+    def get_watermark(self, source, target):
+        """Возвращает сохраненную верхнюю границу для пары источник/приемник или None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, value_type FROM watermarks WHERE source = ? AND target = ?",
+                (source, target)
+            ).fetchone()
+        if row is None:
+            return None
+        value, value_type = row
+        return self._parsers[value_type](value)
+
+    def set_watermark(self, source, target, value):
+        """Сохраняет новую верхнюю границу для пары источник/приемник."""
+        serialized, value_type = self._serialize(value)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO watermarks (source, target, value, value_type, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (source, target) DO UPDATE SET
+                    value = excluded.value,
+                    value_type = excluded.value_type,
+                    updated_at = excluded.updated_at
+                """,
+                (source, target, serialized, value_type, datetime.datetime.now().isoformat())
+            )
+        self.logger.info(f"Watermark {source} -> {target} обновлен: {serialized}.")
+
+    def reset_watermark(self, source, target):
+        """Удаляет сохраненную границу - следующий перенос будет полным."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM watermarks WHERE source = ? AND target = ?", (source, target))
+
+    def get_checkpoint(self, source, target):
+        """
+        Возвращает контрольную точку незавершенного переноса или None.
+
+        :return: словарь {"key": ключ последней записанной порции, "rows": строк записано,
+                 "chunks": порций записано, "watermark": наибольшее значение инкрементального
+                 столбца в записанных порциях или None, "run_id": идентификатор переноса,
+                 которому принадлежит контрольная точка (None для точек прежнего формата)}
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT state FROM checkpoints WHERE source = ? AND target = ?",
+                (source, target)
+            ).fetchone()
+        if row is None:
+            return None
+        state = json.loads(row[0])
+        state.setdefault("run_id", None)
+        for name in ("key", "watermark"):
+            if state[name] is not None:
+                value, value_type = state[name]
+                state[name] = self._parsers[value_type](value)
+        return state
+
+    def set_checkpoint(self, source, target, key, rows, chunks, watermark=None, run_id=None):
+        """Сохраняет контрольную точку после записи очередной порции."""
+        state = {
+            "key": self._serialize(key),
+            "rows": rows,
+            "chunks": chunks,
+            "watermark": self._serialize(watermark) if watermark is not None else None,
+            "run_id": run_id,
+        }
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO checkpoints (source, target, state, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (source, target) DO UPDATE SET
+                    state = excluded.state,
+                    updated_at = excluded.updated_at
+                """,
+                (source, target, json.dumps(state), datetime.datetime.now().isoformat())
+            )
+
+    def clear_checkpoint(self, source, target):
+        """Удаляет контрольную точку после успешного завершения переноса."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE source = ? AND target = ?", (source, target))
+
+    def get_schema(self, source, target):
+        """Возвращает сохраненную схему для пары источник/приемник или None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT schema FROM schemas WHERE source = ? AND target = ?",
+                (source, target)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_schema(self, source, target, schema):
+        """Сохраняет выведенную схему для пары источник/приемник."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO schemas (source, target, schema, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (source, target) DO UPDATE SET
+                    schema = excluded.schema,
+                    updated_at = excluded.updated_at
+                """,
+                (source, target, json.dumps(schema, ensure_ascii=False), datetime.datetime.now().isoformat())
+            )
@@ -0,0 +1,100 @@
+"""
+Сопоставление типов Arrow с типами PostgreSQL и ClickHouse для колоночного пути переноса.
+
+Типы выводятся один раз по схеме Arrow (или по OID столбцов результата
+PostgreSQL), а не по значениям каждой строки.
+"""
+import pyarrow as pa
+
+from binary_copy import (BOOL_OID, DATE_OID, FLOAT4_OID, FLOAT8_OID, INT2_OID, INT4_OID, INT8_OID,
+                         TIMESTAMP_OID, TIMESTAMPTZ_OID)
+
+# Типы столбцов результата PostgreSQL (по OID), которые pyarrow.csv разбирает без потерь;
+# остальные (numeric, json, uuid, массивы и т.д.) читаются строками
+_POSTGRES_OID_TYPES = {
+    BOOL_OID: pa.bool_(),
+    INT2_OID: pa.int16(),
+    INT4_OID: pa.int32(),
+    INT8_OID: pa.int64(),
+    FLOAT4_OID: pa.float32(),
+    FLOAT8_OID: pa.float64(),
+    DATE_OID: pa.date32(),
+    TIMESTAMP_OID: pa.timestamp("us"),
+    TIMESTAMPTZ_OID: pa.timestamp("us", tz="UTC"),
+}
+
+_CLICKHOUSE_INT_TYPES = {
+    pa.int8(): "Int8", pa.int16(): "Int16", pa.int32(): "Int32", pa.int64(): "Int64",
+    pa.uint8(): "UInt8", pa.uint16(): "UInt16", pa.uint32(): "UInt32", pa.uint64(): "UInt64",
+}
+
+_POSTGRES_INT_TYPES = {
+    pa.int8(): "smallint", pa.int16(): "smallint", pa.int32(): "integer", pa.int64(): "bigint",
+    pa.uint8(): "smallint", pa.uint16(): "integer", pa.uint32(): "bigint", pa.uint64(): "numeric(20)",
+}
+
+
+def arrow_type_for_postgres_oid(oid):
+    """Тип Arrow для столбца результата PostgreSQL с типом oid (по умолчанию строка)."""
+    return _POSTGRES_OID_TYPES.get(oid, pa.string())
+
+
+def clickhouse_type(arrow_type, nullable=True):
+    """Тип ClickHouse для типа Arrow; nullable=True оборачивает его в Nullable."""
+    if arrow_type in _CLICKHOUSE_INT_TYPES:
+        ch_type = _CLICKHOUSE_INT_TYPES[arrow_type]
+    elif pa.types.is_float32(arrow_type):
+        ch_type = "Float32"
+    elif pa.types.is_floating(arrow_type):
+        ch_type = "Float64"
+    elif pa.types.is_boolean(arrow_type):
+        ch_type = "UInt8"
+    elif pa.types.is_date(arrow_type):
+        ch_type = "Date32"
+    elif pa.types.is_timestamp(arrow_type):
+        precision = {"s": 0, "ms": 3, "us": 6, "ns": 9}[arrow_type.unit]
+        ch_type = f"DateTime64({precision}, '{arrow_type.tz}')" if arrow_type.tz else f"DateTime64({precision})"
+    elif pa.types.is_decimal(arrow_type):
+        ch_type = f"Decimal({arrow_type.precision}, {arrow_type.scale})"
+    else:
+        ch_type = "String"
+    return f"Nullable({ch_type})" if nullable else ch_type
+
+
+def postgres_type(arrow_type):
+    """Тип PostgreSQL для типа Arrow (по умолчанию text)."""
+    if arrow_type in _POSTGRES_INT_TYPES:
+        return _POSTGRES_INT_TYPES[arrow_type]
+    if pa.types.is_float32(arrow_type):
+        return "real"
+    if pa.types.is_floating(arrow_type):
+        return "double precision"
+    if pa.types.is_boolean(arrow_type):
+        return "boolean"
+    if pa.types.is_date(arrow_type):
+        return "date"
+    if pa.types.is_timestamp(arrow_type):
+        return "timestamptz" if arrow_type.tz else "timestamp"
+    if pa.types.is_decimal(arrow_type):
+        return f"numeric({arrow_type.precision}, {arrow_type.scale})"
+    return "text"
+
+
+def clickhouse_column_types(schema):
+    """Список пар (столбец, тип ClickHouse) для схемы Arrow - как column_types в ClickHouseDatabase.create_table."""
+    return [(field.name, clickhouse_type(field.type, field.nullable)) for field in schema]
+
+
+def postgres_column_types(schema):
+    """Список пар (столбец, тип PostgreSQL) для схемы Arrow - как column_types в PostgresDatabase.create_table."""
+    return [(field.name, postgres_type(field.type)) for field in schema]
+
+
+def as_table(batch):
+    """Приводит RecordBatch к pyarrow.Table (таблицы возвращаются как есть)."""
+    return pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+
+
+def rename_arrow_columns(table, column_mapping):
+    """Переименовывает столбцы таблицы Arrow по column_mapping; данные не копируются."""
+    return table.rename_columns([column_mapping.get(name, name) for name in table.column_names])
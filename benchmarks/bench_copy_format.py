@@ -0,0 +1,75 @@
+"""
+Сравнение кодирования DataFrame для COPY: CSV против двоичного формата.
+
+Измеряется только клиентская часть (сериализация в буфер), без сервера:
+    python benchmarks/bench_copy_format.py --rows 1000000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from binary_copy import FLOAT8_OID, INT8_OID, TEXT_OID, TIMESTAMP_OID, encode_binary_copy  # noqa: E402
+
+
+def make_numeric(rows, columns=20):
+    rng = np.random.default_rng(0)
+    data = {}
+    for index in range(columns):
+        if index % 2:
+            data[f"f{index}"] = rng.standard_normal(rows)
+        else:
+            data[f"i{index}"] = rng.integers(0, 10 ** 9, rows)
+    return data, [FLOAT8_OID if name.startswith("f") else INT8_OID for name in data]
+
+
+def make_reviews(rows):
+    rng = np.random.default_rng(0)
+    words = np.array(["отличный", "товар", "доставка", "быстро", "размер", "подошел", "брак"])
+    data = {
+        "article": rng.integers(10 ** 6, 10 ** 8, rows),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, rows), unit="s"),
+        "rating": rng.integers(1, 6, rows).astype("float64"),
+        "review": [" ".join(rng.choice(words, 5)) for _ in range(rows)],
+    }
+    return data, [INT8_OID, TIMESTAMP_OID, FLOAT8_OID, TEXT_OID]
+
+
+def measure(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = func()
+        best = min(best, time.perf_counter() - started)
+    return best, size
+
+
+def encode_csv(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=True, index=False)
+    return len(buffer.getvalue().encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for name, (data, oids) in (("numeric x20", make_numeric(args.rows)), ("reviews", make_reviews(args.rows))):
+        df = pd.DataFrame(data)
+        csv_time, csv_size = measure(lambda: encode_csv(df))
+        bin_time, bin_size = measure(lambda: len(encode_binary_copy(df, oids)))
+        print(f"{name:12s} rows={args.rows:>9,d}  "
+              f"csv {csv_time:7.3f}s {csv_size / 2 ** 20:8.1f} MiB  "
+              f"binary {bin_time:7.3f}s {bin_size / 2 ** 20:8.1f} MiB  "
+              f"speedup x{csv_time / bin_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Бенчмарк путей ETL на синтетических отзывах: пропускная способность, задержка порций и пиковая память.
+
+Каждый замер (путь x размер) выполняется в отдельном процессе, поэтому пиковый
+RSS не накапливается между замерами. Результаты сохраняются в JSON; при
+указании --baseline замедление относительно прошлого прогона выводится
+в отчете.
+
+    # в памяти процесса, без серверов (только клиентская часть)
+    python benchmarks/bench_etl.py --sizes 10k,1m
+    # на локальных серверах, например:
+    #   docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=1234 -e POSTGRES_DB=test_etl postgres:16
+    #   docker run -d -p 8123:8123 clickhouse/clickhouse-server
+    python benchmarks/bench_etl.py --backend live --sizes 10k,1m,10m --baseline benchmarks/results/prev.json
+
+Параметры подключения в режиме live берутся из переменных окружения PGHOST,
+PGDATABASE, PGUSER, PGPASSWORD, CLICKHOUSE_HOST, CLICKHOUSE_PORT,
+CLICKHOUSE_USER, CLICKHOUSE_PASSWORD (по умолчанию - как в ETLManager).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ("process_data", "load_data_to_db", "transfer_from_postgres", "transfer_from_clickhouse",
+         "transfer_to_postgres")
+
+# Совпадает с ETLManager.column_mapping
+COLUMN_MAPPING = {
+    "автор": "author",
+    "дата": "date",
+    "отзыв": "review",
+    "продукт": "product",
+    "артикул": "article",
+}
+
+PG_SOURCE_TABLE = "bench_reviews"
+CH_SOURCE_TABLE = "bench_reviews_ch"
+CH_SCHEMA = "bench"
+
+_AUTHORS = ["Анна", "Дмитрий", "Екатерина", "Сергей", "Ольга", "Алексей", "Мария", "Иван", "Наталья", "Павел",
+            "Татьяна", "Михаил", "Юлия", "Андрей", "Светлана", "Никита"]
+_PRODUCTS = ["Футболка хлопковая", "Кроссовки беговые", "Чехол для телефона", "Рюкзак городской",
+             "Наушники беспроводные", "Платье летнее", "Куртка зимняя", "Термокружка", "Настольная лампа",
+             "Набор кистей", "Зарядное устройство", "Постельное белье"]
+_WORDS = ["отличный", "товар", "доставка", "быстро", "размер", "подошел", "брак", "качество", "цена", "рекомендую",
+          "упаковка", "пришел", "вовремя", "цвет", "соответствует", "описанию", "немного", "маломерит",
+          "продавец", "вежливый", "хорошо", "плохо", "очень", "доволен", "довольна", "вернула", "материал"]
+
+
+def parse_size(text):
+    """Разбирает размер вида 10k, 1m, 10m или 2500."""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def _review_pool(rng, size=2000):
+    lengths = rng.integers(3, 30, size)
+    return np.array([" ".join(rng.choice(_WORDS, length)) for length in lengths], dtype=object)
+
+
+def iter_reviews(rows, chunk_size, seed=0):
+    """
+    Генерирует синтетические отзывы порциями DataFrame со столбцами ETLManager.column_mapping.
+
+    Набор воспроизводим: при тех же rows, chunk_size и seed порции совпадают.
+    """
+    reviews = _review_pool(np.random.default_rng(seed))
+    authors = np.array(_AUTHORS, dtype=object)
+    products = np.array(_PRODUCTS, dtype=object)
+    start = pd.Timestamp("2024-01-01")
+    for number, offset in enumerate(range(0, rows, chunk_size)):
+        size = min(chunk_size, rows - offset)
+        rng = np.random.default_rng([seed, number])
+        yield pd.DataFrame({
+            "автор": authors[rng.integers(0, len(authors), size)],
+            "дата": (start + pd.to_timedelta(rng.integers(0, 365 * 86400, size), unit="s")).astype("datetime64[ns]"),
+            "отзыв": reviews[rng.integers(0, len(reviews), size)],
+            "продукт": products[rng.integers(0, len(products), size)],
+            "артикул": rng.integers(10 ** 6, 10 ** 8, size),
+        })
+
+
+def make_databases(config, pg_source=None, ch_source=None):
+    """Создает PostgresDatabase и ClickHouseDatabase: подключенные (live) или поверх заменителей (fake)."""
+    from ClickHouseDatabase import ClickHouseDatabase
+    from PostgresDatabase import PostgresDatabase
+
+    pg = PostgresDatabase(os.environ.get("PGHOST", "localhost"), os.environ.get("PGDATABASE", "test_etl"),
+                          os.environ.get("PGUSER", "postgres"), os.environ.get("PGPASSWORD", "1234"))
+    ch = ClickHouseDatabase(os.environ.get("CLICKHOUSE_HOST", "localhost"),
+                            int(os.environ.get("CLICKHOUSE_PORT", "8123")),
+                            os.environ.get("CLICKHOUSE_USER", "default"),
+                            os.environ.get("CLICKHOUSE_PASSWORD", ""), schema=CH_SCHEMA)
+    if config["backend"] == "live":
+        pg.connect()
+        ch.connect()
+        if pg.conn is None or ch.client is None:
+            raise ConnectionError("Не удалось подключиться к PostgreSQL или ClickHouse.")
+    else:
+        from standins import StandInClickHouseClient, StandInPostgresConnection
+        pg.conn = StandInPostgresConnection(pg_source)
+        ch.client = StandInClickHouseClient(ch_source)
+    return pg, ch
+
+
+def seed_sources(config, rows):
+    """Заполняет исходные таблицы в режиме live (для путей переноса между базами)."""
+    logging.disable(logging.INFO)
+    pg, ch = make_databases(config)
+    try:
+        chunks = iter_reviews(rows, config["chunk_size"])
+        first = next(chunks)
+        pg.create_table(PG_SOURCE_TABLE, first, config["copy_format"])
+        pg.load_chunks_to_db(iter([first, *chunks]), PG_SOURCE_TABLE, config["copy_format"])
+
+        chunks = (df.rename(columns=COLUMN_MAPPING) for df in iter_reviews(rows, config["chunk_size"]))
+        first = next(chunks)
+        ch.client.command(f"DROP TABLE IF EXISTS {CH_SCHEMA}.{CH_SOURCE_TABLE}")
+        ch.create_table(CH_SOURCE_TABLE, first)
+        for df in [first, *chunks]:
+            ch.client.insert_df(f"{CH_SCHEMA}.{CH_SOURCE_TABLE}", df)
+    finally:
+        pg.disconnect()
+        ch.disconnect()
+
+
+def run_case(config, path, rows):
+    """Выполняет один путь ETL и возвращает сводку его TransferMetrics."""
+    logging.disable(logging.INFO)
+    from metrics import peak_rss_mb
+
+    chunk_size = config["chunk_size"]
+    pg_source = lambda: iter_reviews(rows, chunk_size)  # noqa: E731
+    ch_source = lambda: (df.rename(columns=COLUMN_MAPPING) for df in iter_reviews(rows, 65_505))  # noqa: E731
+    pg, ch = make_databases(config, pg_source, ch_source)
+    ch_table = f"{CH_SCHEMA}.{CH_SOURCE_TABLE}"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Подготовка входа не входит в замер
+        if path == "process_data":
+            source = os.path.join(tmpdir, "reviews.csv")
+            for number, df in enumerate(iter_reviews(rows, chunk_size)):
+                df.to_csv(source, mode="a", header=number == 0, index=False)
+        elif path == "load_data_to_db":
+            source = pd.concat(iter_reviews(rows, chunk_size), ignore_index=True)
+            pg.create_table("bench_load", source, config["copy_format"])
+        rss_before = peak_rss_mb()
+
+        try:
+            if path == "process_data":
+                metrics = pg.process_data(source, COLUMN_MAPPING, table_name="bench_process",
+                                          copy_format=config["copy_format"], chunk_size=chunk_size)
+            elif path == "load_data_to_db":
+                metrics = pg.load_data_to_db(source, "bench_load", config["copy_format"])
+            elif path == "transfer_from_postgres":
+                metrics = ch.transfer_from_postgres(pg, PG_SOURCE_TABLE, "bench_from_pg", COLUMN_MAPPING,
+                                                    chunk_size=chunk_size)
+            elif path == "transfer_from_clickhouse":
+                metrics = pg.transfer_from_clickhouse(ch, ch_table, "bench_from_ch", COLUMN_MAPPING,
+                                                      copy_format=config["copy_format"])
+            else:
+                metrics = ch.transfer_to_postgres(pg, CH_SOURCE_TABLE, "bench_to_pg", COLUMN_MAPPING)
+        finally:
+            pg.disconnect()
+            ch.disconnect()
+
+    data = metrics.as_dict()
+    chunk_seconds = sorted(chunk["seconds"] for chunk in data.pop("chunks") if chunk["seconds"] is not None)
+    data.update(
+        path=path,
+        expected_rows=rows,
+        rss_before_mb=rss_before,
+        chunk_count=len(chunk_seconds),
+        chunk_seconds_p50=float(np.percentile(chunk_seconds, 50)) if chunk_seconds else None,
+        chunk_seconds_p95=float(np.percentile(chunk_seconds, 95)) if chunk_seconds else None,
+        chunk_seconds_max=chunk_seconds[-1] if chunk_seconds else None,
+    )
+    return data
+
+
+def run_isolated(func, *args):
+    """Выполняет функцию в новом процессе, чтобы пиковый RSS относился только к ней."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def compare(results, baseline_path, threshold):
+    """Печатает изменение времени относительно прошлого прогона; возвращает число регрессий."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {(item["path"], item["expected_rows"]): item for item in json.load(file)["results"]}
+    regressions = 0
+    for item in results:
+        previous = baseline.get((item["path"], item["expected_rows"]))
+        if not previous or not previous["seconds"] or item["status"] != "ok":
+            continue
+        ratio = item["seconds"] / previous["seconds"]
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions += 1
+            mark = "  РЕГРЕССИЯ"
+        print(f"{item['path']:26s} {item['expected_rows']:>11,d}  {previous['seconds']:8.2f}s -> "
+              f"{item['seconds']:8.2f}s  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("fake", "live"), default="fake")
+    parser.add_argument("--sizes", default="10k", help="размеры наборов через запятую: 10k,1m,10m")
+    parser.add_argument("--paths", default=",".join(PATHS), help="пути ETL через запятую")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--copy-format", choices=("csv", "binary"), default="csv")
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/etl_<время>.json)")
+    parser.add_argument("--baseline", help="результаты прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое замедление (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"неизвестные пути: {', '.join(sorted(unknown))}")
+    config = {"backend": args.backend, "chunk_size": args.chunk_size, "copy_format": args.copy_format}
+
+    results = []
+    for rows in map(parse_size, args.sizes.split(",")):
+        if args.backend == "live" and set(paths) - {"process_data", "load_data_to_db"}:
+            run_isolated(seed_sources, config, rows)
+        for path in paths:
+            data = run_isolated(run_case, config, path, rows)
+            results.append(data)
+            print(f"{path:26s} {rows:>11,d} строк  {data['status']:5s} {data['seconds']:8.2f}s  "
+                  f"{data['rows_per_second']:>12,.0f} строк/с  {data['bytes_per_second'] / 2 ** 20:8.1f} МиБ/с  "
+                  f"пик RSS {data['peak_rss_mb'] or 0:8.1f} МиБ")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"etl_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2, default=str)
+    print(f"Результаты сохранены в {output}")
+
+    failed = [item for item in results if item["status"] != "ok"]
+    regressions = compare(results, args.baseline, args.threshold) if args.baseline else 0
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
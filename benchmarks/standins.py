@@ -0,0 +1,152 @@
+"""
+Заменители серверов PostgreSQL и ClickHouse для бенчмарков, работающие в памяти процесса.
+
+Заменители принимают те же вызовы, что psycopg2 и clickhouse_connect, но
+данные не хранят: COPY и insert_df дочитывают поток до конца и считают байты,
+а запросы к исходной таблице отдают синтетический набор данных. Поэтому
+замер отражает только клиентскую часть (чтение порций, построение DataFrame,
+переименование, сериализацию), без времени работы сервера и сети.
+"""
+import contextlib
+import itertools
+import re
+
+from binary_copy import (BOOL_OID, DATE_OID, FLOAT4_OID, FLOAT8_OID, INT2_OID, INT4_OID, INT8_OID, TEXT_OID,
+                         TIMESTAMP_OID, TIMESTAMPTZ_OID, VARCHAR_OID)
+
+# Типы, которые create_table пишет в CREATE TABLE, и их OID
+_PG_TYPE_OIDS = {
+    "bigint": INT8_OID, "int": INT4_OID, "integer": INT4_OID, "smallint": INT2_OID,
+    "double precision": FLOAT8_OID, "real": FLOAT4_OID, "decimal": 1700, "boolean": BOOL_OID,
+    "varchar": VARCHAR_OID, "text": TEXT_OID, "date": DATE_OID, "timestamp": TIMESTAMP_OID,
+    "timestamptz": TIMESTAMPTZ_OID,
+}
+
+_CREATE_RE = re.compile(r"CREATE TABLE (?:IF NOT EXISTS )?(\S+) \((.*)\)", re.S)
+_SELECT_RE = re.compile(r"SELECT \* FROM (\S+?);?\s*$", re.S)
+
+
+class StandInPostgresCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.itersize = 2000
+        self._rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = query.strip()
+        create = _CREATE_RE.match(query)
+        if create:
+            columns = [column.strip().split(" ", 1) for column in create.group(2).split(",")]
+            self.conn.tables[create.group(1)] = [(name, _PG_TYPE_OIDS.get(sql_type, TEXT_OID))
+                                                 for name, sql_type in columns]
+            return
+        if query.endswith("LIMIT 0;"):
+            table = query.split()[3]
+            self.description = [(name, oid) for name, oid in self.conn.tables.get(table, [])]
+            return
+        select = _SELECT_RE.match(query)
+        if select and self.conn.source is not None:
+            chunks = self.conn.source()
+            first = next(chunks)
+            self.description = [(column, None) for column in first.columns]
+            self._rows = itertools.chain.from_iterable(
+                df.itertuples(index=False, name=None) for df in itertools.chain([first], chunks))
+
+    def __iter__(self):
+        # Именованный курсор psycopg2 отдает строки итерацией (пачками по itersize)
+        while True:
+            rows = self.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+    def fetchmany(self, size):
+        return list(itertools.islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def copy_expert(self, sql, file, size=65536):
+        while True:
+            data = file.read(size)
+            if not data:
+                break
+            self.conn.copied_bytes += len(data)
+
+
+class StandInPostgresConnection:
+    """
+    Соединение psycopg2 в памяти.
+
+    :param source: функция без аргументов, возвращающая итератор порций DataFrame;
+                   ее строки отдаются на любой запрос SELECT * FROM таблица
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.tables = {}
+        self.copied_bytes = 0
+        self.closed = 0
+
+    def cursor(self, name=None):
+        return StandInPostgresCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class _StandInSummary:
+    def __init__(self, nbytes):
+        self._bytes = nbytes
+
+    def written_bytes(self):
+        return self._bytes
+
+
+class StandInClickHouseClient:
+    """
+    Клиент clickhouse_connect в памяти.
+
+    :param source: функция без аргументов, возвращающая итератор порций DataFrame;
+                   порции отдаются на query_df_stream как блоки результата
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.inserted_rows = 0
+
+    def command(self, query):
+        return 1
+
+    def ping(self):
+        return True
+
+    def insert_df(self, table, df):
+        self.inserted_rows += len(df)
+        return _StandInSummary(int(df.memory_usage(deep=False).sum()))
+
+    @contextlib.contextmanager
+    def query_df_stream(self, query, parameters=None, **kwargs):
+        yield self.source()
+
+    def query_df(self, query, **kwargs):
+        return next(self.source()).iloc[:0]
+
+    def close(self):
+        pass
@@ -1,14 +1,20 @@
 import time
 import logging
+import threading
 from functools import wraps
 
-def retry(retries=3, delay=5, logger=None):
+def retry(retries=3, delay=5, logger=None, on_complete=None):
     """
     Декоратор для автоматической реконнекции при возникновении ошибки.
-    
+
     :param retries: максимальное количество попыток выполнения функции
     :param delay: задержка между попытками в секундах
     :param logger: логгер для вывода сообщений, если None, создается стандартный логгер
+    :param on_complete: функция, которой после каждого вызова передается статистика
+                        попыток {"attempts", "backoff_seconds", "succeeded"}
+
+    Обернутая функция хранит накопленную статистику в атрибуте stats:
+    количество вызовов, попыток, повторов, неудач и время, потерянное на ожидание.
     """
     if logger is None:
         # Создаём стандартный логгер, если он не передан
@@ -19,22 +25,43 @@ def retry(retries=3, delay=5, logger=None):
         logger.addHandler(handler)
 
     def decorator(func):
+        stats_lock = threading.Lock()
+
+        def report(attempts, backoff, succeeded):
+            with stats_lock:
+                wrapper.stats["calls"] += 1
+                wrapper.stats["attempts"] += attempts
+                wrapper.stats["retries"] += attempts - 1
+                wrapper.stats["failures"] += 0 if succeeded else 1
+                wrapper.stats["backoff_seconds"] += backoff
+            if attempts > 1:
+                logger.info(f"Функция {func.__name__}: попыток {attempts}, ожидание между попытками {backoff:.1f} с.")
+            if on_complete is not None:
+                on_complete({"attempts": attempts, "backoff_seconds": backoff, "succeeded": succeeded})
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             attempts = 0
+            backoff = 0.0
             while attempts < retries:
                 try:
                     result = func(*args, **kwargs)
                     logger.info(f"Вызов функции {func.__name__} прошел успешно.")
+                    report(attempts + 1, backoff, True)
                     return result  # Возвращаем результат только при успешном выполнении
                 except Exception as e:
                     attempts += 1
                     logger.error(f"Ошибка в функции {func.__name__}: {e}")
                     if attempts < retries:
                         logger.info(f"Попытка {attempts}/{retries} не удалась. Повтор через {delay} секунд...")
+                        started = time.perf_counter()
                         time.sleep(delay)
+                        backoff += time.perf_counter() - started
                     else:
                         logger.error(f"Превышено максимальное количество попыток для функции {func.__name__}.")
+                        report(attempts, backoff, False)
                         raise  # Пробрасываем исключение после исчерпания всех попыток
+
+        wrapper.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "backoff_seconds": 0.0}
         return wrapper
     return decorator
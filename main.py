@@ -1,7 +1,17 @@
+import argparse
+import sys
+
 from ETLManager import ETLManager
+from JobRunner import main as run_jobs
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL между PostgreSQL и ClickHouse.")
+    parser.add_argument("--jobs", help="файл спецификации заданий; без него запускается интерактивное меню")
+    args, rest = parser.parse_known_args()
+
+    if args.jobs:
+        sys.exit(run_jobs([args.jobs, *rest]))
+
     etl_manager = ETLManager()
     etl_manager.run()
-
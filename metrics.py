@@ -0,0 +1,269 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: модуль resource недоступен
+    resource = None
+
+
+def peak_rss_mb():
+    """Возвращает пиковый RSS процесса в МиБ или None, если платформа не поддерживает замер."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+class TransferMetrics:
+    """
+    Метрики одного вызова переноса или загрузки.
+
+    Собирает время по фазам (чтение источника, построение DataFrame,
+    сериализация, запись в приемник и т.д.), количество строк и байт,
+    статистику по каждой порции с пиковым RSS и статистику повторных попыток.
+    Байты - объем данных без сжатия (тело COPY, размер вставки в ClickHouse),
+    а не размер запросов по сети: сжатие транспорта в них не отражается.
+    """
+
+    def __init__(self, operation, source=None, target=None):
+        self.operation = operation
+        self.source = source
+        self.target = target
+        self.status = "ok"
+        self.error = None
+        self.rows = 0
+        self.bytes = 0
+        self.phases = {}
+        self.chunks = []
+        self.retries = {"attempts": 0, "retries": 0, "backoff_seconds": 0.0}
+        self.quarantined = 0
+        self.settings = {}
+        self.started_at = time.time()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Контекстный менеджер: добавляет время выполнения блока к фазе name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - started)
+
+    def add_phase_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def timed_iter(self, iterable, name):
+        """Оборачивает итератор: время получения каждого элемента добавляется к фазе name."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase_time(name, time.perf_counter() - started)
+                return
+            self.add_phase_time(name, time.perf_counter() - started)
+            yield item
+
+    def record_chunk(self, rows, nbytes=0, seconds=None):
+        """Учитывает загруженную порцию: строки, байты, время и пиковый RSS на момент загрузки."""
+        with self._lock:
+            self.rows += rows
+            self.bytes += nbytes
+            self.chunks.append({
+                "chunk": len(self.chunks) + 1,
+                "rows": rows,
+                "bytes": nbytes,
+                "seconds": seconds,
+                "peak_rss_mb": peak_rss_mb(),
+            })
+
+    def record_retry(self, stats):
+        """Учитывает статистику повторных попыток одного вызова (см. decorators.retry)."""
+        with self._lock:
+            self.retries["attempts"] += stats["attempts"]
+            self.retries["retries"] += stats["attempts"] - 1
+            self.retries["backoff_seconds"] += stats["backoff_seconds"]
+
+    def record_quarantine(self, rows):
+        """Учитывает строки, отклоненные проверкой и записанные в карантин (см. validation)."""
+        with self._lock:
+            self.quarantined += rows
+
+    def merge(self, data):
+        """Добавляет строки, байты, фазы, повторы и настройки из метрик другого вызова (словарь as_dict)."""
+        with self._lock:
+            self.rows += data["rows"]
+            self.bytes += data["bytes"]
+            self.quarantined += data["quarantined"]
+            for name, seconds in data["phases"].items():
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+            for key in self.retries:
+                self.retries[key] += data["retries"][key]
+            self.settings.update(data["settings"])
+            self.chunks.extend(data["chunks"])
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = str(error)
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    @property
+    def elapsed(self):
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def finish(self):
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+            self.finished_at = time.time()
+        return self
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "source": self.source,
+            "target": self.target,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": self.elapsed,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "quarantined": self.quarantined,
+            "rows_per_second": self.rows_per_second,
+            "bytes_per_second": self.bytes_per_second,
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": dict(self.phases),
+            "retries": dict(self.retries),
+            "settings": dict(self.settings),
+            "chunks": list(self.chunks),
+        }
+
+    def summary(self):
+        """Краткая строка для лога."""
+        phases = ", ".join(f"{name} {seconds:.2f} с" for name, seconds in self.phases.items())
+        quarantined = f", в карантине {self.quarantined}" if self.quarantined else ""
+        return (f"{self.operation} [{self.status}]: {self.rows} строк{quarantined}, "
+                f"{self.bytes / 2 ** 20:.1f} МиБ без сжатия за {self.elapsed:.2f} с ({self.rows_per_second:.0f} строк/с); фазы: {phases or '-'}")
+
+
+class MetricsExporter:
+    """
+    Запись метрик в локальный файл.
+
+    format="jsonl" - каждая операция дописывается отдельной строкой JSON.
+    format="prometheus" - файл перезаписывается в текстовом формате Prometheus
+    (для textfile collector node_exporter) с последними значениями по каждой
+    паре операция/приемник.
+    """
+
+    def __init__(self, path, format="jsonl"):
+        if format not in ("jsonl", "prometheus"):
+            raise ValueError(f"Неизвестный формат метрик: {format}")
+        self.path = path
+        self.format = format
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Экспортер передается в процессы-исполнители вместе с объектом базы, блокировка не сериализуется
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def export(self, metrics):
+        with self._lock:
+            if self.format == "jsonl":
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(metrics.as_dict(), ensure_ascii=False, default=str) + "\n")
+                return
+            self._latest[(metrics.operation, metrics.target)] = metrics.as_dict()
+            self._write_prometheus()
+
+    @staticmethod
+    def _labels(**labels):
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items() if value is not None) + "}"
+
+    def _write_prometheus(self):
+        lines = []
+        gauges = (("seconds", "etl_transfer_seconds"), ("rows", "etl_transfer_rows"),
+                  ("bytes", "etl_transfer_bytes"), ("rows_per_second", "etl_transfer_rows_per_second"),
+                  ("bytes_per_second", "etl_transfer_bytes_per_second"), ("peak_rss_mb", "etl_transfer_peak_rss_mb"),
+                  ("quarantined", "etl_transfer_quarantined_rows"))
+        for key, name in gauges:
+            lines.append(f"# TYPE {name} gauge")
+            for data in self._latest.values():
+                if data[key] is not None:
+                    labels = self._labels(operation=data["operation"], target=data["target"])
+                    lines.append(f"{name}{labels} {data[key]}")
+        lines.append("# TYPE etl_transfer_success gauge")
+        for data in self._latest.values():
+            labels = self._labels(operation=data["operation"], target=data["target"])
+            lines.append(f"etl_transfer_success{labels} {int(data['status'] == 'ok')}")
+        lines.append("# TYPE etl_transfer_phase_seconds gauge")
+        for data in self._latest.values():
+            for phase, seconds in data["phases"].items():
+                labels = self._labels(operation=data["operation"], target=data["target"], phase=phase)
+                lines.append(f"etl_transfer_phase_seconds{labels} {seconds}")
+        for key in ("retries", "backoff_seconds"):
+            lines.append(f"# TYPE etl_transfer_{key} gauge")
+            for data in self._latest.values():
+                labels = self._labels(operation=data["operation"], target=data["target"])
+                lines.append(f"etl_transfer_{key}{labels} {data['retries'][key]}")
+
+        # Атомарная замена файла, чтобы сборщик не прочитал его наполовину записанным
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.path)
+
+
+@contextmanager
+def track_transfer(metrics, operation, source=None, target=None, exporter=None, logger=None):
+    """
+    Выдает объект метрик для вызова.
+
+    Если metrics передан (вложенный вызов), используется он. Иначе создается
+    новый объект; по выходе он завершается, пишется в лог и экспортируется.
+    """
+    if metrics is not None:
+        yield metrics
+        return
+    metrics = TransferMetrics(operation, source, target)
+    try:
+        yield metrics
+    finally:
+        metrics.finish()
+        if logger:
+            logger.info(metrics.summary())
+        if exporter:
+            exporter.export(metrics)
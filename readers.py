@@ -0,0 +1,89 @@
+import os
+
+import openpyxl
+import pandas as pd
+
+
+def _rows_to_frame(rows, header):
+    return pd.DataFrame.from_records(rows, columns=header)
+
+
+def _iter_sheet_chunks(worksheet, chunk_size):
+    """Читает лист построчно и отдает порции DataFrame; первая непустая строка - заголовок."""
+    header = None
+    rows = []
+    yielded = False
+    for row in worksheet.iter_rows(values_only=True):
+        if all(value is None for value in row):
+            continue
+        if header is None:
+            header = [str(value) if value is not None else f"column_{index}" for index, value in enumerate(row)]
+            continue
+        # В режиме read_only строка может быть короче заголовка, если последние ячейки пусты
+        rows.append(tuple(row[:len(header)]) + (None,) * (len(header) - len(row)))
+        if len(rows) >= chunk_size:
+            yield _rows_to_frame(rows, header)
+            yielded = True
+            rows = []
+    if header is None:
+        return
+    if rows or not yielded:
+        # Лист только с заголовком дает пустую порцию, чтобы таблица все равно была создана
+        yield _rows_to_frame(rows, header)
+
+
+def iter_xlsx_sheets(path, chunk_size, sheets=None):
+    """
+    Потоково читает книгу Excel: отдает тройки (имя листа, итератор порций DataFrame, число листов).
+
+    Книга открывается в режиме read_only, поэтому строки читаются по мере
+    обхода и в памяти находится не больше chunk_size строк. Итератор порций
+    листа нужно дочитать до перехода к следующему листу.
+
+    :param path: путь к файлу xlsx
+    :param chunk_size: количество строк в порции
+    :param sheets: список имен листов для чтения (по умолчанию все листы)
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet_names = sheets or workbook.sheetnames
+        for sheet_name in sheet_names:
+            yield sheet_name, _iter_sheet_chunks(workbook[sheet_name], chunk_size), len(sheet_names)
+    finally:
+        workbook.close()
+
+
+def iter_csv_chunks(path, chunk_size):
+    """Потоково читает CSV-файл порциями DataFrame."""
+    with pd.read_csv(path, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def iter_file_sheets(path, chunk_size, sheets=None):
+    """Отдает тройки (имя листа, итератор порций, число листов) для xlsx и CSV; у CSV один лист без имени."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        yield "", iter_csv_chunks(path, chunk_size), 1
+    else:
+        yield from iter_xlsx_sheets(path, chunk_size, sheets)
+
+
+def conform_chunk(df, dtypes):
+    """
+    Приводит типы порции к типам первой порции, по которой создана таблица.
+
+    Pandas выводит типы для каждой порции отдельно: целочисленный столбец
+    с пропусками становится float, и COPY в int-столбец не пройдет.
+    Такие столбцы переводятся в nullable Int64; неприводимые значения
+    вызывают ошибку, а не теряются молча.
+    """
+    for column, dtype in dtypes.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if dtype.kind in "iu":
+            df[column] = pd.to_numeric(df[column]).astype("Int64")
+        elif dtype.kind == "f":
+            df[column] = pd.to_numeric(df[column])
+        elif dtype.kind == "M":
+            df[column] = pd.to_datetime(df[column])
+    return df
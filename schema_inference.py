@@ -0,0 +1,163 @@
+import datetime
+
+import pandas as pd
+
+# Целочисленные типы ClickHouse от самого узкого к самому широкому
+_INT_TYPES = [
+    ("UInt8", 0, 2 ** 8 - 1),
+    ("Int8", -2 ** 7, 2 ** 7 - 1),
+    ("UInt16", 0, 2 ** 16 - 1),
+    ("Int16", -2 ** 15, 2 ** 15 - 1),
+    ("UInt32", 0, 2 ** 32 - 1),
+    ("Int32", -2 ** 31, 2 ** 31 - 1),
+    ("UInt64", 0, 2 ** 64 - 1),
+    ("Int64", -2 ** 63, 2 ** 63 - 1),
+]
+
+# Объявленные типы PostgreSQL, задающие ширину целого, когда выборка неполная
+_POSTGRES_INT_TYPES = {"smallint": "Int16", "integer": "Int32", "bigint": "Int64"}
+
+# Диапазоны типов Date и DateTime ClickHouse
+_DATE_MIN, _DATE_MAX = pd.Timestamp("1970-01-01"), pd.Timestamp("2149-06-06")
+_DATETIME_MIN, _DATETIME_MAX = pd.Timestamp("1970-01-01"), pd.Timestamp("2106-02-07")
+
+_DATE_TYPES = ("Date", "DateTime", "DateTime64")
+
+
+def _narrowest_int(low, high):
+    for name, type_min, type_max in _INT_TYPES:
+        if type_min <= low and high <= type_max:
+            return name
+    return "Int64"
+
+
+def _int_type(values, exact, source_type):
+    if not exact:
+        # По неполной выборке ширину не сужаем: ее задает объявленный тип источника или dtype
+        return _POSTGRES_INT_TYPES.get(source_type) or f"Int{values.dtype.itemsize * 8}"
+    if values.empty:
+        return "Int64"
+    return _narrowest_int(int(values.min()), int(values.max()))
+
+
+def _datetime_type(values, exact):
+    if getattr(values.dt, "tz", None) is not None:
+        return "DateTime64(6, 'UTC')"
+    if not exact or values.empty:
+        return "DateTime64(6)"
+    low, high = values.min(), values.max()
+    if (values == values.dt.normalize()).all() and _DATE_MIN <= low and high <= _DATE_MAX:
+        return "Date"
+    if (values.dt.microsecond == 0).all() and (values.dt.nanosecond == 0).all() \
+            and _DATETIME_MIN <= low and high <= _DATETIME_MAX:
+        return "DateTime"
+    return "DateTime64(6)"
+
+
+def _object_type(values, low_cardinality_ratio, low_cardinality_max):
+    if values.empty:
+        return "String"
+    first = values.iloc[0]
+    if isinstance(first, datetime.date) and not isinstance(first, datetime.datetime):
+        if values.map(lambda value: type(value) is datetime.date).all():
+            return "Date"
+    if not values.map(lambda value: isinstance(value, str)).all():
+        return "String"
+    distinct = values.nunique()
+    if distinct <= low_cardinality_max and distinct <= len(values) * low_cardinality_ratio:
+        return "LowCardinality(String)"
+    return "String"
+
+
+def _wrap_nullable(base_type):
+    if base_type.startswith("LowCardinality("):
+        return f"LowCardinality(Nullable({base_type[len('LowCardinality('):-1]}))"
+    return f"Nullable({base_type})"
+
+
+def infer_column_type(series, exact=True, source=None, low_cardinality_ratio=0.2, low_cardinality_max=10_000):
+    """
+    Подбирает компактный тип ClickHouse для столбца по выборке значений.
+
+    :param series: выборка значений столбца
+    :param exact: True, если выборка содержит все данные; иначе ширина целых
+                  и точность дат не сужаются, а Nullable снимается, только если
+                  источник объявил столбец NOT NULL
+    :param source: сведения о столбце источника: {"data_type": ..., "nullable": ...}
+    """
+    source = source or {}
+    values = series.dropna()
+    has_nulls = len(values) != len(series)
+    if exact:
+        nullable = has_nulls
+    else:
+        nullable = has_nulls or source.get("nullable", True)
+
+    kind = series.dtype.kind
+    if kind == "b":
+        base_type = "Bool"
+    elif kind in "iu":
+        base_type = _int_type(values, exact, source.get("data_type"))
+    elif kind == "f" and source.get("data_type") in _POSTGRES_INT_TYPES and (values % 1 == 0).all():
+        # Целый столбец с NULL приходит из psycopg2 в pandas как float64 - возвращаем объявленный целый тип
+        base_type = _int_type(values, exact, source["data_type"])
+    elif kind == "f":
+        base_type = "Float32" if series.dtype.itemsize == 4 else "Float64"
+    elif kind == "M":
+        base_type = _datetime_type(values, exact)
+    else:
+        base_type = _object_type(values, low_cardinality_ratio, low_cardinality_max)
+    return _wrap_nullable(base_type) if nullable else base_type
+
+
+def infer_order_by(sample, column_types, max_columns=3):
+    """
+    Подбирает ключ сортировки: LowCardinality-столбцы без NULL по возрастанию
+    числа различных значений, затем первый столбец даты без NULL.
+    """
+    low_cardinality = [column for column, column_type in column_types
+                       if column_type == "LowCardinality(String)"]
+    low_cardinality.sort(key=lambda column: sample[column].nunique())
+    order_by = low_cardinality[:max_columns]
+    dates = [column for column, column_type in column_types if column_type.startswith(_DATE_TYPES)]
+    if dates:
+        order_by.append(dates[0])
+    return order_by
+
+
+def infer_partition_by(column_types):
+    """Подбирает помесячное партиционирование по первому столбцу даты без NULL."""
+    for column, column_type in column_types:
+        if column_type.startswith(_DATE_TYPES):
+            return f"toYYYYMM({column})"
+    return None
+
+
+def infer_clickhouse_schema(df, exact=True, source_columns=None, order_by="auto", partition_by=None,
+                            sample_size=100_000):
+    """
+    Выводит компактную схему таблицы ClickHouse по DataFrame.
+
+    :param df: данные или первая порция потока
+    :param exact: True, если df содержит все данные
+    :param source_columns: сведения о столбцах источника (см. infer_column_type)
+    :param order_by: "auto" - подобрать, None - tuple(), иначе список столбцов или выражение
+    :param partition_by: "auto" - подобрать, None - без партиционирования, иначе выражение
+    :param sample_size: максимальный размер случайной выборки строк
+    :return: словарь {"columns": [[имя, тип], ...], "order_by": [...], "partition_by": ...}
+    """
+    sample = df
+    if len(df) > sample_size:
+        sample = df.sample(sample_size, random_state=0)
+        exact = False
+    source_columns = source_columns or {}
+    column_types = [[column, infer_column_type(sample[column], exact, source_columns.get(column))]
+                    for column in df.columns]
+
+    if order_by == "auto":
+        order_by = infer_order_by(sample, column_types)
+    elif isinstance(order_by, str):
+        order_by = [order_by]
+    if partition_by == "auto":
+        partition_by = infer_partition_by(column_types)
+    return {"columns": column_types, "order_by": list(order_by or []), "partition_by": partition_by}
@@ -0,0 +1,98 @@
+import io
+import queue
+import threading
+
+
+class _Done:
+    """Маркер окончания потока с возможной ошибкой источника."""
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+def prefetch(iterable, maxsize=2):
+    """
+    Читает элементы итератора в фоновом потоке и отдает их через ограниченную очередь.
+
+    Позволяет совместить чтение из источника с записью в приемник: пока
+    потребитель обрабатывает текущую порцию, следующая уже загружается.
+    Очередь ограничена maxsize, поэтому в памяти находится не больше
+    maxsize + 1 порций. Исключение источника пробрасывается потребителю.
+
+    :param iterable: исходный итератор (например, поток блоков из ClickHouse)
+    :param maxsize: максимальное количество заранее прочитанных элементов
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as error:
+            put(_Done(error))
+            return
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        put(_Done())
+
+    thread = threading.Thread(target=producer, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        # Потребитель завершился (или упал) - останавливаем чтение источника
+        stop.set()
+        thread.join()
+
+
+class IteratorReader(io.RawIOBase):
+    """
+    Файлоподобный объект поверх итератора байтовых порций.
+
+    Нужен для copy_expert: COPY читает данные через read(), а порции
+    кодируются лениво по мере чтения, без промежуточного файла на диске.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Буфер заполняется из нескольких порций: read(n) возвращает n байт, пока поток не закончился
+        written = 0
+        while written < len(buffer):
+            if self._offset >= len(self._current):
+                try:
+                    self._current = next(self._chunks)
+                except StopIteration:
+                    break
+                self._offset = 0
+                continue
+            size = min(len(buffer) - written, len(self._current) - self._offset)
+            buffer[written:written + size] = self._current[self._offset:self._offset + size]
+            self._offset += size
+            written += size
+        return written
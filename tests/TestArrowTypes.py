@@ -0,0 +1,44 @@
+import unittest as ut
+
+import pyarrow as pa
+
+from arrow_types import (arrow_type_for_postgres_oid, clickhouse_column_types, postgres_column_types,
+                         rename_arrow_columns)
+from binary_copy import INT4_OID, TIMESTAMPTZ_OID
+
+
+class TestArrowTypes(ut.TestCase):
+    def setUp(self):
+        self.schema = pa.schema([
+            pa.field("id", pa.int64(), nullable=False),
+            pa.field("price", pa.float64()),
+            pa.field("review", pa.string()),
+            pa.field("created", pa.timestamp("us", tz="UTC")),
+            pa.field("day", pa.date32()),
+        ])
+
+    def test_clickhouse_types_follow_schema(self):
+        self.assertEqual(clickhouse_column_types(self.schema), [
+            ("id", "Int64"),
+            ("price", "Nullable(Float64)"),
+            ("review", "Nullable(String)"),
+            ("created", "Nullable(DateTime64(6, 'UTC'))"),
+            ("day", "Nullable(Date32)"),
+        ])
+
+    def test_postgres_types_follow_schema(self):
+        self.assertEqual([pg_type for _, pg_type in postgres_column_types(self.schema)],
+                         ["bigint", "double precision", "text", "timestamptz", "date"])
+
+    def test_postgres_oids_map_to_arrow(self):
+        self.assertEqual(arrow_type_for_postgres_oid(INT4_OID), pa.int32())
+        self.assertEqual(arrow_type_for_postgres_oid(TIMESTAMPTZ_OID), pa.timestamp("us", tz="UTC"))
+        self.assertEqual(arrow_type_for_postgres_oid(1700), pa.string())  # numeric читается строкой
+
+    def test_rename_keeps_unmapped_columns(self):
+        table = pa.table({"автор": ["a"], "id": [1]})
+        self.assertEqual(rename_arrow_columns(table, {"автор": "author"}).column_names, ["author", "id"])
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import unittest as ut
+
+from AsyncTransfer import AsyncTransfer
+
+
+def slow_source(count, delay):
+    for number in range(count):
+        time.sleep(delay)
+        yield [number]
+
+
+class TestAsyncTransfer(ut.TestCase):
+    def test_read_and_write_overlap(self):
+        written = []
+
+        def write(chunks):
+            for chunk in chunks:
+                time.sleep(0.05)
+                written.extend(chunk)
+            return len(written)
+
+        started = time.perf_counter()
+        result = asyncio.run(AsyncTransfer().run(slow_source(8, 0.05), write, transform=lambda chunk: chunk * 2))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(result, 16)
+        self.assertEqual(written[:4], [0, 0, 1, 1])
+        # Последовательно было бы 8 * (0.05 + 0.05) = 0.8 с
+        self.assertLess(elapsed, 0.65)
+
+    def test_source_error_reaches_writer(self):
+        def failing_source():
+            yield [1]
+            raise RuntimeError("обрыв соединения")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(AsyncTransfer().run(failing_source(), list))
+
+    def test_writer_error_stops_reading(self):
+        read = []
+
+        def source():
+            for number in range(1000):
+                read.append(number)
+                yield [number]
+
+        def write(chunks):
+            next(chunks)
+            raise ValueError("ошибка вставки")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(AsyncTransfer(queue_size=2).run(source(), write))
+        self.assertLess(len(read), 10)
+
+    def test_cancel_releases_waiting_writer(self):
+        written = []
+
+        def source():
+            yield [1]
+            time.sleep(0.5)
+
+        def write(chunks):
+            for chunk in chunks:
+                written.extend(chunk)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(AsyncTransfer().run(source(), write), timeout=0.2))
+        self.assertEqual(written, [1])
+
+
+if __name__ == "__main__":
+    ut.main()
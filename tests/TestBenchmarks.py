@@ -0,0 +1,26 @@
+import logging
+import os
+import sys
+import unittest as ut
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_etl  # noqa: E402
+
+
+class TestBenchmarks(ut.TestCase):
+    def tearDown(self):
+        # run_case отключает логирование INFO для замера
+        logging.disable(logging.NOTSET)
+
+    def test_stand_in_paths_run(self):
+        config = {"backend": "fake", "chunk_size": 1_000, "copy_format": "csv"}
+        for path in bench_etl.PATHS:
+            with self.subTest(path=path):
+                data = bench_etl.run_case(config, path, 2_500)
+                self.assertEqual(data["status"], "ok", data["error"])
+                self.assertEqual(data["rows"], 2_500)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,76 @@
+import struct
+import unittest as ut
+
+import numpy as np
+import pandas as pd
+
+from binary_copy import (BOOL_OID, DATE_OID, FLOAT8_OID, INT4_OID, INT8_OID, PGCOPY_HEADER, PGCOPY_TRAILER,
+                         TEXT_OID, TIMESTAMP_OID, UnsupportedBinaryType, encode_binary_copy)
+
+
+def decode_binary_copy(payload):
+    """Разбирает поток двоичного COPY в список строк из сырых байтов полей."""
+    assert payload.startswith(PGCOPY_HEADER)
+    assert payload.endswith(PGCOPY_TRAILER)
+    offset = len(PGCOPY_HEADER)
+    rows = []
+    while True:
+        (field_count,) = struct.unpack_from(">h", payload, offset)
+        offset += 2
+        if field_count == -1:
+            break
+        row = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from(">i", payload, offset)
+            offset += 4
+            if length == -1:
+                row.append(None)
+            else:
+                row.append(payload[offset:offset + length])
+                offset += length
+        rows.append(row)
+    return rows
+
+
+class TestBinaryCopy(ut.TestCase):
+    def test_fixed_width_columns(self):
+        df = pd.DataFrame({"id": [1, 2, 3], "price": [1.5, -2.0, 0.25], "flag": [True, False, True]})
+        rows = decode_binary_copy(encode_binary_copy(df, [INT8_OID, FLOAT8_OID, BOOL_OID]))
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([struct.unpack(">q", row[0])[0] for row in rows], [1, 2, 3])
+        self.assertEqual([struct.unpack(">d", row[1])[0] for row in rows], [1.5, -2.0, 0.25])
+        self.assertEqual([row[2] for row in rows], [b"\x01", b"\x00", b"\x01"])
+
+    def test_nulls_and_text(self):
+        df = pd.DataFrame({
+            "article": [10.0, np.nan, 30.0],
+            "review": ["хорошо", None, ""],
+        })
+        rows = decode_binary_copy(encode_binary_copy(df, [INT4_OID, TEXT_OID]))
+
+        self.assertEqual(rows[0], [struct.pack(">i", 10), "хорошо".encode("utf-8")])
+        self.assertEqual(rows[1], [None, None])
+        self.assertEqual(rows[2], [struct.pack(">i", 30), b""])
+
+    def test_dates_relative_to_postgres_epoch(self):
+        df = pd.DataFrame({
+            "ts": pd.to_datetime(["2000-01-01 00:00:01", None]),
+            "day": pd.to_datetime(["2000-01-03", "1999-12-31"]),
+        })
+        rows = decode_binary_copy(encode_binary_copy(df, [TIMESTAMP_OID, DATE_OID]))
+
+        self.assertEqual(rows[0], [struct.pack(">q", 1_000_000), struct.pack(">i", 2)])
+        self.assertEqual(rows[1], [None, struct.pack(">i", -1)])
+
+    def test_unsupported_values_raise(self):
+        with self.assertRaises(UnsupportedBinaryType):
+            encode_binary_copy(pd.DataFrame({"a": [1.5]}), [INT4_OID])
+        with self.assertRaises(UnsupportedBinaryType):
+            encode_binary_copy(pd.DataFrame({"a": [2 ** 40]}), [INT4_OID])
+        with self.assertRaises(UnsupportedBinaryType):
+            encode_binary_copy(pd.DataFrame({"a": [1]}), [1700])
+
+
+if __name__ == "__main__":
+    ut.main()
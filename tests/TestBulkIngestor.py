@@ -0,0 +1,116 @@
+import contextlib
+import os
+import tempfile
+import threading
+import unittest as ut
+
+from BulkIngestor import BulkIngestor
+from PostgresDatabase import PostgresDatabase
+
+
+class SessionDatabase:
+    """PostgresDatabase с пулом: запоминает порции, переданные в load_stream."""
+
+    clean_name = staticmethod(PostgresDatabase.clean_name)
+
+    def __init__(self):
+        self.pool = object()
+        self.loads = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def session(self):
+        yield self
+
+    def load_stream(self, chunks, table_name, column_mapping=None, copy_format="csv", transforms=None,
+                    quarantine=None):
+        frames = list(chunks)
+        if table_name.startswith("broken"):
+            return None
+        with self.lock:
+            self.loads[table_name] = frames
+        return sum(len(df) for df in frames)
+
+
+class UnreachableDatabase(SessionDatabase):
+    """База без пула, у которой пул не удается создать."""
+
+    def __init__(self):
+        super().__init__()
+        self.pool = None
+        self.clones = []
+
+    def clone(self, pool_size=None):
+        clone = UnreachableDatabase()
+        clone.pool_size = pool_size
+        self.clones.append(clone)
+        return clone
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+class TestBulkIngestor(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "source")
+        self.spool = os.path.join(self.tmpdir.name, "spool")
+        os.makedirs(self.source)
+        os.makedirs(self.spool)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.source, name), "w", encoding="utf-8") as file:
+            file.write(text)
+
+    def test_chunks_are_spooled_and_colliding_files_rejected(self):
+        self.write("Reviews.csv", "id,review\n" + "".join(f"{i},r{i}\n" for i in range(5)))
+        self.write("reviews.xlsx", "")
+        self.write("orders.csv", "id\n1\n")
+        db = SessionDatabase()
+        with self.assertLogs("BulkIngestor", "INFO") as logs:
+            reports = BulkIngestor(db, parse_workers=2, load_workers=2, chunk_size=2, spool_dir=self.spool) \
+                .ingest(self.source)
+        reports = {os.path.basename(report["file"]): report for report in reports}
+
+        self.assertEqual([len(df) for df in db.loads["reviews"]], [2, 2, 1])
+        self.assertEqual(reports["Reviews.csv"]["rows"], 5)
+        self.assertEqual(reports["orders.csv"]["tables"], ["orders"])
+        self.assertIn("Reviews.csv", reports["reviews.xlsx"]["error"])
+        self.assertIn("2 файлов успешно, 1 с ошибками", logs.output[-1])
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_parse_and_load_errors_are_reported_per_file(self):
+        self.write("reviews.csv", "id\n1\n2\n")
+        self.write("broken.csv", "id\n1\n")
+        self.write("garbled.xlsx", "это не книга Excel")
+        db = SessionDatabase()
+        with self.assertLogs("BulkIngestor", "INFO") as logs:
+            reports = BulkIngestor(db, parse_workers=2, load_workers=2, spool_dir=self.spool).ingest(self.source)
+        reports = {os.path.basename(report["file"]): report for report in reports}
+
+        self.assertIsNone(reports["reviews.csv"]["error"])
+        self.assertIn("Не удалось загрузить таблицу broken", reports["broken.csv"]["error"])
+        self.assertTrue(reports["garbled.xlsx"]["error"].startswith("Ошибка разбора"))
+        self.assertIn("1 файлов успешно, 2 с ошибками, 2 строк", logs.output[-1])
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_unreachable_database_fails_every_file(self):
+        self.write("reviews.csv", "id\n1\n")
+        self.write("reviews.xlsx", "")
+        db = UnreachableDatabase()
+        reports = BulkIngestor(db, load_workers=3).ingest(self.source)
+
+        self.assertEqual(db.clones[0].pool_size, 3)
+        self.assertEqual([report["error"] for report in reports],
+                         ["Нет соединения с PostgreSQL.", f"Таблица reviews уже загружается из файла "
+                                                          f"{os.path.join(self.source, 'reviews.csv')}."])
+
+
+if __name__ == "__main__":
+    ut.main()
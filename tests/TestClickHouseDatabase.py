@@ -0,0 +1,184 @@
+import os
+import tempfile
+import unittest as ut
+from unittest import mock
+
+import pandas as pd
+
+from ClickHouseDatabase import ClickHouseDatabase
+from StateStore import StateStore
+from metrics import TransferMetrics
+
+
+class RecordingClient:
+    def __init__(self):
+        self.inserts = []
+        self.commands = []
+
+    def insert_df(self, table, df, settings=None):
+        self.inserts.append((table, len(df), settings))
+
+    def command(self, query):
+        self.commands.append(query)
+
+
+class ExistingTableClient(RecordingClient):
+    """Клиент, у которого целевая таблица уже существует."""
+
+    def command(self, query):
+        super().command(query)
+        return 1 if query.startswith("EXISTS TABLE") else None
+
+
+class FramePostgres:
+    conn = None
+
+    def __init__(self, df):
+        self.df = df
+
+    def iter_query_chunks(self, query, params=None, **kwargs):
+        yield self.df.copy()
+
+
+class KeysetPostgres:
+    conn = None
+
+    def __init__(self, rows):
+        self.df = pd.DataFrame({"id": range(1, rows + 1)})
+
+    def iter_query_chunks(self, query, params=None, metrics=None):
+        after = (params or {}).get("checkpoint", 0)
+        yield self.df[self.df["id"] > after].head(int(query.rsplit("LIMIT", 1)[1]))
+
+
+class PartitionedPostgres:
+    pool = None
+    conn = None
+
+    def iter_query_chunks(self, query, *args, **kwargs):
+        yield pd.DataFrame({"id": [1, 2]})
+
+    def get_partition_ranges(self, table_name, partitions, column=None):
+        return [(f"id % {partitions} = {number}", None) for number in range(partitions)]
+
+    def clone(self):
+        return PartitionedPostgres()
+
+
+partition_connections = []
+
+
+def fake_partition(pg, ch, pg_table, ch_table, condition, *args):
+    partition_connections.append((pg, ch))
+    metrics = TransferMetrics("transfer_partition", pg_table, ch_table)
+    metrics.record_chunk(2)
+    return {"condition": condition, "rows": 2, "seconds": 0.0, "error": None, "metrics": metrics.finish().as_dict()}
+
+
+class TestClickHouseDatabase(ut.TestCase):
+    def make_db(self, **options):
+        db = ClickHouseDatabase("localhost", 8123, "default", "", schema="etl", **options)
+        db.client = RecordingClient()
+        return db
+
+    def test_load_data_splits_into_insert_blocks(self):
+        db = self.make_db(insert_block_size=4, async_insert=True, max_insert_block_size=1000, compression="zstd")
+        metrics = db.load_data("reviews", pd.DataFrame({"id": range(10)}))
+
+        self.assertEqual([rows for _, rows, _ in db.client.inserts], [4, 4, 2])
+        self.assertEqual(db.client.inserts[0][2],
+                         {"async_insert": 1, "wait_for_async_insert": 1, "max_insert_block_size": 1000})
+        self.assertEqual(len(metrics.chunks), 3)
+        self.assertEqual(metrics.settings["compression"], "zstd")
+        self.assertEqual(metrics.settings["insert_block_size"], 4)
+
+    def test_swap_exchanges_existing_table(self):
+        db = self.make_db()
+        db.client = ExistingTableClient()
+        self.assertTrue(db.swap_staging_table("reviews"))
+        self.assertEqual(db.client.commands, ["EXISTS TABLE etl.reviews",
+                                              "EXCHANGE TABLES etl.reviews__staging AND etl.reviews",
+                                              "DROP TABLE etl.reviews__staging"])
+
+    def test_swap_renames_staging_when_target_is_missing(self):
+        db = self.make_db()
+        self.assertTrue(db.swap_staging_table("reviews"))
+        self.assertEqual(db.client.commands, ["EXISTS TABLE etl.reviews",
+                                              "RENAME TABLE etl.reviews__staging TO etl.reviews"])
+
+    def test_write_mode_options_switch_upsert_to_replacing_engine(self):
+        options = ClickHouseDatabase._write_mode_options
+        self.assertEqual(options("append", "MergeTree", None, ["day"], None, None), ("MergeTree", None, ["day"]))
+        self.assertEqual(options("upsert", "MergeTree", None, None, ("id",), "version"),
+                         ("ReplacingMergeTree", "version", ["id"]))
+        self.assertEqual(options("upsert", "ReplacingMergeTree", None, None, ["id"], None),
+                         ("ReplacingMergeTree", None, ["id"]))
+        self.assertEqual(options("upsert", "ReplicatedMergeTree", "'/t/{shard}', '{replica}'", None, ["id"], "version"),
+                         ("ReplicatedReplacingMergeTree", "'/t/{shard}', '{replica}', version", ["id"]))
+        with self.assertRaises(ValueError):
+            options("upsert", "MergeTree", None, None, None, None)
+
+    def test_upsert_creates_replacing_table_and_dedup_view(self):
+        db = self.make_db()
+        df = pd.DataFrame({"id": [1, 2], "version": [3, 4], "name": ["a", None]})
+        metrics = db.transfer_from_postgres(FramePostgres(df), "reviews", "reviews", write_mode="upsert",
+                                            key_columns=["id"], version_column="version", dedup_view=True)
+
+        self.assertTrue(metrics.ok, metrics.error)
+        create = " ".join(db.client.commands[0].split())
+        self.assertIn("ENGINE = ReplacingMergeTree(version) ORDER BY (id)", create)
+        self.assertIn("id Int64,", create)
+        self.assertIn("version Int64,", create)
+        self.assertEqual(db.client.commands[-1],
+                         "CREATE VIEW IF NOT EXISTS etl.reviews_final AS SELECT * FROM etl.reviews FINAL")
+        self.assertEqual(db.client.inserts[0][:2], ("etl.reviews", 2))
+
+    def test_blocks_get_distinct_deduplication_tokens(self):
+        db = self.make_db(insert_block_size=5)
+        blocks = db._insert_blocks(12, {"insert_deduplication_token": "reviews:1:12"})
+        self.assertEqual([settings["insert_deduplication_token"] for _, settings in blocks],
+                         ["reviews:1:12:0", "reviews:1:12:1", "reviews:1:12:2"])
+        self.assertEqual(db._insert_blocks(3, {"insert_deduplication_token": "t"})[0][1],
+                         {"insert_deduplication_token": "t"})
+
+    def test_checkpoint_tokens_are_unique_per_run(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = StateStore(os.path.join(tmpdir, "state.sqlite"))
+            db = self.make_db()
+            for _ in range(2):
+                db.transfer_from_postgres(KeysetPostgres(5), "reviews", "reviews", chunk_size=2,
+                                          checkpoint_column="id", state_store=store)
+            tokens = [settings["insert_deduplication_token"] for _, _, settings in db.client.inserts]
+
+            self.assertEqual(len(tokens), 6)
+            self.assertEqual(len(set(tokens)), 6)
+            self.assertEqual(len({token.split(":")[0] for token in tokens}), 2)
+            self.assertIn("RESET SETTING non_replicated_deduplication_window", db.client.commands[-1])
+            self.assertIsNone(store.get_checkpoint("reviews", "etl.reviews"))
+
+    def test_parallel_partitions_do_not_share_connections(self):
+        db = self.make_db()
+        partition_connections.clear()
+        with mock.patch("ClickHouseDatabase._transfer_partition", fake_partition), \
+                mock.patch.object(db, "_create_target_table"):
+            db.transfer_from_postgres_parallel(PartitionedPostgres(), "reviews", "reviews", workers=3)
+
+        connections = list(partition_connections)
+        self.assertEqual(len({id(pg) for pg, _ in connections}), 3)
+        self.assertEqual(len({id(ch) for _, ch in connections}), 3)
+        self.assertNotIn(db, [ch for _, ch in connections])
+
+    def test_parallel_transfer_returns_merged_metrics(self):
+        db = self.make_db()
+        with mock.patch("ClickHouseDatabase._transfer_partition", fake_partition), \
+                mock.patch.object(db, "_create_target_table"):
+            metrics = db.transfer_from_postgres_parallel(PartitionedPostgres(), "reviews", "reviews", workers=3)
+
+        self.assertIsInstance(metrics, TransferMetrics)
+        self.assertTrue(metrics.ok)
+        self.assertEqual(metrics.rows, 6)
+        self.assertEqual(len(metrics.chunks), 3)
+
+
+if __name__ == "__main__":
+    ut.main()
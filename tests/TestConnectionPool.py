@@ -0,0 +1,62 @@
+import itertools
+import threading
+import unittest as ut
+
+from ConnectionPool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.healthy = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(ut.TestCase):
+    def setUp(self):
+        counter = itertools.count(1)
+        self.pool = ConnectionPool(lambda: FakeConnection(next(counter)), maxsize=2, timeout=0.05,
+                                   validate=lambda conn: conn.healthy, name="test")
+
+    def test_reuses_warm_connection(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(first, second)
+        stats = self.pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_replaces_unhealthy_connection_on_checkout(self):
+        with self.pool.connection() as first:
+            pass
+        first.healthy = False
+        with self.pool.connection() as second:
+            self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()["health_check_failures"], 1)
+
+    def test_bounded_size_and_timeout(self):
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout()
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+
+        released = threading.Timer(0.01, self.pool.checkin, args=(first,))
+        released.start()
+        self.pool.timeout = 1
+        third = self.pool.checkout()
+        released.join()
+        self.assertIs(third, first)
+        self.pool.checkin(second)
+        self.pool.checkin(third)
+        self.assertEqual(self.pool.stats()["waits"], 2)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest as ut
+from unittest import mock
+
+from JobRunner import JobRunner, load_job_spec
+from PostgresDatabase import PostgresDatabase
+
+
+class TestJobRunner(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_spec(self, jobs):
+        return {
+            "state": os.path.join(self.tmpdir.name, "state.sqlite"),
+            "connections": {"postgres": {"type": "postgres", "host": "localhost", "database": "etl",
+                                         "user": "etl", "password": ""}},
+            "jobs": [{"type": "file_to_postgres", "source": f"{job['name']}.csv", "target": job["name"], **job}
+                     for job in jobs],
+        }
+
+    def test_load_job_spec_expands_environment(self):
+        path = os.path.join(self.tmpdir.name, "jobs.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"connections": {"pg": {"user": "${ETL_TEST_USER}", "host": "${ETL_TEST_HOST:-localhost}"}}},
+                      file)
+        with mock.patch.dict(os.environ, {"ETL_TEST_USER": "etl"}):
+            spec = load_job_spec(path)
+        self.assertEqual(spec["connections"]["pg"], {"user": "etl", "host": "localhost"})
+
+    def test_cycle_and_unknown_dependency_are_rejected(self):
+        with self.assertRaises(ValueError):
+            JobRunner(self.make_spec([{"name": "a", "depends_on": ["b"]}, {"name": "b", "depends_on": ["a"]}]))
+        with self.assertRaises(ValueError):
+            JobRunner(self.make_spec([{"name": "a", "depends_on": ["missing"]}]))
+
+    def test_independent_jobs_run_concurrently_and_failures_skip_dependents(self):
+        spec = self.make_spec([{"name": "a"}, {"name": "b"}, {"name": "broken"},
+                               {"name": "c", "depends_on": ["a", "b"]},
+                               {"name": "d", "depends_on": ["broken"]}, {"name": "e", "depends_on": ["d"]}])
+        runner = JobRunner(spec, workers=3)
+        active, peak, order, lock = [0], [0], [], threading.Lock()
+
+        def execute(job, metrics):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+                order.append(job["name"])
+            if job["name"] == "broken":
+                raise RuntimeError("нет файла")
+            metrics.record_chunk(10)
+
+        with mock.patch.object(runner, "connect"), mock.patch.object(runner, "_execute", side_effect=execute):
+            results = {result["job"]: result for result in runner.run()}
+
+        self.assertEqual(peak[0], 3)
+        self.assertLess(max(order.index("a"), order.index("b")), order.index("c"))
+        self.assertEqual({name: result["status"] for name, result in results.items()},
+                         {"a": "ok", "b": "ok", "broken": "failed", "c": "ok", "d": "skipped", "e": "skipped"})
+        self.assertEqual(results["c"]["rows"], 10)
+
+    def test_state_store_is_created_only_when_needed(self):
+        spec = self.make_spec([{"name": "a"}])
+        runner = JobRunner(spec)
+        self.assertIsNone(runner._job_state_store({"write_mode": "swap"}))
+        self.assertFalse(os.path.exists(spec["state"]))
+
+        self.assertIs(runner._job_state_store({"incremental_column": "updated_at"}), runner.state_store)
+        self.assertTrue(os.path.exists(spec["state"]))
+
+    def test_pool_fits_concurrent_fan_out(self):
+        source = os.path.join(self.tmpdir.name, "incoming")
+        os.makedirs(source)
+        for number in range(3):
+            with open(os.path.join(source, f"part{number}.csv"), "w", encoding="utf-8") as file:
+                file.write("id\n1\n")
+        spec = self.make_spec([{"name": "single"},
+                               {"name": "bulk", "type": "directory_to_postgres", "source": source,
+                                "options": {"load_workers": 3, "parse_workers": 1}}])
+        spec["connections"]["postgres"]["pool_timeout"] = 2
+        runner = JobRunner(spec, workers=2)
+        self.assertEqual(runner.pool_size("postgres"), 4)
+
+        # Три загрузчика пакетной загрузки и одиночное задание держат соединения одновременно
+        barrier = threading.Barrier(4, timeout=10)
+
+        def hold(*args, **kwargs):
+            barrier.wait()
+            return 1
+
+        with mock.patch.object(PostgresDatabase, "_new_connection", lambda self: mock.MagicMock(closed=0)), \
+                mock.patch.object(PostgresDatabase, "_check_connection", staticmethod(lambda conn: True)), \
+                mock.patch.object(PostgresDatabase, "load_stream", side_effect=hold), \
+                mock.patch.object(PostgresDatabase, "process_data", side_effect=hold):
+            results = {result["job"]: result for result in runner.run()}
+
+        self.assertEqual({name: result["status"] for name, result in results.items()},
+                         {"single": "ok", "bulk": "ok"}, results)
+
+
+if __name__ == "__main__":
+    ut.main()
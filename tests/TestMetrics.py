@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest as ut
+
+from decorators import retry
+from metrics import MetricsExporter, TransferMetrics, track_transfer
+
+
+class TestMetrics(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_phases_and_chunks_are_accumulated(self):
+        metrics = TransferMetrics("transfer", "src", "dst")
+        with metrics.phase("read"):
+            pass
+        self.assertEqual(list(metrics.timed_iter([1, 2, 3], "read")), [1, 2, 3])
+        metrics.record_chunk(10, 100)
+        metrics.record_chunk(5, 50)
+        metrics.finish()
+
+        self.assertEqual(metrics.rows, 15)
+        self.assertEqual(metrics.bytes, 150)
+        self.assertEqual([chunk["rows"] for chunk in metrics.chunks], [10, 5])
+        self.assertIn("read", metrics.phases)
+        self.assertTrue(metrics.ok)
+
+    def test_track_transfer_exports_jsonl_and_prometheus(self):
+        jsonl_path = os.path.join(self.tmpdir.name, "metrics.jsonl")
+        prom_path = os.path.join(self.tmpdir.name, "metrics.prom")
+        for exporter in (MetricsExporter(jsonl_path), MetricsExporter(prom_path, format="prometheus")):
+            with track_transfer(None, "load", target="public.t", exporter=exporter) as metrics:
+                metrics.record_chunk(3, 30)
+                metrics.fail("нет соединения")
+
+        with open(jsonl_path, encoding="utf-8") as file:
+            data = json.loads(file.readline())
+        self.assertEqual((data["rows"], data["status"]), (3, "error"))
+        with open(prom_path, encoding="utf-8") as file:
+            text = file.read()
+        self.assertIn('etl_transfer_rows{operation="load",target="public.t"} 3', text)
+        self.assertIn('etl_transfer_success{operation="load",target="public.t"} 0', text)
+
+    def test_retry_reports_attempts(self):
+        metrics = TransferMetrics("write")
+        calls = []
+
+        @retry(retries=3, delay=0, on_complete=metrics.record_retry)
+        def flaky():
+            calls.append(1)
+            if len(calls) < 2:
+                raise RuntimeError("сбой")
+            return "ok"
+
+        self.assertEqual(flaky(), "ok")
+        self.assertEqual(flaky.stats["attempts"], 2)
+        self.assertEqual(flaky.stats["retries"], 1)
+        self.assertEqual(metrics.retries["retries"], 1)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -1,8 +1,339 @@
 import unittest as ut
 import pandas as pd
 
+import datetime
+import math
 import os
+import struct
+from unittest import mock
+
+from PostgresDatabase import PostgresDatabase
+from binary_copy import FLOAT8_OID, INT4_OID, TIMESTAMP_OID
+from metrics import TransferMetrics
+from TestBinaryCopy import decode_binary_copy
+
+
+class CopyOutCursor:
+    """Курсор, который отдает заранее заданный CSV на COPY ... TO STDOUT."""
+
+    def __init__(self, csv):
+        self.csv = csv
+        self.description = [("id", INT4_OID), ("review", 25), ("price", FLOAT8_OID)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def copy_expert(self, sql, file):
+        file.write(self.csv)
+
+
+class CopyOutConnection:
+    def __init__(self, csv):
+        self.csv = csv
+
+    def cursor(self, name=None):
+        return CopyOutCursor(self.csv)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class CopyInCursor(CopyOutCursor):
+    """Курсор, который сохраняет тело COPY ... FROM STDIN."""
+
+    def __init__(self, connection):
+        super().__init__(b"")
+        self.connection = connection
+        self.description = [("id", INT4_OID), ("price", FLOAT8_OID)]
+
+    def copy_expert(self, sql, file):
+        self.connection.statements.append(sql)
+        self.connection.payload = file.read()
+
+
+class CopyInConnection(CopyOutConnection):
+    def __init__(self):
+        super().__init__(b"")
+        self.statements = []
+        self.payload = None
+
+    def cursor(self, name=None):
+        return CopyInCursor(self)
+
+
+class NamedCursor:
+    """Серверный курсор: строки отдаются только итерацией, пачками по itersize."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.itersize = 2000
+        self.fetches = []
+        self.description = [("id", INT4_OID), ("created", TIMESTAMP_OID)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def __iter__(self):
+        for start in range(0, len(self.rows), self.itersize):
+            self.fetches.append(min(self.itersize, len(self.rows) - start))
+            yield from self.rows[start:start + self.itersize]
+
+
+class NamedCursorConnection(CopyOutConnection):
+    def __init__(self, rows):
+        super().__init__(b"")
+        self.named = NamedCursor(rows)
+
+    def cursor(self, name=None):
+        return self.named
+
+
+class MinMaxCursor(CopyOutCursor):
+    """Курсор, который на любой запрос возвращает пару (min, max)."""
+
+    def __init__(self, bounds):
+        super().__init__(b"")
+        self.bounds = bounds
+
+    def fetchone(self):
+        return self.bounds
+
+
+class MinMaxConnection(CopyOutConnection):
+    def __init__(self, bounds):
+        super().__init__(b"")
+        self.bounds = bounds
+
+    def cursor(self, name=None):
+        return MinMaxCursor(self.bounds)
+
+
+class CatalogCursor:
+    """Курсор, который записывает команды и отвечает на запросы к каталогу заранее заданными строками."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        for marker, rows in self.connection.catalog.items():
+            if marker in query:
+                self._rows = rows
+                return
+        self.connection.statements.append(query)
+        if query.endswith("LIMIT 0;"):
+            self.description = [(column, None) for column in self.connection.columns]
+        self.rowcount = self.connection.rowcount
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+class CatalogConnection(CopyOutConnection):
+    def __init__(self, catalog, columns=(), rowcount=0):
+        super().__init__(b"")
+        self.catalog = catalog
+        self.columns = columns
+        self.rowcount = rowcount
+        self.statements = []
+
+    def cursor(self, name=None):
+        return CatalogCursor(self)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+
+def swap_catalog(views=()):
+    return {
+        "pg_rewrite": [(view,) for view in views],
+        "FROM pg_constraint con JOIN pg_class": [("reviews_pkey", "PRIMARY KEY (id)")],
+        "FROM pg_indexes": [("reviews_day_idx", "CREATE INDEX reviews_day_idx ON ONLY etl.reviews USING btree (day)"),
+                            ("reviews_code_key", "CREATE UNIQUE INDEX reviews_code_key ON etl.reviews (code)")],
+        "aclexplode": [("analyst", "SELECT", False), ('"ETL loader"', "INSERT", True)],
+    }
 
 
 class TestPostgresDatabase(ut.TestCase):
-    pass
\ No newline at end of file
+    def load_stream(self, db, chunks, **kwargs):
+        """Выполняет load_stream без сервера и возвращает порции, переданные в COPY."""
+        loaded = []
+
+        def load_chunks(stream, table_name, copy_format="csv", metrics=None):
+            loaded.extend(stream)
+            return sum(len(df) for df in loaded)
+
+        with mock.patch.object(db, "create_table"), mock.patch.object(db, "load_chunks_to_db", load_chunks):
+            rows = db.load_stream(iter(chunks), "reviews", **kwargs)
+        return rows, loaded
+
+    def test_stream_aligns_later_chunk_columns(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        chunks = [pd.DataFrame({"автор": ["a"], "артикул": [1]}),
+                  pd.DataFrame({"артикул": [2.0], "отзыв": ["лишний"]}),
+                  pd.DataFrame({"артикул": [3], "автор": ["c"]})]
+        with self.assertLogs("PostgresDatabase", "WARNING"):
+            rows, loaded = self.load_stream(db, chunks, column_mapping={"автор": "author", "артикул": "article"})
+
+        self.assertEqual(rows, 3)
+        self.assertEqual([list(df.columns) for df in loaded], [["author", "article"]] * 3)
+        self.assertTrue(loaded[1]["author"].isna().all())
+        self.assertEqual(loaded[1]["article"].tolist(), [2])
+        self.assertEqual(loaded[2].values.tolist(), [["c", 3]])
+
+    def test_chunked_process_data_loads_each_sheet(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        sheets = [("Январь", iter([pd.DataFrame({"id": [1, 2]}), pd.DataFrame({"id": [3]})]), 2),
+                  ("Февраль", iter([pd.DataFrame({"id": [4]})]), 2)]
+        loaded = {}
+
+        def load_stream(chunks, table_name, *args, **kwargs):
+            loaded[table_name] = [len(df) for df in chunks]
+            return sum(loaded[table_name])
+
+        with mock.patch("PostgresDatabase.iter_file_sheets", return_value=iter(sheets)) as reader, \
+                mock.patch.object(db, "load_stream", side_effect=load_stream):
+            metrics = db.process_data("Отзывы 2024.xlsx", chunk_size=2)
+
+        reader.assert_called_once_with("Отзывы 2024.xlsx", 2, None)
+        self.assertTrue(metrics.ok)
+        self.assertEqual(loaded, {"отзывы_2024_январь": [2, 1], "отзывы_2024_февраль": [1]})
+
+    def test_upsert_merges_latest_rows_by_key(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        db.conn = CatalogConnection({"FROM pg_index idx": [], "HAVING count(*) > 1": []},
+                                    columns=("id", "name", "price"), rowcount=3)
+        self.assertEqual(db.merge_staging_table("reviews", ["id"]), 3)
+
+        self.assertEqual(db.conn.statements, [
+            "SELECT * FROM etl.reviews__staging LIMIT 0;",
+            "CREATE UNIQUE INDEX IF NOT EXISTS reviews__upsert_key ON etl.reviews (id);",
+            "INSERT INTO etl.reviews (id, name, price) SELECT DISTINCT ON (id) id, name, price "
+            "FROM etl.reviews__staging ORDER BY id, ctid DESC ON CONFLICT (id) DO UPDATE "
+            "SET name = EXCLUDED.name, price = EXCLUDED.price "
+            "WHERE reviews.name IS DISTINCT FROM EXCLUDED.name OR reviews.price IS DISTINCT FROM EXCLUDED.price;",
+            "DROP TABLE etl.reviews__staging;",
+            "COMMIT",
+        ])
+
+    def test_upsert_reuses_existing_unique_key(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        db.conn = CatalogConnection({"FROM pg_index idx": [(["sku", "day"],)]}, columns=("day", "sku"))
+        db.merge_staging_table("reviews", ["day", "sku"])
+
+        self.assertFalse(any("CREATE UNIQUE INDEX" in statement for statement in db.conn.statements))
+        self.assertIn("ON CONFLICT (day, sku) DO NOTHING;", db.conn.statements[1])
+
+    def test_upsert_rejects_duplicate_keys_in_target(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        db.conn = CatalogConnection({"FROM pg_index idx": [], "HAVING count(*) > 1": [(7,)]}, columns=("id", "name"))
+        metrics = TransferMetrics("merge_staging_table")
+
+        self.assertIsNone(db.merge_staging_table("reviews", ["id"], metrics))
+        self.assertIn("повторяющиеся значения ключа (id)", metrics.error)
+        self.assertEqual(db.conn.statements, ["SELECT * FROM etl.reviews__staging LIMIT 0;", "ROLLBACK"])
+
+    def test_swap_recreates_indexes_and_grants(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        db.conn = CatalogConnection(swap_catalog())
+        self.assertTrue(db.swap_staging_table("reviews"))
+
+        self.assertEqual(db.conn.statements, [
+            "ALTER TABLE etl.reviews__staging ADD CONSTRAINT reviews_pkey__staging PRIMARY KEY (id);",
+            "CREATE INDEX reviews_day_idx__staging ON etl.reviews__staging USING btree (day);",
+            "CREATE UNIQUE INDEX reviews_code_key__staging ON etl.reviews__staging (code);",
+            "GRANT SELECT ON TABLE etl.reviews__staging TO analyst;",
+            'GRANT INSERT ON TABLE etl.reviews__staging TO "ETL loader" WITH GRANT OPTION;',
+            "GRANT SELECT ON TABLE etl.reviews__staging TO PUBLIC;",
+            "ALTER TABLE etl.reviews__staging SET LOGGED;",
+            "COMMIT",
+            "DROP TABLE IF EXISTS etl.reviews;",
+            "ALTER TABLE etl.reviews__staging RENAME TO reviews;",
+            "ALTER TABLE etl.reviews RENAME CONSTRAINT reviews_pkey__staging TO reviews_pkey;",
+            "ALTER INDEX etl.reviews_day_idx__staging RENAME TO reviews_day_idx;",
+            "ALTER INDEX etl.reviews_code_key__staging RENAME TO reviews_code_key;",
+            "COMMIT",
+        ])
+
+    def test_swap_refuses_tables_with_dependent_views(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "", "etl")
+        db.conn = CatalogConnection(swap_catalog(views=["etl.reviews_daily"]))
+        metrics = TransferMetrics("swap_staging_table")
+
+        self.assertFalse(db.swap_staging_table("reviews", metrics=metrics))
+        self.assertEqual(db.conn.statements, ["ROLLBACK"])
+        self.assertIn("etl.reviews_daily", metrics.error)
+
+    def test_partition_ranges_require_orderable_column(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "")
+        db.conn = MinMaxConnection((1, 100))
+        ranges = db.get_partition_ranges("reviews", 4, "id")
+        self.assertEqual([params["start"] for _, params in ranges[1:]], [1, 25, 50, 75])
+
+        db.conn = MinMaxConnection(("a3f0", "ff12"))
+        with self.assertRaisesRegex(ValueError, "partition_column"):
+            db.get_partition_ranges("reviews", 4, "review_uuid")
+
+    def test_chunks_share_dtypes_and_use_itersize(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "")
+        rows = [(None, None)] * 3 + [(4, datetime.datetime(2024, 11, 5)), (None, datetime.datetime(2024, 11, 6))]
+        db.conn = NamedCursorConnection(rows)
+        chunks = list(db.iter_query_chunks("SELECT * FROM reviews", chunk_size=3, itersize=2))
+
+        self.assertEqual([len(df) for df in chunks], [3, 2])
+        self.assertEqual([str(df["id"].dtype) for df in chunks], ["Int32", "Int32"])
+        self.assertTrue(all(pd.api.types.is_datetime64_any_dtype(df["created"]) for df in chunks))
+        self.assertEqual(db.conn.named.fetches, [2, 2, 1])
+
+    def test_binary_copy_conforms_later_chunks(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "")
+        db.conn = CopyInConnection()
+        chunks = [pd.DataFrame({"id": [1, 2], "price": [1.5, 2.5]}),
+                  pd.DataFrame({"id": ["3", None], "price": ["4", None]})]
+        rows = db.load_chunks_to_db(iter(chunks), "reviews", copy_format="binary")
+
+        self.assertEqual(rows, 4)
+        self.assertIn("FORMAT binary", db.conn.statements[0])
+        decoded = decode_binary_copy(db.conn.payload)
+        self.assertEqual(decoded[2], [struct.pack(">i", 3), struct.pack(">d", 4.0)])
+        self.assertEqual(decoded[3], [None, None])
+
+    def test_arrow_reader_keeps_null_like_literals(self):
+        db = PostgresDatabase("localhost", "etl", "postgres", "")
+        db.conn = CopyOutConnection(b'id,review,price\n1,NA,NaN\n2,NULL,1.5\n3,N/A,\n4,nan,2\n5,"",3\n6,,4\n')
+        table, = db.iter_query_arrow("SELECT * FROM reviews")
+
+        self.assertEqual(table["review"].to_pylist(), ["NA", "NULL", "N/A", "nan", "", None])
+        prices = table["price"].to_pylist()
+        self.assertTrue(math.isnan(prices[0]))
+        self.assertEqual(prices[1:], [1.5, None, 2.0, 3.0, 4.0])
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest as ut
+
+import openpyxl
+import pandas as pd
+
+from readers import _iter_sheet_chunks, conform_chunk, iter_file_sheets
+
+
+class ShortRowSheet:
+    """Лист read_only, у которого строки с пустым хвостом короче заголовка."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_rows(self, values_only=True):
+        return iter(self.rows)
+
+
+class TestReaders(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_workbook(self, sheets):
+        path = os.path.join(self.tmpdir.name, "book.xlsx")
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for title, rows in sheets.items():
+            worksheet = workbook.create_sheet(title)
+            for row in rows:
+                worksheet.append(row)
+        workbook.save(path)
+        return path
+
+    def test_xlsx_sheets_stream_in_chunks(self):
+        path = self.make_workbook({
+            "Январь": [[None, None], ["id", None], *[[i, f"r{i}"] for i in range(5)], [None, None]],
+            "Февраль": [["id", "review"]],
+        })
+        sheets = [(name, [df for df in chunks], count) for name, chunks, count in iter_file_sheets(path, 2)]
+
+        self.assertEqual([(name, count) for name, _, count in sheets], [("Январь", 2), ("Февраль", 2)])
+        january, february = sheets[0][1], sheets[1][1]
+        self.assertEqual([len(df) for df in january], [2, 2, 1])
+        self.assertEqual(list(january[0].columns), ["id", "column_1"])
+        self.assertEqual(january[2]["column_1"].tolist(), ["r4"])
+        self.assertEqual([len(df) for df in february], [0])
+        self.assertEqual(list(february[0].columns), ["id", "review"])
+
+    def test_chunk_boundaries(self):
+        path = self.make_workbook({"data": [["id"], [1], [2], [3], [4]]})
+        # Книга закрывается, когда обход листов завершен, поэтому порции дочитываются до следующего листа
+        sheets = iter_file_sheets(path, 2, sheets=["data"])
+        _, chunks, _ = next(sheets)
+        self.assertEqual([df["id"].tolist() for df in chunks], [[1, 2], [3, 4]])
+
+        csv_path = os.path.join(self.tmpdir.name, "data.csv")
+        pd.DataFrame({"id": range(5)}).to_csv(csv_path, index=False)
+        (name, chunks, count), = iter_file_sheets(csv_path, 2)
+        self.assertEqual((name, count), ("", 1))
+        self.assertEqual([len(df) for df in chunks], [2, 2, 1])
+
+    def test_short_rows_are_padded(self):
+        chunks = list(_iter_sheet_chunks(ShortRowSheet([("id", "review", "day"), (1,), (2, "b", "c", "x")]), 10))
+        df, = chunks
+        self.assertEqual(df["id"].tolist(), [1, 2])
+        self.assertTrue(df.loc[0, ["review", "day"]].isna().all())
+        self.assertEqual(df.loc[1, "day"], "c")
+
+    def test_conform_chunk_casts_to_first_chunk_types(self):
+        dtypes = pd.DataFrame({"id": [1], "price": [1.5], "day": pd.to_datetime(["2024-01-01"])}).dtypes
+        df = conform_chunk(pd.DataFrame({"id": [2.0, None], "price": ["3", None], "day": ["2024-01-02", None]}),
+                           dtypes)
+
+        self.assertEqual(str(df["id"].dtype), "Int64")
+        self.assertEqual(df["price"].tolist()[0], 3.0)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["day"]))
+        with self.assertRaises(ValueError):
+            conform_chunk(pd.DataFrame({"id": ["x"]}), dtypes)
+
+
+if __name__ == "__main__":
+    ut.main()
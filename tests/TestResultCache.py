@@ -0,0 +1,76 @@
+import contextlib
+import os
+import tempfile
+import time
+import unittest as ut
+
+import pandas as pd
+import pyarrow as pa
+
+from ClickHouseDatabase import ClickHouseDatabase
+from ResultCache import ResultCache
+
+
+class PartsClient:
+    def __init__(self, frames):
+        self.frames = frames
+        self.version = ("2024-11-05 10:00:00", 4, 1234)
+        self.queries = 0
+
+    def query(self, query, parameters=None):
+        return type("Result", (), {"result_rows": [(1, *self.version)]})
+
+    @contextlib.contextmanager
+    def query_df_stream(self, query, parameters=None):
+        self.queries += 1
+        yield iter([frame.copy() for frame in self.frames])
+
+
+class TestResultCache(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_written_result_is_read_back(self):
+        tables = [pa.table({"id": [1, 2]}), pa.table({"id": [3]})]
+        path = self.cache.path("SELECT * FROM t", None, ["v1"])
+        self.assertIsNone(self.cache.read(path))
+
+        self.assertEqual(list(self.cache.write(path, iter(tables))), tables)
+        self.assertEqual([table["id"].to_pylist() for table in self.cache.read(path)], [[1, 2], [3]])
+
+        new_path = self.cache.path("SELECT * FROM t", None, ["v2"])
+        list(self.cache.write(new_path, iter(tables)))
+        self.assertFalse(os.path.exists(path))
+
+    def test_least_recently_read_entries_are_evicted(self):
+        paths = [self.cache.path(f"SELECT {number}", None, ["v"]) for number in range(3)]
+        for number, path in enumerate(paths):
+            list(self.cache.write(path, iter([pa.table({"id": list(range(1000))})])))
+            os.utime(path, (time.time() - 100 + number, time.time() - 100 + number))
+        list(self.cache.read(paths[0]))
+
+        self.cache.max_bytes = self.cache.size() - 1
+        self.cache.evict()
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+
+    def test_unchanged_table_is_read_from_cache(self):
+        frames = [pd.DataFrame({"id": [1, 2], "review": ["a", None]}), pd.DataFrame({"id": [3], "review": ["b"]})]
+        db = ClickHouseDatabase("localhost", 8123, "default", "", schema="etl", result_cache=self.cache)
+        db.client = PartsClient(frames)
+
+        first = list(db.iter_query_chunks("SELECT * FROM etl.reviews", cache_table="etl.reviews"))
+        second = list(db.iter_query_chunks("SELECT * FROM etl.reviews", cache_table="etl.reviews"))
+        self.assertEqual(db.client.queries, 1)
+        self.assertEqual([df["id"].tolist() for df in second], [df["id"].tolist() for df in first])
+
+        db.client.version = ("2024-11-05 11:00:00", 5, 4321)
+        list(db.iter_query_chunks("SELECT * FROM etl.reviews", cache_table="etl.reviews"))
+        self.assertEqual(db.client.queries, 2)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,55 @@
+import datetime
+import unittest as ut
+
+import pandas as pd
+
+from schema_inference import infer_clickhouse_schema, infer_column_type
+
+
+class TestSchemaInference(ut.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "product": ["Платье", "Куртка", "Платье", "Платье", "Куртка"] * 4,
+            "article": [101, 202, 101, 303, 202] * 4,
+            "review": [f"отзыв {i}" for i in range(20)],
+            "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"] * 4),
+            "author": ["Анна", None, "Иван", "Анна", "Иван"] * 4,
+        })
+
+    def test_exact_sample_produces_compact_types(self):
+        schema = infer_clickhouse_schema(self.df, partition_by="auto")
+        types = dict(schema["columns"])
+
+        self.assertEqual(types["product"], "LowCardinality(String)")
+        self.assertEqual(types["article"], "UInt16")
+        self.assertEqual(types["review"], "String")
+        self.assertEqual(types["date"], "Date")
+        self.assertEqual(types["author"], "LowCardinality(Nullable(String))")
+        self.assertEqual(schema["order_by"], ["product", "date"])
+        self.assertEqual(schema["partition_by"], "toYYYYMM(date)")
+
+    def test_partial_sample_keeps_widths_and_nullability(self):
+        self.assertEqual(infer_column_type(self.df["article"], exact=False), "Nullable(Int64)")
+        self.assertEqual(
+            infer_column_type(self.df["article"], exact=False, source={"data_type": "integer", "nullable": False}),
+            "Int32"
+        )
+        self.assertEqual(infer_column_type(self.df["date"], exact=False), "Nullable(DateTime64(6))")
+
+    def test_nullable_integers_keep_declared_type(self):
+        values = pd.Series([1.0, None, 300.0])
+        source = {"data_type": "integer", "nullable": True}
+        self.assertEqual(infer_column_type(values, exact=False, source=source), "Nullable(Int32)")
+        self.assertEqual(infer_column_type(values, exact=True, source=source), "Nullable(UInt16)")
+        self.assertEqual(infer_column_type(pd.Series([1.5, None]), source=source), "Nullable(Float64)")
+
+    def test_python_dates_and_timestamps(self):
+        dates = pd.Series([datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)])
+        stamps = pd.Series(pd.to_datetime(["2024-01-01 10:00:00.000", "2024-01-01 10:00:00.500"]))
+        self.assertEqual(infer_column_type(dates), "Date")
+        self.assertEqual(infer_column_type(stamps), "DateTime64(6)")
+        self.assertEqual(infer_column_type(stamps.dt.floor("s")), "DateTime")
+
+
+if __name__ == "__main__":
+    ut.main()
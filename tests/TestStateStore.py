@@ -0,0 +1,57 @@
+import datetime
+import decimal
+import os
+import tempfile
+import unittest as ut
+
+import numpy as np
+import pandas as pd
+
+from StateStore import StateStore
+
+
+class TestStateStore(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = StateStore(os.path.join(self.tmpdir.name, "state.sqlite"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_watermark_roundtrip_keeps_type(self):
+        self.assertIsNone(self.store.get_watermark("reviews", "test_schema.reviews"))
+
+        self.store.set_watermark("reviews", "test_schema.reviews", 42)
+        self.assertEqual(self.store.get_watermark("reviews", "test_schema.reviews"), 42)
+
+        moment = datetime.datetime(2024, 11, 5, 3, 0, 34)
+        self.store.set_watermark("reviews", "test_schema.reviews", moment)
+        self.assertEqual(self.store.get_watermark("reviews", "test_schema.reviews"), moment)
+
+        self.store.reset_watermark("reviews", "test_schema.reviews")
+        self.assertIsNone(self.store.get_watermark("reviews", "test_schema.reviews"))
+
+    def test_checkpoint_roundtrip(self):
+        self.assertIsNone(self.store.get_checkpoint("reviews", "test_schema.reviews"))
+
+        moment = datetime.datetime(2024, 11, 5, 3, 0, 34)
+        self.store.set_checkpoint("reviews", "test_schema.reviews", 200_000, 200_000, 2, moment, "run-1")
+        self.assertEqual(self.store.get_checkpoint("reviews", "test_schema.reviews"),
+                         {"key": 200_000, "rows": 200_000, "chunks": 2, "watermark": moment, "run_id": "run-1"})
+
+        key = decimal.Decimal("12345678901234567890.000000001")
+        self.store.set_checkpoint("reviews", "test_schema.reviews", key, 1, 1)
+        self.assertEqual(self.store.get_checkpoint("reviews", "test_schema.reviews")["key"], key)
+
+        self.store.clear_checkpoint("reviews", "test_schema.reviews")
+        self.assertIsNone(self.store.get_checkpoint("reviews", "test_schema.reviews"))
+
+    def test_to_python_converts_numpy_and_pandas_scalars(self):
+        self.assertEqual(StateStore.to_python(np.int64(7)), 7)
+        self.assertIsInstance(StateStore.to_python(np.int64(7)), int)
+        self.assertEqual(StateStore.to_python(pd.Timestamp("2024-01-01")), datetime.datetime(2024, 1, 1))
+        self.assertIsNone(StateStore.to_python(pd.NaT))
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,53 @@
+import threading
+import time
+import unittest as ut
+
+from streams import IteratorReader, prefetch
+
+
+class TestStreams(ut.TestCase):
+    def test_prefetch_keeps_order(self):
+        self.assertEqual(list(prefetch(iter(range(100)), maxsize=3)), list(range(100)))
+
+    def test_prefetch_passes_source_error_to_consumer(self):
+        def source():
+            yield 1
+            raise RuntimeError("обрыв соединения")
+
+        received = []
+        with self.assertRaisesRegex(RuntimeError, "обрыв соединения"):
+            for item in prefetch(source()):
+                received.append(item)
+        self.assertEqual(received, [1])
+
+    def test_prefetch_stops_source_when_consumer_stops(self):
+        closed = threading.Event()
+
+        def source():
+            try:
+                number = 0
+                while True:
+                    yield number
+                    number += 1
+            finally:
+                closed.set()
+
+        items = prefetch(source(), maxsize=2)
+        self.assertEqual([next(items) for _ in range(3)], [0, 1, 2])
+        time.sleep(0.05)
+        items.close()
+
+        self.assertTrue(closed.is_set())
+        self.assertFalse(any(thread.name == "prefetch" for thread in threading.enumerate()))
+
+    def test_reader_reads_across_chunk_boundaries(self):
+        reader = IteratorReader(iter([b"abc", b"", b"defgh", b"i"]))
+        self.assertEqual(reader.read(2), b"ab")
+        self.assertEqual(reader.read(4), b"cdef")
+        self.assertEqual(reader.read(10), b"ghi")
+        self.assertEqual(reader.read(10), b"")
+        self.assertEqual(IteratorReader(iter([b"12", b"345"])).read(), b"12345")
+
+
+if __name__ == "__main__":
+    ut.main()
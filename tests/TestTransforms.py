@@ -0,0 +1,52 @@
+import unittest as ut
+
+import pandas as pd
+
+from transforms import compile_transforms
+
+
+class TestTransforms(ut.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "автор": ["Анна", "Олег", None],
+            "отзыв": ["  отлично ", None, " плохо"],
+            "артикул": ["101", "102", "x"],
+            "дата": ["05.11.2024", "06.11.2024", "bad"],
+        })
+
+    def test_rules_are_applied_in_order(self):
+        transform = compile_transforms({
+            "rename": {"автор": "author", "отзыв": "review", "артикул": "article", "дата": "date"},
+            "strip": ["review"],
+            "cast": {"article": {"type": "int", "errors": "coerce"},
+                     "date": {"type": "datetime", "format": "%d.%m.%Y", "errors": "coerce"}},
+            "fill_null": {"review": ""},
+            "derive": {"review_length": "review.str.len()"},
+            "filter": ["article.notna()"],
+            "columns": ["article", "review", "review_length", "date"],
+        })
+        df = transform(self.df)
+
+        self.assertEqual(list(df.columns), ["article", "review", "review_length", "date"])
+        self.assertEqual(df["article"].tolist(), [101, 102])
+        self.assertEqual(str(df["article"].dtype), "Int64")
+        self.assertEqual(df["review"].tolist(), ["отлично", ""])
+        self.assertEqual(df["review_length"].tolist(), [7, 0])
+        self.assertEqual(df["date"].iloc[0], pd.Timestamp("2024-11-05"))
+
+    def test_invalid_rules_fail_at_compile_time(self):
+        with self.assertRaises(ValueError):
+            compile_transforms({"lowercase": ["review"]})
+        with self.assertRaises(ValueError):
+            compile_transforms({"cast": {"article": "uuid"}})
+        with self.assertRaises(ValueError):
+            compile_transforms({"filter": "article >"})
+
+    def test_cast_raises_on_bad_values_by_default(self):
+        transform = compile_transforms({"cast": {"артикул": "int"}})
+        with self.assertRaises(ValueError):
+            transform(self.df)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest as ut
+
+import pandas as pd
+
+from ClickHouseDatabase import ClickHouseDatabase
+from validation import QUARANTINE_COLUMN, clickhouse_rules, compile_validator, postgres_rules
+
+
+class DescribeClient:
+    def __init__(self, columns):
+        self.columns = columns
+        self.inserts = []
+
+    def query(self, query):
+        return type("Result", (), {"result_rows": [(name, ch_type, "", "") for name, ch_type in self.columns]})
+
+    def insert_df(self, table, df, settings=None):
+        self.inserts.append((table, df))
+
+
+class TestValidation(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.quarantine = os.path.join(self.tmpdir.name, "rejected.csv")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_postgres_rules_reject_bad_rows(self):
+        validate = compile_validator(postgres_rules({
+            "id": {"data_type": "integer", "nullable": False, "max_length": None},
+            "name": {"data_type": "character varying", "nullable": True, "max_length": 5},
+            "created": {"data_type": "timestamp without time zone", "nullable": True, "max_length": None},
+        }))
+        df = pd.DataFrame({
+            "id": [1, None, 3_000_000_000, "x", 2.5],
+            "name": ["ok", "ok", "ok", "too long", None],
+            "created": ["2024-01-01", "2024-01-02 10:00", None, "2024-01-03", "not a date"],
+        })
+        good, bad = validate(df)
+
+        self.assertEqual(good["id"].tolist(), [1])
+        self.assertEqual(bad.index.tolist(), [1, 2, 3, 4])
+        self.assertEqual(bad.loc[1, QUARANTINE_COLUMN], "id: NULL в столбце NOT NULL")
+        self.assertIn("вне диапазона", bad.loc[2, QUARANTINE_COLUMN])
+        self.assertEqual(bad.loc[3, QUARANTINE_COLUMN], "id: не число; name: длиннее 5 символов")
+        self.assertEqual(bad.loc[4, QUARANTINE_COLUMN], "id: не целое число; created: не дата")
+
+    def test_integer_limits_are_exact(self):
+        validate = compile_validator(clickhouse_rules([("id", "UInt64"), ("code", "Int64")]))
+        df = pd.DataFrame({"id": pd.Series([2 ** 64 - 1, 0], dtype="uint64"),
+                           "code": [str(2 ** 63 - 1), str(2 ** 63)]})
+        good, bad = validate(df)
+
+        self.assertEqual(good.index.tolist(), [0])
+        self.assertEqual(bad.loc[1, QUARANTINE_COLUMN], f"code: вне диапазона [{-2 ** 63}, {2 ** 63 - 1}]")
+
+    def test_dates_in_one_non_iso_format_are_parsed(self):
+        validate = compile_validator(postgres_rules({
+            "created": {"data_type": "date", "nullable": True, "max_length": None},
+        }))
+        good, bad = validate(pd.DataFrame({"created": ["2024-11-05", "06.11.2024", "07.11.2024", "завтра"]}))
+
+        self.assertEqual(good.index.tolist(), [0, 1, 2])
+        self.assertEqual(bad.loc[3, QUARANTINE_COLUMN], "created: не дата")
+
+    def test_valid_chunk_is_returned_without_copy(self):
+        validate = compile_validator(clickhouse_rules([("id", "UInt8"), ("day", "Nullable(Date)")]))
+        df = pd.DataFrame({"id": [0, 255], "day": pd.to_datetime(["2024-01-01", None])})
+        good, bad = validate(df)
+        self.assertIs(good, df)
+        self.assertIsNone(bad)
+
+    def test_clickhouse_load_data_quarantines_rejected_rows(self):
+        db = ClickHouseDatabase("localhost", 8123, "default", "", schema="etl")
+        db.client = DescribeClient([("id", "Int8"), ("code", "Nullable(FixedString(2))")])
+        df = pd.DataFrame({"id": [1, 200, 3], "code": ["ab", "ab", "abc"]})
+        metrics = db.load_data("reviews", df, quarantine=self.quarantine)
+
+        self.assertTrue(metrics.ok)
+        self.assertEqual(metrics.rows, 1)
+        self.assertEqual(metrics.quarantined, 2)
+        self.assertEqual(db.client.inserts[0][1]["id"].tolist(), [1])
+        rejected = pd.read_csv(self.quarantine)
+        self.assertEqual(rejected["id"].tolist(), [200, 3])
+        self.assertEqual(list(rejected.columns), ["id", "code", QUARANTINE_COLUMN])
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,120 @@
+"""
+Декларативные преобразования порций DataFrame.
+
+Правила описываются словарем (его можно хранить в спецификации заданий)
+и один раз компилируются в функцию, которая применяется к каждой порции
+переноса. Все операции векторные (pandas/NumPy над целыми столбцами),
+без apply и обхода строк. Правила применяются в порядке RULE_ORDER:
+
+    {
+        "rename": {"автор": "author"},                   # переименование столбцов
+        "strip": ["review"],                             # обрезка пробелов в строковых столбцах
+        "cast": {"article": "int",                       # приведение типов: int, float, str, bool,
+                 "date": {"type": "datetime",            # datetime, date; format - формат даты,
+                          "format": "%d.%m.%Y",          # errors="coerce" - неприводимые значения
+                          "errors": "coerce"}},          # становятся пропусками (по умолчанию ошибка)
+        "fill_null": {"review": ""},                     # замена пропусков
+        "derive": {"review_length": "review.str.len()"}, # вычисляемые столбцы (выражения DataFrame.eval)
+        "filter": ["article > 0", "review != ''"],       # условия отбора строк (объединяются через И)
+        "columns": ["article", "author", "date"],        # итоговый список и порядок столбцов
+    }
+"""
+import ast
+
+import pandas as pd
+
+RULE_ORDER = ("rename", "strip", "cast", "fill_null", "derive", "filter", "columns")
+
+
+def _to_date(series, date_format, errors):
+    return pd.to_datetime(series, format=date_format, errors=errors).dt.normalize()
+
+
+_CASTS = {
+    "int": lambda series, date_format, errors: pd.to_numeric(series, errors=errors).astype("Int64"),
+    "float": lambda series, date_format, errors: pd.to_numeric(series, errors=errors).astype("float64"),
+    "str": lambda series, date_format, errors: series.astype("string"),
+    "bool": lambda series, date_format, errors: series.astype("boolean"),
+    "datetime": lambda series, date_format, errors: pd.to_datetime(series, format=date_format, errors=errors),
+    "date": _to_date,
+}
+
+
+def _check_expression(expression):
+    try:
+        ast.parse(expression, mode="eval")
+    except SyntaxError as error:
+        raise ValueError(f"Некорректное выражение преобразования {expression!r}: {error}")
+    return expression
+
+
+def _cast_rules(rules):
+    compiled = []
+    for column, rule in rules.items():
+        rule = {"type": rule} if isinstance(rule, str) else dict(rule)
+        if rule["type"] not in _CASTS:
+            raise ValueError(f"Неизвестный тип приведения столбца {column}: {rule['type']}")
+        if rule.get("errors", "raise") not in ("raise", "coerce"):
+            raise ValueError(f"errors для столбца {column} должен быть 'raise' или 'coerce'.")
+        compiled.append((column, _CASTS[rule["type"]], rule.get("format"), rule.get("errors", "raise")))
+    return compiled
+
+
+def compile_transforms(spec):
+    """
+    Компилирует правила преобразования в функцию transform(df) -> df.
+
+    Правила проверяются один раз (неизвестные правила и типы, синтаксис
+    выражений), а функция только выполняет векторные операции над порцией.
+    Порция изменяется на месте, где это возможно. Уже готовая функция
+    (callable) возвращается как есть.
+    """
+    if callable(spec):
+        return spec
+    unknown = set(spec) - set(RULE_ORDER)
+    if unknown:
+        raise ValueError(f"Неизвестные правила преобразования: {sorted(unknown)}")
+
+    rename = dict(spec.get("rename") or {})
+    strip = list(spec.get("strip") or [])
+    casts = _cast_rules(spec.get("cast") or {})
+    fill_null = dict(spec.get("fill_null") or {})
+    derive = [(column, _check_expression(expression)) for column, expression in (spec.get("derive") or {}).items()]
+    filters = spec.get("filter") or []
+    filters = [_check_expression(expression) for expression in ([filters] if isinstance(filters, str) else filters)]
+    columns = list(spec.get("columns") or [])
+
+    def transform(df):
+        if rename:
+            df = df.rename(columns=rename)
+        for column in strip:
+            df[column] = df[column].str.strip()
+        for column, cast, date_format, errors in casts:
+            df[column] = cast(df[column], date_format, errors)
+        if fill_null:
+            df = df.fillna(fill_null)
+        for column, expression in derive:
+            df[column] = df.eval(expression, engine="python")
+        if filters:
+            mask = None
+            for expression in filters:
+                condition = pd.Series(df.eval(expression, engine="python"), index=df.index)
+                condition = condition.fillna(False).astype(bool)
+                mask = condition if mask is None else mask & condition
+            df = df[mask]
+        if columns:
+            df = df[columns]
+        return df
+
+    return transform
+
+
+def transform_chunks(chunks, transform, metrics=None):
+    """Применяет transform к каждой порции потока; время учитывается в metrics в фазе "transform"."""
+    for df in chunks:
+        if metrics is None:
+            yield transform(df)
+            continue
+        with metrics.phase("transform"):
+            df = transform(df)
+        yield df
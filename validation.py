@@ -0,0 +1,252 @@
+"""
+Проверка порций DataFrame по схеме приемника перед загрузкой.
+
+Правила строятся один раз по объявленным типам столбцов таблицы-приемника
+(тем, что создают PostgresDatabase.create_table и ClickHouseDatabase.create_table)
+и проверяют каждую порцию масками над целыми столбцами, без обхода строк:
+
+    - NULL в столбце NOT NULL (в ClickHouse - не Nullable);
+    - нечисловые и дробные значения в целых столбцах и выход за диапазон
+      выбранной ширины (smallint, integer, Int8, UInt32 и т.д.);
+    - длина строк для varchar(n), char(n) и FixedString(n);
+    - неразбираемые даты и даты вне диапазона типа ClickHouse;
+    - нечисловые значения в столбцах с плавающей точкой, неизвестные
+      логические значения в boolean.
+
+Строки, не прошедшие проверку, с причиной в столбце QUARANTINE_COLUMN
+дописываются в CSV-файл карантина, остальные загружаются - одно плохое
+значение больше не откатывает загрузку всей порции.
+"""
+import decimal
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+QUARANTINE_COLUMN = "_error"
+
+_POSTGRES_INT_RANGES = {
+    "smallint": (-2 ** 15, 2 ** 15 - 1),
+    "integer": (-2 ** 31, 2 ** 31 - 1),
+    "bigint": (-2 ** 63, 2 ** 63 - 1),
+}
+_POSTGRES_FLOAT_TYPES = ("numeric", "real", "double precision")
+_POSTGRES_STRING_TYPES = ("character varying", "character", "text")
+_POSTGRES_DATETIME_TYPES = ("date", "timestamp without time zone", "timestamp with time zone")
+_BOOL_VALUES = ("true", "false", "t", "f", "yes", "no", "y", "n", "on", "off", "1", "0", "1.0", "0.0")
+
+# Диапазоны дат ClickHouse: значения вне них при вставке молча искажаются
+_CLICKHOUSE_DATE_RANGES = {
+    "Date": ("1970-01-01", "2149-06-06"),
+    "Date32": ("1900-01-01", "2299-12-31"),
+    "DateTime": ("1970-01-01 00:00:00", "2106-02-07 06:28:15"),
+    "DateTime64": ("1900-01-01 00:00:00", "2299-12-31 23:59:59"),
+}
+
+# Выше этой величины float64 представляет не все целые числа
+_FLOAT_EXACT_INT_LIMIT = 2 ** 53
+
+_quarantine_lock = threading.Lock()
+
+
+def _rule(kind, nullable=True, value_range=None, max_length=None):
+    return {"kind": kind, "nullable": nullable, "range": value_range, "max_length": max_length}
+
+
+def postgres_rules(column_info):
+    """
+    Правила проверки для таблицы PostgreSQL.
+
+    :param column_info: результат PostgresDatabase.get_column_info -
+                        {столбец: {"data_type", "nullable", "max_length"}}
+    """
+    rules = {}
+    for column, info in column_info.items():
+        data_type, nullable = info["data_type"], info["nullable"]
+        if data_type in _POSTGRES_INT_RANGES:
+            rules[column] = _rule("int", nullable, _POSTGRES_INT_RANGES[data_type])
+        elif data_type in _POSTGRES_FLOAT_TYPES:
+            rules[column] = _rule("float", nullable)
+        elif data_type in _POSTGRES_STRING_TYPES:
+            rules[column] = _rule("string", nullable, max_length=info.get("max_length"))
+        elif data_type in _POSTGRES_DATETIME_TYPES:
+            rules[column] = _rule("datetime", nullable)
+        elif data_type == "boolean":
+            rules[column] = _rule("bool", nullable)
+        else:
+            rules[column] = _rule("other", nullable)
+    return rules
+
+
+def clickhouse_rules(columns):
+    """
+    Правила проверки для таблицы ClickHouse.
+
+    :param columns: пары (столбец, тип ClickHouse), например строки DESCRIBE TABLE
+    """
+    rules = {}
+    for column, column_type in columns:
+        column_type = column_type.replace("LowCardinality(", "")
+        nullable = column_type.startswith("Nullable(")
+        base_type = column_type.replace("Nullable(", "").rstrip(")")
+        if base_type in ("Int8", "Int16", "Int32", "Int64"):
+            bits = int(base_type[3:])
+            rules[column] = _rule("int", nullable, (-2 ** (bits - 1), 2 ** (bits - 1) - 1))
+        elif base_type in ("UInt8", "UInt16", "UInt32", "UInt64"):
+            rules[column] = _rule("int", nullable, (0, 2 ** int(base_type[4:]) - 1))
+        elif base_type.startswith(("Float", "Decimal")):
+            rules[column] = _rule("float", nullable)
+        elif base_type.startswith("FixedString("):
+            rules[column] = _rule("string", nullable, max_length=int(base_type[len("FixedString("):]))
+        elif base_type.startswith("Date"):
+            date_type = base_type.split("(")[0]
+            low, high = _CLICKHOUSE_DATE_RANGES.get(date_type, _CLICKHOUSE_DATE_RANGES["DateTime64"])
+            rules[column] = _rule("datetime", nullable, (pd.Timestamp(low), pd.Timestamp(high)))
+        elif base_type == "String":
+            rules[column] = _rule("string", nullable)
+        else:
+            rules[column] = _rule("other", nullable)
+    return rules
+
+
+def _to_datetime(series):
+    """
+    Разбирает даты векторно.
+
+    Сначала значения разбираются как ISO 8601. Для остальных значений формат
+    угадывается один раз, по первому из них, и они разбираются векторно
+    в этом формате. Значения, не подходящие ни под один из форматов,
+    считаются неразобранными. Разбор по одному значению (format="mixed")
+    не используется: на больших порциях он медленнее в десятки раз.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series
+    else:
+        values = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        retry = values.isna() & series.notna()
+        date_format = guess_datetime_format(str(series[retry].iloc[0])) if retry.any() else None
+        if date_format:
+            values = values.astype(object)
+            values[retry] = pd.to_datetime(series[retry].astype(str), errors="coerce", format=date_format)
+            values = pd.to_datetime(values, errors="coerce")
+    if getattr(values.dt, "tz", None) is not None:
+        values = values.dt.tz_convert(None)
+    return values
+
+
+def _int_errors(series, present, low, high):
+    """
+    Проверяет целочисленный столбец без потери точности на границах bigint и UInt64.
+
+    Целые столбцы сравниваются с границами в своем типе, а дробные - в float64.
+    Границы диапазонов - степени двойки, поэтому в float64 они точны. Значения
+    нечисловых столбцов (object, строки) больше 2**53 в float64 приближенные
+    и проверяются поэлементно как Decimal; таких значений обычно единицы.
+    """
+    numeric = pd.to_numeric(series, errors="coerce")
+    parsed = numeric.notna().to_numpy()
+    if numeric.dtype.kind in "iu":
+        dtype = getattr(numeric.dtype, "numpy_dtype", numeric.dtype)
+        info = np.iinfo(dtype)
+        values = numeric.to_numpy(dtype=dtype, na_value=0)
+        fractional = np.zeros(len(series), dtype=bool)
+        outside = parsed & ((values < max(low, info.min)) | (values > min(high, info.max)))
+    else:
+        values = numeric.astype("float64").to_numpy()
+        with np.errstate(invalid="ignore"):
+            fractional = parsed & (np.mod(values, 1) != 0)
+            outside = parsed & ((values < low) | (values >= float(high + 1)))
+        if not pd.api.types.is_numeric_dtype(series):
+            large = parsed & np.isfinite(values) & (np.abs(values) >= _FLOAT_EXACT_INT_LIMIT)
+            for position in np.flatnonzero(large):
+                value = decimal.Decimal(str(series.iloc[position]))
+                fractional[position] = value % 1 != 0
+                outside[position] = not low <= value <= high
+    return [
+        (present & ~parsed, "не число"),
+        (fractional, "не целое число"),
+        (outside, f"вне диапазона [{low}, {high}]"),
+    ]
+
+
+def _column_errors(series, rule):
+    """Возвращает пары (маска строк, причина) для одного столбца."""
+    present = series.notna().to_numpy()
+    errors = []
+    if not rule["nullable"]:
+        errors.append((~present, "NULL в столбце NOT NULL"))
+    kind = rule["kind"]
+    if kind == "int":
+        errors.extend(_int_errors(series, present, *rule["range"]))
+    elif kind == "float":
+        parsed = pd.to_numeric(series, errors="coerce").notna().to_numpy()
+        errors.append((present & ~parsed, "не число"))
+    elif kind == "string" and rule["max_length"]:
+        lengths = series.where(present, "").astype(str).str.len().to_numpy()
+        errors.append((lengths > rule["max_length"], f"длиннее {rule['max_length']} символов"))
+    elif kind == "datetime":
+        values = _to_datetime(series)
+        parsed = values.notna().to_numpy()
+        errors.append((present & ~parsed, "не дата"))
+        if rule["range"]:
+            low, high = rule["range"]
+            outside = ((values < low) | (values > high)).fillna(False).to_numpy(dtype=bool)
+            errors.append((parsed & outside, f"дата вне диапазона [{low}, {high}]"))
+    elif kind == "bool" and not pd.api.types.is_bool_dtype(series):
+        known = series.astype(str).str.strip().str.lower().isin(_BOOL_VALUES).to_numpy()
+        errors.append((present & ~known, "не логическое значение"))
+    return errors
+
+
+def compile_validator(rules):
+    """
+    Компилирует правила в функцию validate(df) -> (годные строки, отклоненные строки).
+
+    Проверяются только столбцы порции, для которых есть правила. Отклоненные
+    строки получают столбец QUARANTINE_COLUMN с перечнем нарушений; если
+    нарушений нет, вместо них возвращается None, а порция - без копирования.
+    """
+    def validate(df):
+        reasons = None
+        for column, rule in rules.items():
+            if column not in df.columns:
+                continue
+            for mask, reason in _column_errors(df[column], rule):
+                if not mask.any():
+                    continue
+                if reasons is None:
+                    reasons = pd.Series("", index=df.index, dtype=object)
+                reasons[mask] = reasons[mask] + f"{column}: {reason}; "
+        if reasons is None:
+            return df, None
+        rejected = (reasons != "").to_numpy()
+        bad = df[rejected].copy()
+        bad[QUARANTINE_COLUMN] = reasons[rejected].str.rstrip("; ")
+        return df[~rejected], bad
+
+    return validate
+
+
+def write_quarantine(df, path):
+    """Дописывает отклоненные строки в CSV-файл карантина (заголовок - только в новый файл)."""
+    with _quarantine_lock:
+        header = not os.path.exists(path) or os.path.getsize(path) == 0
+        df.to_csv(path, mode="a", header=header, index=False, encoding="utf-8")
+
+
+def validated_chunks(chunks, validate, quarantine_path, metrics):
+    """
+    Проверяет каждую порцию потока и возвращает только годные строки.
+
+    Отклоненные строки пишутся в quarantine_path и учитываются в metrics
+    (record_quarantine); время проверки - в фазе "validate".
+    """
+    for df in chunks:
+        with metrics.phase("validate"):
+            df, rejected = validate(df)
+            if rejected is not None:
+                write_quarantine(rejected, quarantine_path)
+                metrics.record_quarantine(len(rejected))
+        yield df